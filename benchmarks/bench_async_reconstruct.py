@@ -0,0 +1,65 @@
+"""
+build_task_traces на 1k / 10k / 100k тасок.
+
+Синтетическая трасса сервиса на asyncio: главная таска ждёт в одном await,
+пока рабочие таски (handler → fetch) по очереди стартуют, уходят в await и
+после всех возобновляются — стеки тасок перемежаются, а все рабочие таски
+попадают в await-окно главной.
+
+Запуск: ``python benchmarks/bench_async_reconstruct.py [TASKS ...]``
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+from flowtrace.async_reconstruct import build_task_traces
+from flowtrace.events import AsyncTransitionEvent, CallEvent, ExecutionContext, TraceEvent
+
+
+def synthetic(n_tasks: int) -> list[TraceEvent]:
+    main_ctx = ExecutionContext(thread_id=1, task_id=0, task_name="main")
+    events: list[TraceEvent] = [
+        CallEvent(id=0, kind="call", func_name="main", context=main_ctx),
+        AsyncTransitionEvent(id=1, kind="await", func_name="main", context=main_ctx, ts=0),
+    ]
+    contexts = [
+        ExecutionContext(thread_id=1, task_id=tid, task_parent_id=0, task_name=f"w{tid}")
+        for tid in range(1, n_tasks + 1)
+    ]
+
+    def add(ev_type: type, **kwargs: object) -> None:
+        events.append(ev_type(id=len(events), **kwargs))
+
+    for ctx in contexts:
+        base = len(events)
+        add(CallEvent, kind="call", func_name="handler", context=ctx, ts=base)
+        add(CallEvent, kind="call", func_name="fetch", parent_id=base, context=ctx, ts=base)
+        add(AsyncTransitionEvent, kind="await", func_name="fetch", context=ctx, ts=base)
+    for i, ctx in enumerate(contexts):
+        handler = 2 + 3 * i
+        add(AsyncTransitionEvent, kind="resume", func_name="fetch", context=ctx, ts=len(events))
+        add(CallEvent, kind="return", func_name="fetch", parent_id=handler + 1, context=ctx)
+        add(CallEvent, kind="return", func_name="handler", parent_id=handler, context=ctx)
+
+    add(AsyncTransitionEvent, kind="resume", func_name="main", context=main_ctx, ts=len(events))
+    add(CallEvent, kind="return", func_name="main", parent_id=0, context=main_ctx)
+    return events
+
+
+def main(sizes: list[int]) -> None:
+    for n in sizes:
+        events = synthetic(n)
+        t0 = time.perf_counter()
+        tasks = build_task_traces(events)
+        elapsed = time.perf_counter() - t0
+        assert len(tasks[0].await_segments[0].children_task_ids) == n
+        print(
+            f"{n:>7} тасок  {len(events):>8} событий  {elapsed:7.3f}s  "
+            f"{len(events) / elapsed / 1e3:6.0f} k events/s"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,94 @@
+"""
+print_async_tree на тысячах тасок.
+
+Синтетическая трасса как у сервиса на asyncio: главная таска ждёт в одном
+await все рабочие таски, каждая рабочая — цепочка handler → fetch → parse
+с await-интервалами в каждом вызове. TaskTrace собираются напрямую, так что
+меряется только отрисовка; вывод идёт в поток-заглушку.
+
+Запуск: ``python benchmarks/bench_async_tree.py [TASKS ...]``
+"""
+
+from __future__ import annotations
+
+import io
+import sys
+import time
+
+from flowtrace.async_model import AwaitSegment, TaskTrace
+from flowtrace.events import CallEvent, ExecutionContext, TraceEvent
+from flowtrace.formatters import print_async_tree
+
+
+class _Discard(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def synthetic(n_tasks: int) -> tuple[dict[int, TaskTrace], list[TraceEvent]]:
+    events: list[TraceEvent] = []
+    main_ctx = ExecutionContext(thread_id=1, task_id=0, task_name="main")
+    events.append(CallEvent(id=0, kind="call", func_name="main", context=main_ctx))
+    main = TaskTrace(task_id=0, parent_task_id=None, task_name="main", thread_id=1, roots=[0])
+    gather = AwaitSegment(call_id=0, await_event_id=0, duration=0.5)
+    main.await_segments.append(gather)
+    tasks = {0: main}
+
+    next_id = 1
+    for tid in range(1, n_tasks + 1):
+        ctx = ExecutionContext(thread_id=1, task_id=tid, task_parent_id=0, task_name=f"w{tid}")
+        task = TaskTrace(
+            task_id=tid,
+            parent_task_id=0,
+            task_name=ctx.task_name,
+            thread_id=1,
+            first_event_index=len(events),
+        )
+        stack: list[int] = []
+        for name in ("handler", "fetch", "parse"):
+            parent = stack[-1] if stack else None
+            events.append(
+                CallEvent(id=next_id, kind="call", func_name=name, parent_id=parent, context=ctx)
+            )
+            if parent is None:
+                task.roots.append(next_id)
+            else:
+                task.call_children.setdefault(parent, []).append(next_id)
+            task.await_segments.append(
+                AwaitSegment(call_id=next_id, await_event_id=len(events), duration=0.001)
+            )
+            stack.append(next_id)
+            next_id += 1
+        while stack:
+            events.append(
+                CallEvent(
+                    id=next_id,
+                    kind="return",
+                    func_name="parse",
+                    parent_id=stack.pop(),
+                    result_repr="42",
+                    context=ctx,
+                )
+            )
+            next_id += 1
+        tasks[tid] = task
+        gather.children_task_ids.append(tid)
+
+    events.append(CallEvent(id=next_id, kind="return", func_name="main", parent_id=0))
+    return tasks, events
+
+
+def main(sizes: list[int]) -> None:
+    for n in sizes:
+        tasks, events = synthetic(n)
+        t0 = time.perf_counter()
+        print_async_tree(tasks, events, file=_Discard())
+        elapsed = time.perf_counter() - t0
+        print(
+            f"{n:>7} тасок  {len(events):>8} событий  {elapsed:7.3f}s  "
+            f"{len(events) / elapsed / 1e3:6.0f} k events/s"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,90 @@
+"""
+Цена часов, которыми меряется длительность вызова.
+
+Сначала — стоимость одного чтения каждой функции часов, затем — накладные
+расходы трассировки на событие при ``clock="wall"/"thread"/"process"/"dual"``
+и цена меток ``timestamps=True`` (чтение ``perf_counter_ns`` на каждом
+событии) с замером длительности и без него.
+``thread_time`` и ``process_time`` на части ядер и в некоторых контейнерах
+уходят в системный вызов (``clock_gettime`` без vDSO), поэтому CPU-часы
+могут стоить заметно дороже ``perf_counter``.
+
+Запуск: ``python benchmarks/bench_clocks.py``
+"""
+
+from __future__ import annotations
+
+import time
+
+import flowtrace
+
+CLOCK_FUNCS = {
+    "perf_counter_ns": time.perf_counter_ns,
+    "thread_time_ns": time.thread_time_ns,
+    "process_time_ns": time.process_time_ns,
+}
+
+
+def leaf(i: int) -> int:
+    return i + 1
+
+
+def node(i: int) -> int:
+    return leaf(i) + leaf(i + 1)
+
+
+def workload(n: int) -> int:
+    return sum(node(i) for i in range(n))
+
+
+def read_cost(func, n: int = 200_000) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - t0) / n
+
+
+def per_event(
+    clock: str = "wall",
+    *,
+    timing: bool = True,
+    timestamps: bool = False,
+    n: int = 20_000,
+    repeat: int = 3,
+) -> float:
+    flowtrace.config(timestamps=timestamps)
+    best = float("inf")
+    try:
+        for _ in range(repeat):
+            flowtrace.start_tracing(
+                default_show_args=False,
+                default_show_result=False,
+                default_show_timing=timing,
+                clock=clock,
+            )
+            t0 = time.perf_counter()
+            workload(n)
+            elapsed = time.perf_counter() - t0
+            events = flowtrace.stop_tracing()
+            best = min(best, elapsed / len(events))
+    finally:
+        flowtrace.config(timestamps=False)
+    return best
+
+
+def main() -> None:
+    for name, func in CLOCK_FUNCS.items():
+        print(f"{name:16} {read_cost(func) * 1e9:6.0f} ns/read")
+    for clock in ("wall", "thread", "process", "dual"):
+        print(f"clock={clock:8} {per_event(clock) * 1e9:7.0f} ns/event")
+    for timing in (False, True):
+        off = per_event(timing=timing)
+        on = per_event(timing=timing, timestamps=True)
+        print(
+            f"show_timing={timing!s:5} timestamps off {off * 1e9:5.0f} / on {on * 1e9:5.0f} "
+            f"ns/event ({(on / off - 1) * 100:+.1f}%)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Стоимость обработки одного события (нс/событие) в движке захвата.
+
+Колбеки вызываются напрямую, в обход интерпретатора, чтобы измерить только
+собственную работу FlowTrace. Для сравнения воспроизведён прежний путь:
+замыкание → импорт CURRENT_SESSION → ContextVar → if/elif по строковой метке.
+
+Запуск: ``python benchmarks/bench_dispatch.py``
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from flowtrace.monitoring import _is_user_code
+from flowtrace.session import CURRENT_SESSION, TraceSession
+
+N = 200_000
+
+
+def leaf():
+    return None
+
+
+def _legacy_handlers(label_names: tuple[str, ...]):
+    def make_handler(event_label, dispatch):
+        def handler(*args):
+            if not args:
+                return
+            code = args[0]
+            try:
+                dispatch(event_label, code, args)
+            except Exception as e:
+                logging.debug("[flowtrace-debug] handler error: %s", e)
+
+        return handler
+
+    def dispatch_event(label, code, raw_args):
+        from flowtrace.session import CURRENT_SESSION
+
+        sess = CURRENT_SESSION.get()
+        if not (sess and sess.state.active):
+            return
+        d = sess.raw_dispatcher
+        if not _is_user_code(code):
+            return
+        func_name = d.code_name_resolver.resolve(code)
+        if label == "PY_START":
+            sess.call_tracker.on_call(func_name)
+        elif label == "PY_RETURN":
+            sess.call_tracker.on_return(raw_args[-1] if raw_args else None)
+
+    return {name: make_handler(name, dispatch_event) for name in label_names}
+
+
+def _new_session() -> TraceSession:
+    sess = TraceSession(
+        default_show_args=False,
+        default_show_result=False,
+        default_show_timing=False,
+    )
+    sess.start()
+    return sess
+
+
+def _run(on_start, on_return) -> float:
+    code = leaf.__code__
+    t0 = time.perf_counter_ns()
+    for _ in range(N):
+        on_start(code, 0)
+        on_return(code, 0, None)
+    return (time.perf_counter_ns() - t0) / (2 * N)
+
+
+def _baseline() -> float:
+    def noop(*args):
+        return None
+
+    return _run(noop, noop)
+
+
+def main() -> None:
+    empty = _baseline()
+
+    sess = _new_session()
+    token = CURRENT_SESSION.set(sess)
+    legacy = _legacy_handlers(("PY_START", "PY_RETURN"))
+    legacy_ns = _run(legacy["PY_START"], legacy["PY_RETURN"]) - empty
+    sess.stop()
+    CURRENT_SESSION.reset(token)
+
+    sess = _new_session()
+    cbs = sess.raw_dispatcher.callbacks()
+    fast_ns = _run(cbs["PY_START"], cbs["PY_RETURN"]) - empty
+    sess.stop()
+
+    print(f"events: {2 * N}")
+    print(f"label dispatch chain: {legacy_ns:7.1f} ns/event")
+    print(f"per-event callbacks:  {fast_ns:7.1f} ns/event  (x{legacy_ns / fast_ns:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Цена профилей событий на генераторной ETL-нагрузке.
+
+Каждая строка проходит через цепочку пользовательских генераторов, поэтому
+в профиле ``"full"`` на каждый шаг приходятся события PY_YIELD/PY_RESUME,
+которые не нужны, если интересует только структура вызовов.
+
+Запуск: ``python benchmarks/bench_event_profiles.py``
+"""
+
+from __future__ import annotations
+
+import time
+from statistics import mean
+
+import flowtrace
+
+
+def read_rows(n: int):
+    for i in range(n):
+        yield {"id": i, "value": i % 97}
+
+
+def clean(rows):
+    for row in rows:
+        if row["value"]:
+            yield row
+
+
+def enrich(rows):
+    for row in rows:
+        row["double"] = row["value"] * 2
+        yield row
+
+
+def load(rows) -> int:
+    return sum(row["double"] for row in rows)
+
+
+def etl(n: int = 20_000) -> int:
+    return load(enrich(clean(read_rows(n))))
+
+
+def measure(profile: str | None, repeat: int = 3) -> tuple[float, int]:
+    samples = []
+    n_events = 0
+    for _ in range(repeat):
+        if profile is not None:
+            flowtrace.start_tracing(
+                default_show_args=False,
+                default_show_result=False,
+                default_show_timing=False,
+                event_profile=profile,
+            )
+        t0 = time.perf_counter()
+        etl()
+        samples.append(time.perf_counter() - t0)
+        if profile is not None:
+            n_events = len(flowtrace.stop_tracing())
+    return mean(samples), n_events
+
+
+def main() -> None:
+    base, _ = measure(None)
+    print(f"{'no tracing':12} {base * 1000:9.2f} ms")
+    for profile in ("full", "exceptions", "calls"):
+        elapsed, n_events = measure(profile)
+        print(f"{profile:12} {elapsed * 1000:9.2f} ms  (x{elapsed / base:.2f}, {n_events} events)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Память на событие и скорость записи: dataclass-события против колонок.
+
+В хранилище ``"objects"`` каждый вызов оставляет два CallEvent и два
+ExecutionContext. ``"columnar"`` раскладывает те же поля по типизированным
+``array`` и интернирует имена функций и контексты. События создаются заново
+только при чтении.
+
+Запуск: ``python benchmarks/bench_event_store.py``
+"""
+
+from __future__ import annotations
+
+import gc
+import time
+import tracemalloc
+
+import flowtrace
+
+
+def leaf(i: int) -> int:
+    return i + 1
+
+
+def node(i: int) -> int:
+    return leaf(i) + leaf(i + 1)
+
+
+def workload(n: int) -> int:
+    return sum(node(i) for i in range(n))
+
+
+def _start(storage: str) -> None:
+    flowtrace.start_tracing(
+        default_show_args=False,
+        default_show_result=False,
+        default_show_timing=True,
+        storage=storage,
+    )
+
+
+def memory_per_event(storage: str, n: int = 20_000) -> tuple[float, int]:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    _start(storage)
+    workload(n)
+    events = flowtrace.stop_tracing()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(events), len(events)
+
+
+def capture_rate(storage: str, n: int = 20_000, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        _start(storage)
+        t0 = time.perf_counter()
+        workload(n)
+        elapsed = time.perf_counter() - t0
+        events = flowtrace.stop_tracing()
+        best = min(best, elapsed / len(events))
+    return best
+
+
+def read_rate(storage: str, n: int = 20_000) -> float:
+    _start(storage)
+    workload(n)
+    events = flowtrace.stop_tracing()
+    t0 = time.perf_counter()
+    for _ in events:
+        pass
+    return (time.perf_counter() - t0) / len(events)
+
+
+def main() -> None:
+    for storage in ("objects", "columnar"):
+        per_event, n_events = memory_per_event(storage)
+        capture = capture_rate(storage)
+        read = read_rate(storage)
+        print(
+            f"{storage:9} {per_event:7.1f} B/event  capture {capture * 1e9:7.0f} ns/event  "
+            f"read {read * 1e9:6.0f} ns/event  ({n_events} events)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Цена ExecutionContext на событие: сборка заново против интернированного кэша.
+
+Прежний ``get_current`` на каждом событии вызывал ``asyncio.current_task()``
+(в синхронном коде — с RuntimeError), искал async_id и родителя и создавал
+новый ExecutionContext. Сейчас контекст один на поток/задачу, а на каждом
+событии остаётся только проверка, сменилась ли задача.
+
+Запуск: ``python benchmarks/bench_execution_context.py``
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import suppress
+
+from flowtrace.asyncio_support import TaskRegistry
+from flowtrace.events import ExecutionContext
+from flowtrace.session import ExecutionContextProvider
+
+N = 200_000
+REGISTRY = TaskRegistry()
+
+
+def legacy_get_current() -> ExecutionContext:
+    """Копия прежней реализации для сравнения."""
+    thread_id = threading.get_ident()
+    task_id = None
+    parent_id = None
+    task_name = None
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        task_id = REGISTRY.get_async_id(task)
+        if task_id is not None:
+            parent_id = REGISTRY.parent_id(task)
+        with suppress(Exception):
+            task_name = task.get_name()
+    return ExecutionContext(
+        thread_id=thread_id,
+        task_id=task_id,
+        task_parent_id=parent_id,
+        task_name=task_name,
+    )
+
+
+def measure(fn) -> float:
+    t0 = time.perf_counter_ns()
+    for _ in range(N):
+        fn()
+    return (time.perf_counter_ns() - t0) / N
+
+
+def main() -> None:
+    provider = ExecutionContextProvider(REGISTRY)
+    print(f"sync   legacy: {measure(legacy_get_current):7.1f} ns/event")
+    print(f"sync   cached: {measure(provider.get_current):7.1f} ns/event")
+
+    async def in_task() -> None:
+        task_provider = ExecutionContextProvider(REGISTRY)
+        print(f"task   legacy: {measure(legacy_get_current):7.1f} ns/event")
+        print(f"task   cached: {measure(task_provider.get_current):7.1f} ns/event")
+
+    asyncio.run(in_task())
+
+
+if __name__ == "__main__":
+    main()
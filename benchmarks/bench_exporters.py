@@ -0,0 +1,96 @@
+"""
+Экспортёры на длинных синтетических трассах: скорость и пик памяти.
+
+События генерируются на лету (дерево глубины 3 с метками времени),
+поэтому пик памяти показывает, что держит сам экспортёр. Он не должен
+расти с длиной трассы.
+
+Запуск: ``python benchmarks/bench_exporters.py [N]``
+"""
+
+from __future__ import annotations
+
+import io
+import sys
+import time
+import tracemalloc
+from typing import TYPE_CHECKING
+
+from flowtrace.events import CallEvent, ExecutionContext
+from flowtrace.exporters import (
+    build_pstats,
+    dump_callgrind,
+    dump_chrome_trace,
+    dump_folded,
+    dump_speedscope,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+
+class _Discard(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def synthetic(n: int) -> Iterator[CallEvent]:
+    """handler → parse → leaf: по 6 событий на дерево, ``n`` событий всего."""
+    ctx = ExecutionContext(thread_id=1)
+    names = ("handler", "parse", "leaf")
+    next_id = 0
+    ts = 0
+    while next_id < n:
+        stack: list[int] = []
+        for name in names:
+            parent = stack[-1] if stack else None
+            yield CallEvent(
+                id=next_id, kind="call", func_name=name, parent_id=parent, context=ctx, ts=ts
+            )
+            stack.append(next_id)
+            next_id += 1
+            ts += 700
+        for name in reversed(names):
+            call_id = stack.pop()
+            yield CallEvent(
+                id=next_id,
+                kind="return",
+                func_name=name,
+                parent_id=call_id,
+                duration=1e-6,
+                context=ctx,
+                ts=ts,
+            )
+            next_id += 1
+            ts += 300
+
+
+EXPORTERS: dict[str, Callable[[Iterator[CallEvent]], object]] = {
+    "chrome_trace": lambda events: dump_chrome_trace(events, _Discard()),
+    "folded": lambda events: dump_folded(events, _Discard()),
+    "speedscope": lambda events: dump_speedscope(events, _Discard()),
+    "pstats": lambda events: build_pstats(events, locations={}),
+    "callgrind": lambda events: dump_callgrind(events, _Discard(), locations={}),
+}
+
+
+def main(n: int = 1_000_000) -> None:
+    for name, export in EXPORTERS.items():
+        t0 = time.perf_counter()
+        export(synthetic(n))
+        elapsed = time.perf_counter() - t0
+
+        peaks = []
+        for size in (n // 100, n // 10):
+            tracemalloc.start()
+            export(synthetic(size))
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(
+            f"{name:13} {n / elapsed / 1e3:6.0f} k events/s  "
+            f"peak {peaks[0] / 1e6:5.2f} MB @ {n // 100}, {peaks[1] / 1e6:5.2f} MB @ {n // 10}"
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,58 @@
+"""
+Накладные расходы трассировки на нагрузке, где почти весь код — библиотечный.
+
+Сравнивает прогон без трассировки, трассировку с фильтрацией на каждом
+событии (``disable_filtered=False``) и режим, в котором непользовательский
+код отключается через ``sys.monitoring.DISABLE``.
+
+Запуск: ``python benchmarks/bench_filtered_disable.py``
+"""
+
+from __future__ import annotations
+
+import time
+from fractions import Fraction
+from statistics import mean
+
+import flowtrace
+
+
+def user_step(i: int) -> Fraction:
+    # один пользовательский вызов на сотни библиотечных
+    terms = [Fraction(i, k) for k in range(1, 40)]
+    return sum(terms, Fraction(0))
+
+
+def workload(n: int = 300) -> Fraction:
+    total = Fraction(0)
+    for i in range(n):
+        total += user_step(i)
+    return total
+
+
+def measure(repeat: int = 5, **trace_kwargs) -> float:
+    samples = []
+    for _ in range(repeat):
+        if trace_kwargs:
+            flowtrace.config(**trace_kwargs)
+            flowtrace.start_tracing(default_show_args=False, default_show_result=False)
+        t0 = time.perf_counter()
+        workload()
+        samples.append(time.perf_counter() - t0)
+        if trace_kwargs:
+            flowtrace.stop_tracing()
+    return mean(samples)
+
+
+def main() -> None:
+    base = measure()
+    per_event = measure(disable_filtered=False)
+    disabled = measure(disable_filtered=True)
+
+    print(f"no tracing:              {base * 1000:8.2f} ms")
+    print(f"filter on every event:   {per_event * 1000:8.2f} ms  (x{per_event / base:.2f})")
+    print(f"DISABLE filtered code:   {disabled * 1000:8.2f} ms  (x{disabled / base:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Пропускная способность JSON Lines экспорта/импорта на миллионе событий.
+
+События генерируются на лету и сразу уходят в ``dump_jsonl``, а
+``iter_jsonl`` читается без сбора в список, так что пик памяти не зависит от
+длины трассы. Показаны скорость в событиях и мегабайтах в секунду и пик
+памяти (tracemalloc) для обоих направлений.
+
+Запуск: ``python benchmarks/bench_jsonl.py [N]``
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import TYPE_CHECKING
+
+from flowtrace.events import CallEvent, ExecutionContext
+from flowtrace.exporters import dump_jsonl, iter_jsonl
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+def synthetic(n: int) -> Iterator[CallEvent]:
+    """Пары call/return с вложенностью 2 и результатом, как в типичной трассе."""
+    ctx = ExecutionContext(thread_id=1)
+    for i in range(0, n, 2):
+        yield CallEvent(
+            id=i,
+            kind="call",
+            func_name="handler",
+            parent_id=i - 1 if i % 4 else None,
+            show_timing=True,
+            context=ctx,
+            ts=i * 1000,
+        )
+        yield CallEvent(
+            id=i + 1,
+            kind="return",
+            func_name="handler",
+            parent_id=i,
+            result_repr=repr(i),
+            duration=1.5e-6,
+            context=ctx,
+            ts=i * 1000 + 1500,
+        )
+
+
+def dump(path: str, n: int) -> float:
+    t0 = time.perf_counter()
+    with open(path, "w", encoding="utf-8") as f:
+        assert dump_jsonl(synthetic(n), f) == n
+    return time.perf_counter() - t0
+
+
+def load(path: str, n: int) -> float:
+    t0 = time.perf_counter()
+    with open(path, encoding="utf-8") as f:
+        assert sum(1 for _ in iter_jsonl(f)) == n
+    return time.perf_counter() - t0
+
+
+def peak_memory(path: str, n: int) -> tuple[int, int]:
+    tracemalloc.start()
+    dump(path, n)
+    peak_write = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    load(path, n)
+    peak_read = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_write, peak_read
+
+
+def main(n: int = 1_000_000) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.jsonl")
+        t_write = dump(path, n)
+        t_read = load(path, n)
+        mb = os.path.getsize(path) / 1e6
+        print(f"{n} events, {mb:.1f} MB ({mb * 1e6 / n:.0f} B/event)")
+        print(f"dump_jsonl {n / t_write / 1e3:7.0f} k events/s  {mb / t_write:6.1f} MB/s")
+        print(f"iter_jsonl {n / t_read / 1e3:7.0f} k events/s  {mb / t_read:6.1f} MB/s")
+
+        # пик памяти не должен расти с длиной трассы (tracemalloc сильно
+        # замедляет работу, поэтому меряется на меньших объёмах)
+        for size in (n // 100, n // 10):
+            peak_write, peak_read = peak_memory(path, size)
+            print(
+                f"peak at {size:>8} events: dump {peak_write / 1e6:5.2f} MB, "
+                f"iter {peak_read / 1e6:5.2f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,65 @@
+"""
+Задержка первого вызова каждой новой функции на большой куче.
+
+Прежний ``CodeNameResolver`` искал функцию через ``gc.get_referrers(code)``,
+то есть обходил все объекты, отслеживаемые GC, на каждый новый code object.
+Здесь он воспроизведён для сравнения с реестром ``@trace`` + ``co_qualname``.
+
+Запуск: ``python benchmarks/bench_name_resolution.py``
+"""
+
+from __future__ import annotations
+
+import gc
+import inspect
+import time
+
+from flowtrace.raw_dispatcher import CodeNameResolver
+
+HEAP_OBJECTS = 2_000_000
+FUNCTIONS = 200
+
+
+def legacy_resolve(code) -> str:
+    resolved_name = code.co_name
+    for obj in gc.get_referrers(code):
+        if (inspect.isfunction(obj) or inspect.ismethod(obj)) and getattr(
+            obj, "__code__", None
+        ) is code:
+            real = getattr(obj, "__flowtrace_real_name__", None)
+            if real:
+                resolved_name = real
+            break
+    return resolved_name
+
+
+def make_functions(n: int) -> list:
+    namespace: dict = {}
+    source = "\n".join(f"def func_{i}():\n    return {i}\n" for i in range(n))
+    exec(compile(source, "<bench_module>", "exec"), namespace)
+    return [namespace[f"func_{i}"] for i in range(n)]
+
+
+def main() -> None:
+    heap = [[i] for i in range(HEAP_OBJECTS)]  # объекты, отслеживаемые GC
+    funcs = make_functions(FUNCTIONS)
+    codes = [f.__code__ for f in funcs]
+
+    t0 = time.perf_counter()
+    for code in codes:
+        legacy_resolve(code)
+    legacy = (time.perf_counter() - t0) / len(codes)
+
+    resolver = CodeNameResolver()
+    t0 = time.perf_counter()
+    for code in codes:
+        resolver.resolve(code)
+    fast = (time.perf_counter() - t0) / len(codes)
+
+    print(f"heap: {len(heap)} GC-tracked objects, {FUNCTIONS} new functions")
+    print(f"gc.get_referrers:     {legacy * 1e3:10.3f} ms per new function")
+    print(f"registry/co_qualname: {fast * 1e6:10.3f} us per new function")
+
+
+if __name__ == "__main__":
+    main()
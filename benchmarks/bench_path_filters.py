@@ -0,0 +1,48 @@
+"""
+Цена решения «пользовательский ли это путь» для кадров traceback.
+
+``_format_exc_tb`` проверяет каждый кадр исключения через ``_is_user_path``.
+Раньше это был ``Path.resolve()`` (системные вызовы) на каждый кадр; теперь
+решение кэшируется по имени файла и сбрасывается только при смене правил
+``config(include=..., exclude=...)``.
+
+Запуск: ``python benchmarks/bench_path_filters.py``
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from pathlib import Path
+
+from flowtrace.monitoring import _is_user_path, _is_user_path_norm, _norm, set_path_filters
+
+PATHS = [__file__, json.__file__, str(Path.cwd() / "app" / "service.py")]
+
+
+def uncached(path: str) -> bool:
+    return _is_user_path_norm(_norm(Path(path).resolve()))
+
+
+def measure(fn, n: int = 50_000) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        for p in PATHS:
+            fn(p)
+    return (time.perf_counter() - t0) / (n * len(PATHS))
+
+
+def main() -> None:
+    for label, patterns in (
+        ("built-in rules", ()),
+        ("with 20 globs", [f"*/pkg{i}/*" for i in range(20)]),
+    ):
+        set_path_filters(include=patterns)
+        slow = measure(uncached)
+        fast = measure(_is_user_path)
+        print(f"{label:15} resolve: {slow * 1e9:8.0f} ns/path   cached: {fast * 1e9:6.0f} ns/path")
+    set_path_filters()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+print_tree на длинных синтетических трассах: 10k / 100k / 1M событий.
+
+Две формы дерева:
+
+- ``wide`` — корень с множеством поддеревьев handler → parse → leaf (каждое
+  поддерево — шесть событий);
+- ``deep`` — цепочки по 2000 вложенных вызовов, глубже лимита рекурсии
+  (одна цепочка на всю трассу дала бы квадратичный по объёму вывод одних
+  отступов).
+
+Вывод идёт в поток-заглушку, поэтому меряется сама отрисовка, без терминала.
+
+Запуск: ``python benchmarks/bench_print_tree.py [N ...]``
+"""
+
+from __future__ import annotations
+
+import io
+import sys
+import time
+
+from flowtrace.events import CallEvent, ExceptionEvent, TraceEvent
+from flowtrace.formatters import print_tree
+
+
+class _Discard(io.TextIOBase):
+    def write(self, s: str) -> int:
+        return len(s)
+
+
+def wide(n: int) -> list[TraceEvent]:
+    events: list[TraceEvent] = [CallEvent(id=0, kind="call", func_name="main", args_repr="")]
+    next_id = 1
+    while next_id < n - 1:
+        stack = [0]
+        for name in ("handler", "parse", "leaf"):
+            events.append(
+                CallEvent(
+                    id=next_id, kind="call", func_name=name, parent_id=stack[-1], args_repr="x=1"
+                )
+            )
+            stack.append(next_id)
+            next_id += 1
+        if next_id % 7 == 0:
+            events.append(
+                ExceptionEvent(
+                    id=next_id,
+                    kind="exception",
+                    func_name="leaf",
+                    parent_id=stack[-1],
+                    exc_type="ValueError",
+                    exc_msg="boom",
+                    caught=True,
+                )
+            )
+            next_id += 1
+        while len(stack) > 1:
+            events.append(
+                CallEvent(
+                    id=next_id,
+                    kind="return",
+                    func_name="leaf",
+                    parent_id=stack.pop(),
+                    result_repr="42",
+                    duration=1e-6,
+                )
+            )
+            next_id += 1
+    events.append(CallEvent(id=next_id, kind="return", func_name="main", parent_id=0))
+    return events
+
+
+def deep(n: int, depth: int = 2000) -> list[TraceEvent]:
+    """Цепочки вложенных вызовов по ``depth`` уровней подряд."""
+    events: list[TraceEvent] = []
+    base = 0
+    while base < n:
+        d = min(depth, (n - base) // 2) or 1
+        events += [
+            CallEvent(
+                id=base + i, kind="call", func_name="rec", parent_id=base + i - 1 if i else None
+            )
+            for i in range(d)
+        ]
+        events += [
+            CallEvent(
+                id=base + 2 * d - 1 - i,
+                kind="return",
+                func_name="rec",
+                parent_id=base + i,
+                duration=1e-6,
+            )
+            for i in reversed(range(d))
+        ]
+        base += 2 * d
+    return events
+
+
+def main(sizes: list[int]) -> None:
+    for shape in (wide, deep):
+        for n in sizes:
+            events = shape(n)
+            t0 = time.perf_counter()
+            print_tree(events, inline_return=True, file=_Discard())
+            elapsed = time.perf_counter() - t0
+            print(
+                f"{shape.__name__:5} {len(events):>9} событий  {elapsed:8.3f}s  "
+                f"{len(events) / elapsed / 1e3:6.0f} k events/s"
+            )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
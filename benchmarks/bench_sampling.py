@@ -0,0 +1,74 @@
+"""
+Цена трассировки сервиса под нагрузкой при сэмплировании запросов.
+
+Каждый «запрос» — отдельное корневое дерево пользовательских вызовов. Без
+сэмплирования на каждый вызов создаются события и ExecutionContext; с
+``sample_every`` деревья вне выборки только проходят через счётчик глубины.
+
+Запуск: ``python benchmarks/bench_sampling.py``
+"""
+
+from __future__ import annotations
+
+import time
+from statistics import mean
+
+import flowtrace
+
+
+def parse(raw: int) -> dict[str, int]:
+    return {"id": raw, "value": raw % 13}
+
+
+def validate(req: dict[str, int]) -> bool:
+    return req["value"] >= 0
+
+
+def render(req: dict[str, int]) -> str:
+    return f"{req['id']}:{req['value']}"
+
+
+def handle(raw: int) -> str:
+    req = parse(raw)
+    if not validate(req):
+        return ""
+    return render(req)
+
+
+def measure(
+    sample_every: int | None,
+    traced: bool = True,
+    n: int = 20_000,
+    repeat: int = 3,
+) -> tuple[float, int]:
+    samples = []
+    n_events = 0
+    for _ in range(repeat):
+        if traced:
+            flowtrace.start_tracing(
+                default_show_args=False,
+                default_show_result=False,
+                default_show_timing=False,
+                sample_every=sample_every,
+            )
+        t0 = time.perf_counter()
+        # цикл в кадре, начатом до трассировки: каждый handle() — корень дерева
+        for i in range(n):
+            handle(i)
+        samples.append(time.perf_counter() - t0)
+        if traced:
+            n_events = len(flowtrace.stop_tracing())
+    return mean(samples), n_events
+
+
+def main() -> None:
+    base, _ = measure(None, traced=False)
+    print(f"{'no tracing':14} {base * 1000:9.2f} ms")
+    for every in (None, 10, 100, 1000):
+        elapsed, n_events = measure(every)
+        label = "every call" if every is None else f"1/{every}"
+        print(f"{label:14} {elapsed * 1000:9.2f} ms  (x{elapsed / base:.2f}, {n_events} events)")
+
+
+if __name__ == "__main__":
+    main()
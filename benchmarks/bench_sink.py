@@ -0,0 +1,88 @@
+"""
+Память и скорость записи: события в памяти против потокового стока.
+
+Без стока все события живут в сессии до ``stop_tracing()``, поэтому пик
+памяти растёт с длиной трассы. С :class:`flowtrace.EventSink` события уходят
+фоновому писателю пачками, и сессия держит только открытые вызовы: пик
+ограничен ёмкостью очереди. Для каждой политики видно и число отброшенных
+событий.
+
+Запуск: ``python benchmarks/bench_sink.py``
+"""
+
+from __future__ import annotations
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+import flowtrace
+
+
+def leaf(i: int) -> int:
+    return i + 1
+
+
+def node(i: int) -> int:
+    return leaf(i) + leaf(i + 1)
+
+
+def workload(n: int) -> int:
+    return sum(node(i) for i in range(n))
+
+
+def _start(sink: flowtrace.EventSink | None) -> None:
+    flowtrace.start_tracing(
+        default_show_args=False,
+        default_show_result=False,
+        default_show_timing=True,
+        sink=sink,
+    )
+
+
+def _count(sink: flowtrace.EventSink | None, events: object) -> int:
+    return sink.written + sink.dropped if sink is not None else len(events)  # type: ignore[arg-type]
+
+
+def capture_rate(sink: flowtrace.EventSink | None, n: int) -> float:
+    _start(sink)
+    t0 = time.perf_counter()
+    workload(n)
+    elapsed = time.perf_counter() - t0
+    events = flowtrace.stop_tracing()
+    return elapsed / max(_count(sink, events), 1)
+
+
+def peak_memory(sink: flowtrace.EventSink | None, n: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    _start(sink)
+    workload(n)
+    flowtrace.stop_tracing()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(n: int = 20_000) -> None:
+    capture = capture_rate(None, n)
+    peak = peak_memory(None, n)
+    print(f"in-memory          {capture * 1e9:7.0f} ns/event  peak {peak / 1e6:6.1f} MB")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trace.jsonl")
+        for policy in ("block", "drop-newest", "drop-oldest"):
+            sink = flowtrace.EventSink(path, capacity=8192, policy=policy)
+            capture = capture_rate(sink, n)
+            dropped, total = sink.dropped, sink.written + sink.dropped
+            peak = peak_memory(flowtrace.EventSink(path, capacity=8192, policy=policy), n)
+            print(
+                f"sink {policy:12}  {capture * 1e9:7.0f} ns/event  peak {peak / 1e6:6.1f} MB  "
+                f"dropped {dropped}/{total}"
+            )
+
+
+if __name__ == "__main__":
+    main()
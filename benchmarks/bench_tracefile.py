@@ -0,0 +1,97 @@
+"""
+Бинарный файл трассы против JSON Lines и pickle: размер, запись, чтение.
+
+Чтение бинарного файла идёт через ``mmap``: открытие читает только таблицы
+имён и контекстов, а события собираются при обращении. Отдельно
+показано время случайного доступа по ``id``.
+
+Запуск: ``python benchmarks/bench_tracefile.py``
+"""
+
+from __future__ import annotations
+
+import os
+import pickle
+import random
+import tempfile
+import time
+
+import flowtrace
+from flowtrace.exporters import dump_jsonl
+from flowtrace.sink import load_events
+from flowtrace.tracefile import TraceFile, write_trace
+
+
+def leaf(i: int) -> int:
+    return i + 1
+
+
+def node(i: int) -> int:
+    return leaf(i) + leaf(i + 1)
+
+
+def workload(n: int) -> int:
+    return sum(node(i) for i in range(n))
+
+
+def capture(n: int) -> list[flowtrace.CallEvent]:
+    flowtrace.start_tracing(default_show_args=False, default_show_result=True)
+    workload(n)
+    return list(flowtrace.stop_tracing())  # type: ignore[arg-type]
+
+
+def timed(func, *args):  # type: ignore[no-untyped-def]
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def write_jsonl(events, path):  # type: ignore[no-untyped-def]
+    with open(path, "w", encoding="utf-8") as f:
+        dump_jsonl(events, f)
+
+
+def write_pickle(events, path):  # type: ignore[no-untyped-def]
+    with open(path, "wb") as f:
+        pickle.dump(events, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_pickle(path):  # type: ignore[no-untyped-def]
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def read_binary(path):  # type: ignore[no-untyped-def]
+    with TraceFile(path) as tf:
+        return sum(1 for _ in tf)
+
+
+def main(n: int = 50_000) -> None:
+    events = capture(n)
+    print(f"{len(events)} events")
+    with tempfile.TemporaryDirectory() as tmp:
+        formats = {
+            "binary": (write_trace, read_binary),
+            "jsonl": (write_jsonl, load_events),
+            "pickle": (write_pickle, read_pickle),
+        }
+        for name, (write, read) in formats.items():
+            path = os.path.join(tmp, f"trace.{name}")
+            _, t_write = timed(write, events, path)
+            _, t_read = timed(read, path)
+            size = os.path.getsize(path)
+            print(
+                f"{name:7} {size / len(events):6.1f} B/event  "
+                f"write {t_write / len(events) * 1e9:6.0f} ns/event  "
+                f"read {t_read / len(events) * 1e9:6.0f} ns/event"
+            )
+
+        path = os.path.join(tmp, "trace.binary")
+        ids = random.sample([e.id for e in events], 10_000)
+        with TraceFile(path) as tf:
+            _, t_get = timed(lambda: [tf.get(i) for i in ids])
+        print(f"binary random get(id): {t_get / len(ids) * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
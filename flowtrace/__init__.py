@@ -1,17 +1,37 @@
 from importlib.metadata import version as _pkg_version
 
 from .config import Config, config, get_config
-from .core import active_tracing, get_trace_data, start_tracing, stop_tracing
+from .core import (
+    active_tracing,
+    dump_trace,
+    get_code_locations,
+    get_live_tasks,
+    get_parked_tasks,
+    get_sampling_stats,
+    get_trace_data,
+    start_flight_recorder,
+    start_tracing,
+    stop_tracing,
+)
 from .decorators import trace
 from .formatters import print_tree
+from .sink import EventSink, load_events
 
 __all__ = [
     "Config",
+    "EventSink",
     "active_tracing",
     "config",
+    "dump_trace",
+    "get_code_locations",
     "get_config",
+    "get_live_tasks",
+    "get_parked_tasks",
+    "get_sampling_stats",
     "get_trace_data",
+    "load_events",
     "print_tree",
+    "start_flight_recorder",
     "start_tracing",
     "stop_tracing",
     "trace",
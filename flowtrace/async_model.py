@@ -28,7 +28,7 @@ class AwaitSegment:
     # иначе None – незакрытый await (например, корутина не успела возобновиться).
     resume_event_id: int | None = None
 
-    # Временные метки.
+    # Временные метки (секунды perf_counter, из TraceEvent.ts).
     start_ts: float | None = None
     end_ts: float | None = None
 
@@ -88,3 +88,16 @@ class TaskTrace:
 
     # ExecutionContext последнего события этой таски.
     last_context: ExecutionContext | None = None
+
+
+@dataclass(slots=True)
+class ParkedTask:
+    """Таска, которая сейчас ждёт в await (живой режим ``live_tasks``)."""
+
+    task: TaskTrace
+
+    # открытый await-сегмент: где ждёт и с какого момента
+    segment: AwaitSegment
+
+    # сколько уже ждёт, секунды; None — у await нет метки времени
+    waited: float | None
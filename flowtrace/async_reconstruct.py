@@ -1,194 +1,242 @@
 from __future__ import annotations
 
-from collections import defaultdict
+from collections import deque
+from time import perf_counter_ns
+from typing import TYPE_CHECKING
 
-from .async_model import AwaitSegment, TaskTrace
-from .events import AsyncTransitionEvent, CallEvent, TraceEvent
+from .async_model import AwaitSegment, ParkedTask, TaskTrace
+from .events import AsyncTransitionEvent, CallEvent
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
 
-def build_task_traces(events: list[TraceEvent]) -> dict[int, TaskTrace]:
+    from .events import TraceEvent
+    from .storage import EventStore
+
+# repr ожидаемого объекта, который ничего не говорит об источнике ожидания
+_OPAQUE_DETAIL = ("<Future", "<Task", "<coroutine")
+
+
+class TaskTraceBuilder:
     """
-    Построить TaskTrace для всех asyncio.Task на основе полного списка событий.
+    Пошаговая реконструкция TaskTrace: события подаются по одному, в порядке трассы.
+
+    Всё считается за один проход вперёд, O(1) на событие:
+
+    A) события раскладываются по таскам (``context.task_id``);
+    B) дерево вызовов: корень — вызов без родителя или с родителем из другой таски;
+    C) await-сегменты: *одна серия await до первого resume = один логический
+       await*; вызов, в котором ждали, — вершина стека вызовов своей таски;
+    D) дочерняя таска привязывается к await-окну родителя, открытому в момент
+       её первого события.
+
+    :attr:`tasks` всегда соответствует уже поданным событиям.
 
-    A) Разложить события по таскам.
-    B) Построить дерево вызовов (roots + call_children) внутри каждой таски.
-    C) Построить await-сегменты: *одна серия await до первого resume = один логический await*.
-    D) Привязать дочерние таски к await-окнам.
+    Таска завершена, когда её стек опустел: стек и незакрытый сегмент (resume
+    после отмены не приходит) забываются. При ``window`` память ограничена для
+    бесконечной записи: индексы событий (``event_ids``) не собираются, а из
+    завершённых тасок в :attr:`tasks` остаются только ``window`` последних.
     """
 
-    tasks: dict[int, TaskTrace] = {}
-
-    # -------------------------
-    # A) Разложить события по таскам
-    # -------------------------
-    for index, ev in enumerate(events):
-        ctx = getattr(ev, "context", None)
-        if ctx is None:
-            continue
-
-        task_id = getattr(ctx, "task_id", None)
-        if task_id is None:
-            continue  # sync-событие
-
-        if task_id not in tasks:
-            tasks[task_id] = TaskTrace(
-                task_id=task_id,
-                parent_task_id=ctx.task_parent_id,
-                task_name=ctx.task_name,
-                thread_id=ctx.thread_id,
+    def __init__(self, *, window: int | None = None) -> None:
+        self.tasks: dict[int, TaskTrace] = {}
+        self.window = window
+        # индекс следующего события в трассе
+        self.index = 0
+        # таска открытого вызова таски: для поиска корней (синхронные не хранятся)
+        self._call_task: dict[int, int] = {}
+        # стек открытых вызовов каждой таски и таска открытого вызова
+        self._stacks: dict[int, list[int]] = {}
+        self._open_calls: dict[int, int] = {}
+        # незакрытый await-сегмент таски
+        self._open_segments: dict[int, AwaitSegment] = {}
+        # завершённые таски в порядке завершения (только при window)
+        self._finished: deque[int] = deque()
+
+    def add(self, ev: TraceEvent) -> None:
+        index = self.index
+        self.index += 1
+
+        ctx = ev.context
+        tid = ctx.task_id if ctx is not None else None
+
+        # --- A) раскладываем события по таскам ---
+        if tid is not None:
+            task = self.tasks.get(tid)
+            if task is None:
+                assert ctx is not None
+                task = self.tasks[tid] = TaskTrace(
+                    task_id=tid,
+                    parent_task_id=ctx.task_parent_id,
+                    task_name=ctx.task_name,
+                    thread_id=ctx.thread_id,
+                    first_event_index=index,
+                )
+                # D) дочерняя таска появилась, пока родитель ждал в await
+                parent_id = ctx.task_parent_id
+                parent_seg = self._open_segments.get(parent_id) if parent_id is not None else None
+                if parent_seg is not None:
+                    parent_seg.children_task_ids.append(tid)
+            if self.window is None:
+                task.event_ids.append(index)
+            task.last_context = ctx
+
+        if isinstance(ev, CallEvent):
+            if ev.kind == "call":
+                self._add_call(ev, tid)
+            elif ev.kind == "return" and ev.parent_id is not None:
+                self._pop_call(ev.parent_id)
+        elif isinstance(ev, AsyncTransitionEvent) and tid is not None:
+            self._add_transition(ev, tid, index)
+
+    def extend(self, events: Iterable[TraceEvent]) -> None:
+        for ev in events:
+            self.add(ev)
+
+    # --- B) дерево вызовов и стеки тасок ---
+
+    def _add_call(self, ev: CallEvent, tid: int | None) -> None:
+        if tid is None:
+            return
+
+        self._call_task[ev.id] = tid
+        task = self.tasks[tid]
+        parent_id = ev.parent_id
+        if parent_id is None or self._call_task.get(parent_id) != tid:
+            task.roots.append(ev.id)
+        else:
+            task.call_children.setdefault(parent_id, []).append(ev.id)
+
+        stack = self._stacks.get(tid)
+        if stack is None:
+            stack = self._stacks[tid] = []
+        stack.append(ev.id)
+        self._open_calls[ev.id] = tid
+
+    def _pop_call(self, call_id: int) -> None:
+        tid = self._open_calls.pop(call_id, None)
+        if tid is None:
+            return
+        # вызовы выше на стеке своего return не дождались (например, трасса
+        # обрезана) — снимаем их вместе с этим
+        stack = self._stacks[tid]
+        while stack:
+            top = stack.pop()
+            self._call_task.pop(top, None)
+            if top == call_id:
+                break
+            self._open_calls.pop(top, None)
+        if not stack:
+            self._finish(tid)
+
+    def _finish(self, tid: int) -> None:
+        """Стек таски опустел — таска завершилась."""
+        del self._stacks[tid]
+        self._open_segments.pop(tid, None)
+        if self.window is None:
+            return
+        finished = self._finished
+        finished.append(tid)
+        while len(finished) > self.window:
+            old = finished.popleft()
+            # таска могла снова появиться после завершения — такую не трогаем
+            if old not in self._stacks:
+                self.tasks.pop(old, None)
+
+    def active_call(self, task_id: int) -> int:
+        """Вызов на вершине стека таски или -1, если таска сейчас вне вызовов."""
+        stack = self._stacks.get(task_id)
+        return stack[-1] if stack else -1
+
+    def parked(self, now: float | None = None) -> list[ParkedTask]:
+        """
+        Таски, которые сейчас ждут в await (сегмент открыт, resume ещё не было),
+        — самые долгие ожидания первыми. ``now`` — секунды ``perf_counter``.
+        """
+        if now is None:
+            now = perf_counter_ns() / 1e9
+        # копия словаря атомарна под GIL: поток-владелец может продолжать запись
+        parked = [
+            ParkedTask(
+                task=self.tasks[tid],
+                segment=seg,
+                waited=now - seg.start_ts if seg.start_ts is not None else None,
+            )
+            for tid, seg in dict(self._open_segments).items()
+        ]
+        parked.sort(key=lambda p: p.waited if p.waited is not None else -1.0, reverse=True)
+        return parked
+
+    # --- C) await ↔ resume ---
+
+    def _add_transition(self, tr: AsyncTransitionEvent, tid: int, index: int) -> None:
+        if tr.kind == "await":
+            # первая await в серии открывает сегмент, остальные до resume — внутренние
+            if tid in self._open_segments:
+                return
+            detail = tr.detail
+            if isinstance(detail, str) and detail.startswith(_OPAQUE_DETAIL):
+                detail = None
+            seg = AwaitSegment(
+                call_id=self.active_call(tid),
+                await_event_id=index,  # глобальный индекс события await
+                start_ts=tr.ts / 1e9 if tr.ts is not None else None,
+                detail=detail,
             )
-            tasks[task_id].first_event_index = index
-
-        task = tasks[task_id]
-        task.event_ids.append(index)
-        task.last_context = ctx
-
-    if not tasks:
-        return tasks
-
-    # -------------------------
-    # B) Дерево вызовов внутри каждой таски
-    # -------------------------
-    call_task_by_id: dict[int, int] = {}
-    for ev in events:
-        if isinstance(ev, CallEvent) and ev.context is not None:
-            tid = ev.context.task_id
-            if tid is not None:
-                call_task_by_id[ev.id] = tid
-
-    for ev in events:
-        if not isinstance(ev, CallEvent):
-            continue
-        if ev.kind != "call":
-            continue
-        if ev.context is None or ev.context.task_id is None:
-            continue
-
-        tid = ev.context.task_id
-        current_task = tasks.get(tid)
-        if current_task is None:
-            continue
+            # сегменты одной таски не пересекаются: порядок открытия = порядок закрытия
+            self.tasks[tid].await_segments.append(seg)
+            self._open_segments[tid] = seg
+            return
 
-        parent_id = ev.parent_id
-        if parent_id is None:
-            current_task.roots.append(ev.id)
-            continue
+        if tr.kind == "resume":
+            closed = self._open_segments.pop(tid, None)
+            if closed is not None:
+                closed.resume_event_id = index  # глобальный индекс resume
+                if closed.start_ts is not None and tr.ts is not None:
+                    closed.end_ts = tr.ts / 1e9
+                    closed.duration = closed.end_ts - closed.start_ts
+
+        # kind="yield" и прочие переходы в await-сегменты не входят
 
-        parent_tid = call_task_by_id.get(parent_id)
-        if parent_tid != tid:
-            current_task.roots.append(ev.id)
-            continue
 
-        current_task.call_children.setdefault(parent_id, []).append(ev.id)
+def build_task_traces(events: Iterable[TraceEvent]) -> dict[int, TaskTrace]:
+    """
+    Построить TaskTrace для всех asyncio.Task по списку событий.
+
+    Один проход :class:`TaskTraceBuilder`: линейно по числу событий и тасок.
+    """
+    builder = TaskTraceBuilder()
+    builder.extend(events)
+    return builder.tasks
 
-    # -------------------------
-    # Служебное: глобальный стек call_id по индексу события,
-    # чтобы знать активную функцию на момент await.
-    # -------------------------
-    global_call_stack: list[tuple[int, int | None]] = []
-    active_call_by_index: dict[int, int] = {}
 
-    for idx, ev in enumerate(events):
-        ctx = getattr(ev, "context", None)
-        tid = getattr(ctx, "task_id", None)
+class LiveTaskStore:
+    """
+    EventStore-обёртка живого режима (``live_tasks``): каждое записанное
+    событие сразу уходит в :class:`TaskTraceBuilder`, так что TaskTrace
+    актуальны во время записи, а не только после ``build_task_traces``.
 
-        if isinstance(ev, CallEvent) and ev.kind == "call":
-            global_call_stack.append((ev.id, tid))
-        elif isinstance(ev, CallEvent) and ev.kind == "return" and global_call_stack:
-            global_call_stack.pop()
+    Индексы событий в TaskTrace — порядковые номера в потоке записи.
+    ``window`` — для хранилищ, которые держат не все события (кольцевой
+    буфер, сток): см. :class:`TaskTraceBuilder`.
+    """
 
-        if tid is not None:
-            top_call_id = -1
-            for cid, stack_tid in reversed(global_call_stack):
-                if stack_tid == tid:
-                    top_call_id = cid
-                    break
-            active_call_by_index[idx] = top_call_id
-
-    # -------------------------
-    # C) await↔resume по каждой таске (правильная модель CPython)
-    #
-    # Логика:
-    # - первая await в серии открывает сегмент
-    # - все последующие await до resume считаются внутренними и игнорируются
-    # - первый resume закрывает сегмент
-    # -------------------------
-    transitions_by_task: dict[int, list[tuple[int, AsyncTransitionEvent]]] = defaultdict(list)
-
-    for index, ev in enumerate(events):
-        if ev.context is None or ev.context.task_id is None:
-            continue
-        tid = ev.context.task_id
-        if isinstance(ev, AsyncTransitionEvent):
-            transitions_by_task[tid].append((index, ev))
-
-    for tid, task in tasks.items():
-        transitions = transitions_by_task.get(tid, [])
-        if not transitions:
-            continue
-
-        open_seg: AwaitSegment | None = None
-        segs: list[AwaitSegment] = []
-
-        for idx, tr in transitions:
-            if tr.kind == "await":
-                if open_seg is None:
-                    call_id = active_call_by_index.get(idx, -1)
-                    open_seg = AwaitSegment(
-                        call_id=call_id,
-                        await_event_id=idx,  # глобальный индекс события await
-                        resume_event_id=None,
-                        start_ts=None,
-                        end_ts=None,
-                        duration=None,
-                        detail=getattr(tr, "detail", None),
-                        children_task_ids=[],
-                    )
-                # внутренние await в этой же серии игнорируем
-                continue
-
-            if tr.kind == "resume":
-                if open_seg is not None:
-                    open_seg.resume_event_id = idx  # глобальный индекс resume
-                    segs.append(open_seg)
-                    open_seg = None
-                continue
-
-            # kind="yield" и прочие переходы в await-сегменты не входят
-            continue
-
-        # если серия await не закрылась resume (редко, но бывает)
-        if open_seg is not None:
-            segs.append(open_seg)
-
-        # лёгкая нормализация detail (не выкидываем сегменты!)
-        for seg in segs:
-            if isinstance(seg.detail, str) and (
-                seg.detail.startswith("<Future")
-                or seg.detail.startswith("<Task")
-                or seg.detail.startswith("<coroutine")
-            ):
-                seg.detail = None
-
-        task.await_segments = segs
-
-    # -------------------------
-    # D) Привязываем дочерние таски к await-окнам
-    # -------------------------
-    for tid, task in tasks.items():
-        child_tasks = [c for c in tasks.values() if c.parent_task_id == tid]
-
-        for seg in task.await_segments:
-            start_idx = seg.await_event_id
-            end_idx = seg.resume_event_id or (len(events) - 1)
-
-            for child in child_tasks:
-                if child.first_event_index is None:
-                    continue
-                if start_idx <= child.first_event_index <= end_idx:
-                    seg.children_task_ids.append(child.task_id)
-
-            if seg.children_task_ids:
-                seg.children_task_ids = list(dict.fromkeys(seg.children_task_ids))
-
-    return tasks
+    def __init__(self, inner: EventStore, *, window: int | None = None) -> None:
+        self.inner = inner
+        self.builder = TaskTraceBuilder(window=window)
+
+    def append(self, event: TraceEvent) -> None:
+        self.builder.add(event)
+        self.inner.append(event)
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        return self.inner.get(event_id)
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        return self.inner.set_caught(event_id, caught)
+
+    def snapshot(self) -> Sequence[TraceEvent]:
+        return self.inner.snapshot()
+
+    def __len__(self) -> int:
+        return len(self.inner)
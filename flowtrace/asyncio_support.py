@@ -1,50 +1,90 @@
 from __future__ import annotations
 
 import asyncio
-import threading
+import weakref
 from contextlib import suppress
+from itertools import count
+from typing import Any
 
-# глобальные счётчики для async_id
-_async_counter = 1
-_lock = threading.Lock()
 
-# таблицы для реестра корутин и их иерархий
-TASK_TO_ASYNC_ID: dict[asyncio.Task, int] = {}
-ASYNC_PARENT: dict[int, int | None] = {}
-
-
-def _reserve_async_id(parent: int | None = None) -> int:
-    global _async_counter
-    with _lock:
-        aid = _async_counter
-        _async_counter += 1
-    ASYNC_PARENT[aid] = parent
-    return aid
-
-
-def _task_factory(loop, coro):
-    """
-    Перехват создания задач.
-    Назначает каждой asyncio.Task свой async_id,
-    а также регистрирует родителя, если есть текущая задача.
+class TaskRegistry:
     """
-    parent_task = asyncio.current_task(loop=loop)
-    parent_id = TASK_TO_ASYNC_ID.get(parent_task) if parent_task else None
+    Реестр asyncio.Task одной сессии: async_id каждой задачи и id её родителя.
 
-    task = asyncio.Task(coro, loop=loop)
-
-    async_id = _reserve_async_id(parent_id)
-    TASK_TO_ASYNC_ID[task] = async_id
-
-    return task
+    Задачи хранятся по слабым ссылкам: запись исчезает вместе с задачей, и
+    реестр не продлевает жизнь ни задаче, ни её корутине с кадром и
+    локальными переменными. Реестр принадлежит сессии и очищается при её
+    остановке. id выдаёт ``itertools.count``: ``next()`` атомарен под GIL,
+    блокировка не нужна.
+    """
 
+    def __init__(self) -> None:
+        self._ids = count(1)
+        # задача -> (async_id, async_id родителя)
+        self._tasks: weakref.WeakKeyDictionary[asyncio.Task, tuple[int, int | None]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def register(self, task: asyncio.Task, parent: asyncio.Task | None = None) -> int:
+        """
+        Выдаёт задаче новый async_id. Родитель, созданный ещё до сессии,
+        получает id здесь же, чтобы связь не потерялась.
+        """
+        parent_id = self.get_async_id(parent) if parent is not None else None
+        aid = next(self._ids)
+        self._tasks[task] = (aid, parent_id)
+        return aid
 
-def install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    def get_async_id(self, task: asyncio.Task | None = None) -> int | None:
+        """
+        Ленивая выдача async_id:
+        - если задача известна → отдаём async_id
+        - если неизвестна → создаём новый async_id (но без родителя)
+          (эта ветка нужна для случаев, когда set_task_factory недоступен)
+        """
+        if task is None:
+            task = asyncio.current_task()
+
+        if task is None:
+            return None
+
+        entry = self._tasks.get(task)
+        if entry is not None:
+            return entry[0]
+
+        # fallback — lazy assign
+        return self.register(task)
+
+    def parent_id(self, task: asyncio.Task) -> int | None:
+        entry = self._tasks.get(task)
+        return entry[1] if entry is not None else None
+
+    def task_factory(
+        self, loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any
+    ) -> asyncio.Task:
+        """
+        Перехват создания задач.
+        Назначает каждой asyncio.Task свой async_id,
+        а также регистрирует родителя, если есть текущая задача.
+        """
+        parent_task = asyncio.current_task(loop=loop)
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        self.register(task, parent_task)
+        return task
+
+    def clear(self) -> None:
+        self._tasks.clear()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+
+def install_task_factory(loop: asyncio.AbstractEventLoop, registry: TaskRegistry) -> None:
     """
     Включает наше наблюдение за созданием задач.
     """
     with suppress(Exception):
-        loop.set_task_factory(_task_factory)
+        loop.set_task_factory(registry.task_factory)
 
 
 def uninstall_task_factory(loop: asyncio.AbstractEventLoop) -> None:
@@ -53,26 +93,3 @@ def uninstall_task_factory(loop: asyncio.AbstractEventLoop) -> None:
     """
     with suppress(Exception):
         loop.set_task_factory(None)
-
-
-def get_async_id(task: asyncio.Task | None = None) -> int | None:
-    """
-    Ленивая выдача async_id:
-    - если задача известна → отдаём async_id
-    - если неизвестна → создаём новый async_id (но без родителя)
-      (эта ветка нужна для случаев, когда set_task_factory недоступен)
-    """
-    if task is None:
-        task = asyncio.current_task()
-
-    if task is None:
-        return None
-
-    aid = TASK_TO_ASYNC_ID.get(task)
-    if aid is not None:
-        return aid
-
-    # fallback — lazy assign
-    new_id = _reserve_async_id(parent=None)
-    TASK_TO_ASYNC_ID[task] = new_id
-    return new_id
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from time import process_time_ns, thread_time_ns
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Часы, которыми CallTracker меряет длительность вызова:
+# "wall"    — perf_counter (CallEvent.duration), по умолчанию;
+# "thread"  — CPU-время потока, thread_time (CallEvent.cpu_duration);
+# "process" — CPU-время процесса, process_time (CallEvent.cpu_duration);
+# "dual"    — wall и CPU потока одновременно: видно, ждал вызов или считал.
+ClockKind = Literal["wall", "thread", "process", "dual"]
+
+_CPU_CLOCKS: dict[str, Callable[[], int]] = {
+    "thread": thread_time_ns,
+    "process": process_time_ns,
+    "dual": thread_time_ns,
+}
+
+
+def measures_wall(clock: ClockKind) -> bool:
+    """Заполняет ли сессия с этими часами ``CallEvent.duration``."""
+    return clock in ("wall", "dual")
+
+
+def cpu_clock(clock: ClockKind) -> Callable[[], int] | None:
+    """Функция CPU-часов (в наносекундах) или ``None``, если CPU-время не меряется."""
+    if clock not in ("wall", "thread", "process", "dual"):
+        raise ValueError(f"[FlowTrace] unknown clock {clock!r}")
+    return _CPU_CLOCKS.get(clock)
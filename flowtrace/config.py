@@ -1,11 +1,26 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Literal
+
+from flowtrace.monitoring import set_path_filters
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from flowtrace.clocks import ClockKind
+    from flowtrace.storage import StorageKind
 
 _DEFAULT_TB_DEPTH = 2
 
 ShowExc = bool | int
 
+# Набор событий sys.monitoring, на которые подписывается сессия:
+# "calls"      — только структура вызовов (PY_START/PY_RETURN/PY_UNWIND);
+# "exceptions" — вызовы + жизненный цикл исключений;
+# "full"       — всё, включая async-переходы (PY_RESUME/PY_YIELD).
+EventProfile = Literal["calls", "exceptions", "full"]
+
 
 @dataclass(slots=True)
 class Config:
@@ -14,6 +29,23 @@ class Config:
     show_timing: bool = True
     show_exc: ShowExc = False
     inline_return: bool = False
+    # отключать события для непользовательского кода через sys.monitoring.DISABLE
+    disable_filtered: bool = True
+    # @trace, запускающий свою сессию, включает события только на своей функции
+    scoped: bool = False
+    event_profile: EventProfile = "full"
+    # правила отбора пользовательского кода по пути файла: glob или "re:<regex>";
+    # exclude важнее include, остальное решают встроенные правила
+    include: tuple[str, ...] = ()
+    exclude: tuple[str, ...] = ()
+    # хранилище событий: "objects" (dataclass на событие) или "columnar" (колонки)
+    storage: StorageKind = "objects"
+    # метка perf_counter_ns на каждом событии (длительности await, промежутки между вызовами)
+    timestamps: bool = False
+    # часы для длительности вызовов: "wall", "thread", "process" или "dual" (wall + CPU)
+    clock: ClockKind = "wall"
+    # поддерживать TaskTrace asyncio-тасок во время записи (get_live_tasks / get_parked_tasks)
+    live_tasks: bool = False
 
     def exc_enabled(self) -> bool:
         return bool(self.show_exc)
@@ -41,14 +73,32 @@ def config(
     show_exc: bool | int | None = None,
     inline_return: bool | None = None,
     exc_tb_depth: int | None = None,
+    disable_filtered: bool | None = None,
+    scoped: bool | None = None,
+    event_profile: EventProfile | None = None,
+    include: Iterable[str] | None = None,
+    exclude: Iterable[str] | None = None,
+    storage: StorageKind | None = None,
+    timestamps: bool | None = None,
+    clock: ClockKind | None = None,
+    live_tasks: bool | None = None,
 ) -> Config:
     global _CONFIG
 
     if "exc_tb_depth" in locals() and exc_tb_depth is not None and show_exc is None:
         show_exc = int(exc_tb_depth)
+    if include is not None:
+        include = tuple(include)
+    if exclude is not None:
+        exclude = tuple(exclude)
 
-    _CONFIG = replace(
+    new = replace(
         _CONFIG,
         **{k: v for k, v in locals().items() if hasattr(_CONFIG, k) and v is not None},
     )
+
+    # правила компилируются до замены конфига: ошибочный шаблон его не портит
+    if include is not None or exclude is not None:
+        set_path_filters(new.include, new.exclude)
+    _CONFIG = new
     return _CONFIG
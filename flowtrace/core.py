@@ -1,82 +1,279 @@
 from __future__ import annotations
 
 import sys
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Sequence
 from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, TextIO
 
 try:
     import asyncio
 except Exception:
     asyncio = None  # type: ignore[assignment]
 
-from flowtrace.config import get_config
+from flowtrace.async_model import ParkedTask, TaskTrace
+from flowtrace.clocks import ClockKind
+from flowtrace.config import EventProfile, get_config
 from flowtrace.events import CallEvent, TraceEvent
+from flowtrace.flight_recorder import FlightRecorderSession
 from flowtrace.monitoring import reserve_tool_id, start_monitoring, stop_monitoring
+from flowtrace.sampling import Sampler, SamplingStats
 from flowtrace.session import CURRENT_SESSION as _CURRENT_SESSION
 from flowtrace.session import TraceSession
+from flowtrace.sink import EventSink
+from flowtrace.storage import StorageKind
+from flowtrace.utils.code_objects import callable_codes
+
+if TYPE_CHECKING:
+    import os
 
 Cb = Callable[..., None]
 
-_last_data: list[TraceEvent] | None = None
+_last_data: Sequence[TraceEvent] | None = None
+_last_sampling: SamplingStats | None = None
+_last_locations: dict[str, tuple[str, int]] = {}
+# sys.monitoring глобален для процесса, поэтому активная сессия одна на процесс:
+# её видят и потоки, запущенные после start_tracing (у них contextvar пуст)
+_ACTIVE_SESSION: TraceSession | None = None
 TOOL_ID = reserve_tool_id()
 
 
-def start_tracing(
+def _session_kwargs(
     default_show_args: bool | None = None,
     default_show_result: bool | None = None,
     default_show_timing: bool | None = None,
     default_exc_tb_depth: int | None = None,
-) -> None:
+    scope: Iterable[object] | None = None,
+    event_profile: EventProfile | None = None,
+    sample_rate: float | None = None,
+    sample_every: int | None = None,
+    storage: StorageKind | None = None,
+    clock: ClockKind | None = None,
+    sink: EventSink | str | os.PathLike[str] | None = None,
+    live_tasks: bool | None = None,
+) -> dict[str, Any]:
+    """Параметры TraceSession с учётом глобального config()."""
     cfg = get_config()
-
-    # 1. Создаём новую сессию
-    sess = TraceSession(
-        default_show_args=(cfg.show_args if default_show_args is None else default_show_args),
-        default_show_result=(
+    return {
+        "default_show_args": cfg.show_args if default_show_args is None else default_show_args,
+        "default_show_result": (
             cfg.show_result if default_show_result is None else default_show_result
         ),
-        default_show_timing=(
+        "default_show_timing": (
             cfg.show_timing if default_show_timing is None else default_show_timing
         ),
-        default_exc_tb_depth=(
+        "default_exc_tb_depth": (
             cfg.exc_depth() if default_exc_tb_depth is None else max(0, int(default_exc_tb_depth))
         ),
-    )
+        "disable_filtered": cfg.disable_filtered,
+        "scope": None if scope is None else [c for obj in scope for c in callable_codes(obj)],
+        "event_profile": cfg.event_profile if event_profile is None else event_profile,
+        "sampler": Sampler.create(sample_rate, sample_every),
+        "storage": cfg.storage if storage is None else storage,
+        "timestamps": cfg.timestamps,
+        "clock": cfg.clock if clock is None else clock,
+        "sink": sink if sink is None or isinstance(sink, EventSink) else EventSink(sink),
+        "live_tasks": cfg.live_tasks if live_tasks is None else live_tasks,
+    }
+
+
+def _current_session() -> TraceSession | None:
+    if _ACTIVE_SESSION is not None:
+        return _ACTIVE_SESSION
+    return _CURRENT_SESSION.get()
 
-    # 2. Регистрируем её в contextvar
+
+def _activate(sess: TraceSession) -> None:
+    global _ACTIVE_SESSION
+
+    # 1. Регистрируем сессию в contextvar и как активную сессию процесса
     _CURRENT_SESSION.set(sess)
+    _ACTIVE_SESSION = sess
 
-    # 3. Запускаем сессию: active + async-hooks
+    # 2. Запускаем сессию: active + async-hooks
     sess.start()
 
-    # 4. Включаем мониторинг
-    start_monitoring(TOOL_ID)
+    # 3. Включаем мониторинг: колбеки диспетчера привязаны к этой сессии
+    start_monitoring(TOOL_ID, sess.raw_dispatcher.callbacks(), scoped=sess.raw_dispatcher.scoped)
+    sess.raw_dispatcher.attach(TOOL_ID)
 
-    # 5. Запоминаем сессию внутри sys.monitoring (для удобства декораторов)
+    # 4. Запоминаем сессию внутри sys.monitoring (для удобства декораторов)
     sys.monitoring.flowtrace_session = sess  # type: ignore[attr-defined]
 
 
+def start_tracing(
+    default_show_args: bool | None = None,
+    default_show_result: bool | None = None,
+    default_show_timing: bool | None = None,
+    default_exc_tb_depth: int | None = None,
+    scope: Iterable[object] | None = None,
+    event_profile: EventProfile | None = None,
+    sample_rate: float | None = None,
+    sample_every: int | None = None,
+    storage: StorageKind | None = None,
+    clock: ClockKind | None = None,
+    sink: EventSink | str | os.PathLike[str] | None = None,
+    live_tasks: bool | None = None,
+) -> None:
+    """
+    Запускает сессию трассировки.
+
+    ``scope`` — функции (или code objects), которыми ограничивается
+    трассировка: события включаются только на них и на пользовательском коде,
+    который они вызывают. ``None`` — трассировать весь пользовательский код.
+
+    ``event_profile`` — набор событий (``"calls"``, ``"exceptions"``, ``"full"``);
+    по умолчанию берётся из ``config()``.
+
+    ``sample_rate`` (доля 0..1) или ``sample_every`` (каждое N-е) включают
+    сэмплирование: решение принимается на корневом вызове, и деревья вне
+    выборки не создают событий. Итоги — :func:`get_sampling_stats`.
+
+    ``storage`` — движок хранения событий (``"objects"`` или ``"columnar"``);
+    по умолчанию берётся из ``config()``.
+
+    ``clock`` — часы длительности вызовов: ``"wall"`` (``duration``),
+    ``"thread"``/``"process"`` (CPU-время в ``cpu_duration``) или ``"dual"``
+    (оба поля); по умолчанию берётся из ``config()``.
+
+    ``sink`` — :class:`~flowtrace.sink.EventSink` или путь к файлу: события
+    пишутся фоновым потоком по мере появления и не копятся в памяти,
+    ``stop_tracing()`` тогда возвращает пустой список. Прочитать файл —
+    :func:`~flowtrace.sink.load_events`.
+
+    ``live_tasks`` — поддерживать TaskTrace asyncio-тасок по мере записи:
+    :func:`get_live_tasks` и :func:`get_parked_tasks` отвечают без остановки
+    сессии и без повторной реконструкции; по умолчанию берётся из ``config()``.
+    """
+    _activate(
+        TraceSession(
+            **_session_kwargs(
+                default_show_args,
+                default_show_result,
+                default_show_timing,
+                default_exc_tb_depth,
+                scope,
+                event_profile,
+                sample_rate,
+                sample_every,
+                storage,
+                clock,
+                sink,
+                live_tasks,
+            )
+        )
+    )
+
+
+def start_flight_recorder(
+    max_events: int = 10_000,
+    *,
+    max_age: float | None = None,
+    dump_on_crash: bool = True,
+    dump_on_exit: bool = True,
+    file: TextIO | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Запускает сессию в режиме flight recorder: хранятся только последние
+    ``max_events`` событий (и не старше ``max_age`` секунд, если задано).
+
+    Дерево последних событий печатается в ``file`` (по умолчанию stderr) при
+    необработанном исключении, при выходе из интерпретатора и по
+    :func:`dump_trace`. Остальные параметры — как у :func:`start_tracing`.
+    """
+    _activate(
+        FlightRecorderSession(
+            max_events=max_events,
+            max_age=max_age,
+            dump_on_crash=dump_on_crash,
+            dump_on_exit=dump_on_exit,
+            file=file,
+            **_session_kwargs(**kwargs),
+        )
+    )
+
+
+def dump_trace(file: TextIO | None = None) -> Sequence[TraceEvent]:
+    """
+    Снимок событий активной сессии без её остановки.
+
+    Для flight recorder дополнительно печатает дерево вызовов в ``file``.
+    """
+    sess = _current_session()
+    if not sess:
+        return []
+    if isinstance(sess, FlightRecorderSession):
+        return sess.dump(file)
+    return sess.snapshot()
+
+
 def is_tracing_active() -> bool:
-    sess = _CURRENT_SESSION.get()
+    sess = _current_session()
     return bool(sess and sess.state.active)
 
 
-def stop_tracing() -> list[TraceEvent]:
-    global _last_data
-    sess = _CURRENT_SESSION.get()
+def stop_tracing() -> Sequence[TraceEvent]:
+    global _last_data, _last_sampling, _last_locations, _ACTIVE_SESSION
+    sess = _current_session()
     if not sess:
         return []
 
     stop_monitoring(TOOL_ID)
 
-    data = sess.stop()
+    try:
+        # сток может сообщить об ошибке записи: сессия всё равно снимается
+        data = sess.stop()
+    finally:
+        _ACTIVE_SESSION = None
+        _last_data = []
+        _last_sampling = sess.sampling_stats()
+        _last_locations = sess.raw_dispatcher.code_locations()
+        sys.monitoring.flowtrace_session = None  # type: ignore[attr-defined]
     _last_data = data
-    sys.monitoring.flowtrace_session = None  # type: ignore[attr-defined]
     return data
 
 
-def get_trace_data() -> list[TraceEvent]:
-    return list(_last_data) if _last_data else []
+def get_trace_data() -> Sequence[TraceEvent]:
+    if not _last_data:
+        return []
+    # список копируем, чтобы его не испортили снаружи; ленивые представления неизменяемы
+    return list(_last_data) if isinstance(_last_data, list) else _last_data
+
+
+def get_sampling_stats() -> SamplingStats | None:
+    """Итоги сэмплирования последней сессии (``None`` — сэмплирование не включалось)."""
+    return _last_sampling
+
+
+def get_code_locations() -> dict[str, tuple[str, int]]:
+    """
+    Исходники функций последней сессии: имя → (файл, первая строка).
+
+    Нужны экспортёрам профилей (pstats, callgrind), чтобы привязать имена из
+    событий к коду.
+    """
+    return dict(_last_locations)
+
+
+def get_live_tasks() -> dict[int, TaskTrace]:
+    """
+    TaskTrace asyncio-тасок активной сессии, актуальные на момент вызова.
+
+    Работает в сессии с ``live_tasks=True``; иначе (или без активной
+    сессии) — пустой словарь. После остановки — ``build_task_traces(get_trace_data())``.
+    """
+    sess = _current_session()
+    return sess.task_traces() if sess is not None else {}
+
+
+def get_parked_tasks() -> list[ParkedTask]:
+    """
+    Таски активной сессии, которые сейчас ждут в await, и сколько они уже ждут.
+
+    Самые долгие ожидания первыми; требует ``live_tasks=True``.
+    """
+    sess = _current_session()
+    return sess.parked_tasks() if sess is not None else []
 
 
 @contextmanager
@@ -92,8 +289,14 @@ def active_tracing(**kwargs):
 __all__ = [
     "CallEvent",
     "active_tracing",
+    "dump_trace",
+    "get_code_locations",
+    "get_live_tasks",
+    "get_parked_tasks",
+    "get_sampling_stats",
     "get_trace_data",
     "is_tracing_active",
+    "start_flight_recorder",
     "start_tracing",
     "stop_tracing",
 ]
@@ -2,15 +2,29 @@ import inspect
 import sys
 from collections.abc import Callable
 from functools import wraps
+from types import CodeType
 from typing import Any, TypeVar, cast, overload
 
 from .config import get_config
 from .core import get_trace_data, is_tracing_active, start_tracing, stop_tracing
 from .formatters import print_tree
+from .formatters.formatters import format_sampling
+from .raw_dispatcher import register_code_name
+from .sampling import Sampler
+from .utils.code_objects import callable_codes
 
 F = TypeVar("F", bound=Callable[..., Any])
 
 
+def _real_name(func: Callable[..., Any]) -> str:
+    """Имя, под которым функция попадает в трассу (совпадает с ``co_qualname``)."""
+    for attr in ("__flowtrace_real_name__", "__qualname__", "__name__"):
+        name = getattr(func, attr, None)
+        if isinstance(name, str) and name:
+            return name
+    return func.__class__.__name__
+
+
 @overload
 def trace(func: F) -> F: ...
 
@@ -23,6 +37,9 @@ def trace(
     show_result: bool | None = None,
     show_timing: bool | None = None,
     exc_tb_depth: int | None = None,
+    scoped: bool | None = None,
+    sample_rate: float | None = None,
+    sample_every: int | None = None,
 ) -> Callable[[F], F]: ...
 
 
@@ -33,9 +50,20 @@ def trace(
     show_result: bool | None = None,
     show_timing: bool | None = None,
     exc_tb_depth: int | None = None,
+    scoped: bool | None = None,
+    sample_rate: float | None = None,
+    sample_every: int | None = None,
 ) -> F | Callable[[F], F]:
     def decorator(real_func: F) -> F:
         sig = inspect.signature(real_func)
+        scope_codes = callable_codes(real_func)
+        # сэмплер на декорированную функцию: решает только за вызовы-корни
+        sampler = Sampler.create(sample_rate, sample_every)
+
+        real_name = _real_name(real_func)
+        inner_code = getattr(inspect.unwrap(real_func), "__code__", None)
+        if isinstance(inner_code, CodeType):
+            register_code_name(inner_code, real_name)
 
         def _format_named_args(args: tuple[Any, ...], kwargs: dict[str, Any]) -> str:
             try:
@@ -56,35 +84,43 @@ def trace(
 
         @wraps(real_func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
+            cfg = get_config()
+
             fresh = not is_tracing_active()
+            sampled: bool | None = None
+            if fresh and sampler is not None:
+                # вне выборки функция выполняется без трассировки вообще
+                if not sampler.decide():
+                    return real_func(*args, **kwargs)
+                sampled = True
             if fresh:
-                start_tracing()
-
-            cfg = get_config()
+                use_scope = cfg.scoped if scoped is None else scoped
+                start_tracing(scope=[real_func] if use_scope else None)
             collect_args = show_args if show_args is not None else cfg.show_args
             collect_result = show_result if show_result is not None else cfg.show_result
             collect_timing = show_timing if show_timing is not None else cfg.show_timing
 
             depth = cfg.exc_depth() if exc_tb_depth is None else max(0, int(exc_tb_depth))
 
-            args_repr = _format_named_args(args, kwargs) if collect_args else None
+            sess = getattr(sys.monitoring, "flowtrace_session", None)
+            if sampler is not None and not fresh and sess and sess.at_root():
+                sampled = sampler.decide()
 
-            if hasattr(real_func, "__flowtrace_real_name__"):
-                target_name = real_func.__flowtrace_real_name__  # type: ignore[attr-defined]
-            elif hasattr(real_func, "__name__"):
-                target_name = real_func.__name__  # type: ignore[attr-defined]
-            else:
-                target_name = real_func.__class__.__name__
+            args_repr = (
+                _format_named_args(args, kwargs) if collect_args and sampled is not False else None
+            )
 
-            sess = getattr(sys.monitoring, "flowtrace_session", None)
-            if sess and getattr(sess, "active", False):
+            if sess and sess.state.active:
+                for code in scope_codes:
+                    sess.extend_scope(code)
                 sess.push_meta_for_func(
-                    target_name,
+                    real_name,
                     args_repr=args_repr,
                     collect_args=collect_args,
                     collect_result=collect_result,
                     collect_timing=collect_timing,
                     exc_tb_depth=depth,
+                    sampled=None if fresh else sampled,
                 )
 
             try:
@@ -94,8 +130,10 @@ def trace(
                 if fresh:
                     stop_tracing()
                     print_tree(get_trace_data())
+                    if sampler is not None:
+                        print(format_sampling(sampler.stats()))
 
-        wrapper.__flowtrace_real_name__ = real_func.__name__  # type: ignore[attr-defined]
+        wrapper.__flowtrace_real_name__ = real_name  # type: ignore[attr-defined]
 
         return cast("F", wrapper)
 
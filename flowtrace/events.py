@@ -1,13 +1,18 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Literal
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Literal
 
+if TYPE_CHECKING:
+    from types import CodeType
 
-@dataclass(slots=True)
+
+@dataclass(slots=True, frozen=True)
 class ExecutionContext:
     """
     Общий контекст исполнения (поток/таска и т.п.).
+
+    Неизменяемый: один объект разделяют все события потока/задачи.
     """
 
     thread_id: int
@@ -27,6 +32,8 @@ class CallEvent:
     args_repr: str | None = None
     result_repr: str | None = None
     duration: float | None = None
+    # CPU-время вызова (thread_time/process_time), если сессия меряет CPU-часами
+    cpu_duration: float | None = None
 
     via_exception: bool | None = None
 
@@ -37,6 +44,13 @@ class CallEvent:
 
     context: ExecutionContext | None = None
 
+    # время события, time.perf_counter_ns(); None — метки выключены
+    ts: int | None = None
+
+    # code object вызванной функции (только у call, пишет движок захвата):
+    # отличает одноимённые функции разных модулей; в файлы трасс не попадает
+    code: CodeType | None = field(default=None, repr=False, compare=False)
+
 
 @dataclass(slots=True)
 class AsyncTransitionEvent:
@@ -61,6 +75,8 @@ class AsyncTransitionEvent:
     # Привязка к ExecutionContext
     context: ExecutionContext | None = None
 
+    ts: int | None = None
+
 
 @dataclass(slots=True)
 class ExceptionEvent:
@@ -86,5 +102,7 @@ class ExceptionEvent:
     # опционально маппимся на ExecutionContext:
     context: ExecutionContext | None = None
 
+    ts: int | None = None
+
 
 TraceEvent = CallEvent | AsyncTransitionEvent | ExceptionEvent
@@ -0,0 +1,18 @@
+from .callgrind import dump_callgrind
+from .chrome_trace import dump_chrome_trace
+from .cprofile import build_pstats, dump_pstats, to_pstats
+from .flamegraph import build_call_tree, dump_folded, dump_speedscope
+from .jsonl import dump_jsonl, iter_jsonl
+
+__all__ = [
+    "build_call_tree",
+    "build_pstats",
+    "dump_callgrind",
+    "dump_chrome_trace",
+    "dump_folded",
+    "dump_jsonl",
+    "dump_pstats",
+    "dump_speedscope",
+    "iter_jsonl",
+    "to_pstats",
+]
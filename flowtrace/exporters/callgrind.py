@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from typing import IO, TYPE_CHECKING
+
+from flowtrace.events import CallEvent
+from flowtrace.exporters.cprofile import FuncKey, event_key
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from flowtrace.events import TraceEvent
+
+# исходник неизвестен (функция не из сессии): у pstats-ключа это "~",
+# callgrind пишет "???"
+_UNKNOWN = {"~": "???"}
+
+
+class _Frame:
+    """Открытый вызов и суммы по его прямым детям (для собственной стоимости)."""
+
+    __slots__ = ("child_calls", "child_cpu", "child_wall", "key", "parent", "start")
+
+    def __init__(self, key: FuncKey, parent: _Frame | None, start: int | None) -> None:
+        self.key = key
+        self.parent = parent
+        self.start = start
+        self.child_wall = 0
+        self.child_cpu = 0
+        self.child_calls = 0
+
+
+class _Names:
+    """Сжатие имён callgrind: ``(id) name`` при первом упоминании, дальше ``(id)``."""
+
+    def __init__(self) -> None:
+        self._ids: dict[str, int] = {}
+
+    def __call__(self, name: str) -> str:
+        idx = self._ids.get(name)
+        if idx is not None:
+            return f"({idx})"
+        idx = self._ids[name] = len(self._ids) + 1
+        return f"({idx}) {name}"
+
+
+def dump_callgrind(
+    events: Iterable[TraceEvent],
+    fp: IO[str],
+    *,
+    locations: Mapping[str, tuple[str, int]] | None = None,
+    command: str | None = None,
+) -> int:
+    """
+    Пишет граф вызовов в формате Callgrind (KCachegrind / QCachegrind).
+
+    Стоимости: ``WallNs`` — wall-время в наносекундах, ``Calls`` — число
+    вызовов и ``CpuNs`` — CPU-время, если сессия меряла его (``clock``).
+    У функции записывается собственная стоимость, у каждого ребра
+    caller → callee — число вызовов и полная стоимость вызванного поддерева.
+
+    События читаются за один проход; в памяти — открытые вызовы и суммы по
+    функциям и рёбрам, а не сама трасса. Вызовы без return стоимости не
+    добавляют, но функция остаётся в графе.
+
+    Функция — это ``(файл, первая строка, имя)`` её code object, так что
+    одноимённые функции разных модулей не сливаются. ``locations`` — имя →
+    (файл, первая строка) для событий без code object (прочитанных из
+    файла), по умолчанию исходники функций последней сессии. Возвращает число
+    функций в файле.
+    """
+    if locations is None:
+        from flowtrace.core import get_code_locations
+
+        locations = get_code_locations()
+
+    keys: dict[str, FuncKey] = {}
+    # функция -> [wall, calls, cpu] собственной стоимости, в порядке первого вызова
+    funcs: dict[FuncKey, list[int]] = {}
+    # caller -> callee -> [вызовы, wall, calls, cpu] полной стоимости
+    edges: dict[FuncKey, dict[FuncKey, list[int]]] = {}
+    open_frames: dict[int, _Frame] = {}
+    has_cpu = False
+
+    for ev in events:
+        if not isinstance(ev, CallEvent):
+            continue
+
+        if ev.kind == "call":
+            key = event_key(ev, locations, keys)
+            if key not in funcs:
+                funcs[key] = [0, 0, 0]
+            parent = open_frames.get(ev.parent_id) if ev.parent_id is not None else None
+            open_frames[ev.id] = _Frame(key, parent, ev.ts)
+            continue
+
+        frame = open_frames.pop(ev.parent_id, None) if ev.parent_id is not None else None
+        if frame is None:
+            continue
+        if ev.duration is not None:
+            wall = round(ev.duration * 1e9)
+        elif frame.start is not None and ev.ts is not None:
+            wall = ev.ts - frame.start
+        else:
+            wall = 0
+        cpu = 0
+        if ev.cpu_duration is not None:
+            cpu = round(ev.cpu_duration * 1e9)
+            has_cpu = True
+        calls = frame.child_calls + 1
+
+        own = funcs[frame.key]
+        own[0] += max(0, wall - frame.child_wall)
+        own[1] += 1
+        own[2] += max(0, cpu - frame.child_cpu)
+
+        parent = frame.parent
+        if parent is not None:
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+            parent.child_calls += calls
+            callees = edges.get(parent.key)
+            if callees is None:
+                callees = edges[parent.key] = {}
+            edge = callees.get(frame.key)
+            if edge is None:
+                edge = callees[frame.key] = [0, 0, 0, 0]
+            edge[0] += 1
+            edge[1] += wall
+            edge[2] += calls
+            edge[3] += cpu
+
+    width = 3 if has_cpu else 2
+
+    def costs(values: list[int]) -> str:
+        return " ".join(str(v) for v in values[:width])
+
+    totals = [sum(own[i] for own in funcs.values()) for i in range(3)]
+    fp.write("# callgrind format\nversion: 1\ncreator: flowtrace\n")
+    if command is not None:
+        fp.write(f"cmd: {command}\n")
+    fp.write("positions: line\n")
+    fp.write("event: WallNs : Wall time (ns)\nevent: Calls : Calls\n")
+    if has_cpu:
+        fp.write("event: CpuNs : CPU time (ns)\n")
+    fp.write(f"events: {' '.join(['WallNs', 'Calls', 'CpuNs'][:width])}\n")
+    fp.write(f"summary: {costs(totals)}\n")
+
+    files = _Names()
+    names = _Names()
+    written = 0
+    for key, own in funcs.items():
+        file, line, name = key
+        file = _UNKNOWN.get(file, file)
+        lines = [f"\nfl={files(file)}", f"fn={names(name)}"]
+        lines.append(f"{line} {costs(own)}")
+        for callee, (count, *incl) in edges.get(key, {}).items():
+            cfile, cline, cname = callee
+            cfile = _UNKNOWN.get(cfile, cfile)
+            if cfile != file:
+                lines.append(f"cfi={files(cfile)}")
+            lines.append(f"cfn={names(cname)}")
+            lines.append(f"calls={count} {cline}")
+            lines.append(f"{line} {costs(incl)}")
+        fp.write("\n".join(lines) + "\n")
+        written += 1
+    fp.write(f"\ntotals: {costs(totals)}\n")
+    return written
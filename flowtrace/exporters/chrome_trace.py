@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+from typing import IO, TYPE_CHECKING, Any
+
+from flowtrace.events import AsyncTransitionEvent, CallEvent, ExceptionEvent
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from flowtrace.events import ExecutionContext, TraceEvent
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+_BATCH = 1024
+
+
+class _TraceWriter:
+    """Пишет элементы массива traceEvents пачками, не собирая документ в строку."""
+
+    def __init__(self, fp: IO[str]) -> None:
+        self.fp = fp
+        self.batch: list[str] = []
+        self.count = 0
+        fp.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+
+    def emit(self, record: dict[str, Any]) -> None:
+        self.batch.append(_encode(record))
+        if len(self.batch) >= _BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.batch:
+            self.fp.write(("" if not self.count else ",\n") + ",\n".join(self.batch))
+            self.count += len(self.batch)
+            self.batch.clear()
+
+    def close(self) -> int:
+        self.flush()
+        self.fp.write("\n]}\n")
+        return self.count
+
+
+def dump_chrome_trace(events: Iterable[TraceEvent], fp: IO[str], *, pid: int = 1) -> int:
+    """
+    Пишет трассу в формате Chrome Trace Event (JSON) для Perfetto / chrome://tracing.
+
+    Соответствие событий трекам:
+
+    - поток — трек ``tid=thread_id``; вызов вне тасок — complete-событие ``"X"``
+      на нём (CPU-время, если мерялось, — в ``tdur``);
+    - asyncio-таска — асинхронный трек: nestable async-события ``"b"``/``"e"``
+      с ``cat="task"`` и ``id=task_id`` на ``pid``/``tid`` реального потока.
+      Внешний отрезок — жизнь таски, в нём её вызовы и ожидания (``await`` …
+      ``resume``); таски одного потока не выдаются за отдельные потоки, а их
+      вызовы, перемежающиеся на await, не ломают вложенность трека потока.
+      Группировка та же, что у ``build_task_traces``: по ``context.task_id``;
+    - исключение — мгновенное событие ``"i"`` на треке потока (у таски — с
+      ``task_id`` в args).
+
+    Время берётся из ``TraceEvent.ts``; если меток нет, позицией события
+    (1 мкс на событие) — сохраняется только порядок. События читаются потоком,
+    в памяти — только открытые вызовы и сводка по таскам. Возвращает число
+    записанных trace-событий.
+    """
+    out = _TraceWriter(fp)
+    open_calls: dict[int, tuple[float, int, int | None, CallEvent]] = {}
+    open_awaits: dict[int, tuple[float, str | None]] = {}
+    # task_id -> [поток, последнее ts, имя]
+    tasks: dict[int, list[Any]] = {}
+    threads: set[int] = set()
+    last_ts = 0.0
+
+    def thread(ctx: ExecutionContext | None) -> int:
+        if ctx is None:
+            return 0
+        tid = ctx.thread_id
+        if tid not in threads:
+            threads.add(tid)
+            out.emit({
+                "ph": "M",
+                "name": "thread_name",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": f"Thread {tid}"},
+            })
+        return tid
+
+    def task_slice(
+        ph: str, name: str, task_id: int, tid: int, ts: float, args: dict[str, Any] | None
+    ) -> None:
+        rec: dict[str, Any] = {
+            "ph": ph,
+            "name": name,
+            "cat": "task",
+            "id": task_id,
+            "pid": pid,
+            "tid": tid,
+            "ts": ts,
+        }
+        if args:
+            rec["args"] = args
+        out.emit(rec)
+
+    args: dict[str, Any]
+    for pos, ev in enumerate(events):
+        ts = ev.ts / 1000 if ev.ts is not None else float(pos)
+        last_ts = max(last_ts, ts)
+        ctx = ev.context
+        tid = thread(ctx)
+        task_id = ctx.task_id if ctx is not None else None
+        if ctx is not None and task_id is not None:
+            span = tasks.get(task_id)
+            if span is None:
+                # внешний отрезок таски открывается до её первого события
+                name = ctx.task_name or f"Task #{task_id}"
+                tasks[task_id] = [tid, ts, name]
+                args = {"task_id": task_id, "parent_task_id": ctx.task_parent_id}
+                task_slice("b", name, task_id, tid, ts, args)
+            else:
+                span[1] = ts
+
+        if isinstance(ev, CallEvent):
+            if ev.kind == "call":
+                open_calls[ev.id] = (ts, tid, task_id, ev)
+                if task_id is not None:
+                    task_slice(
+                        "b",
+                        ev.func_name,
+                        task_id,
+                        tid,
+                        ts,
+                        {"args": ev.args_repr} if ev.args_repr is not None else None,
+                    )
+                continue
+            opened = open_calls.pop(ev.parent_id, None) if ev.parent_id is not None else None
+            if opened is None:
+                continue  # вход в вызов не попал в трассу (например, вытеснен)
+            start, call_tid, call_task, call = opened
+            args = {}
+            if ev.result_repr is not None:
+                args["result"] = ev.result_repr
+            if ev.via_exception:
+                args["via_exception"] = True
+            if call_task is not None:
+                # у async-событий нет tdur: CPU-время — в args
+                if ev.cpu_duration is not None:
+                    args["cpu_dur"] = ev.cpu_duration * 1e6
+                task_slice("e", call.func_name, call_task, call_tid, ts, args)
+                continue
+            rec: dict[str, Any] = {
+                "ph": "X",
+                "name": call.func_name,
+                "cat": "call",
+                "pid": pid,
+                "tid": call_tid,
+                "ts": start,
+                "dur": ts - start,
+            }
+            if ev.cpu_duration is not None:
+                rec["tdur"] = ev.cpu_duration * 1e6
+            if call.args_repr is not None:
+                args["args"] = call.args_repr
+            if args:
+                rec["args"] = args
+            out.emit(rec)
+
+        elif isinstance(ev, ExceptionEvent):
+            exc_args: dict[str, Any] = {
+                "func": ev.func_name,
+                "msg": ev.exc_msg,
+                "caught": ev.caught,
+            }
+            if task_id is not None:
+                exc_args["task_id"] = task_id
+            out.emit({
+                "ph": "i",
+                "s": "t",
+                "name": ev.exc_type or "exception",
+                "cat": "exception",
+                "pid": pid,
+                "tid": tid,
+                "ts": ts,
+                "args": exc_args,
+            })
+
+        elif isinstance(ev, AsyncTransitionEvent) and task_id is not None:
+            if ev.kind == "await":
+                # серия await до первого resume — одно ожидание
+                open_awaits.setdefault(task_id, (ts, ev.detail))
+            elif ev.kind == "resume" and task_id in open_awaits:
+                # пока таска ждёт, в ней ничего не происходит: пара b/e пишется
+                # целиком на resume и остаётся вложенной в открытый вызов
+                start, detail = open_awaits.pop(task_id)
+                task_slice(
+                    "b", "await", task_id, tid, start, {"detail": detail} if detail else None
+                )
+                task_slice("e", "await", task_id, tid, ts, None)
+
+    # вызовы, не вернувшиеся до конца трассы, тянутся до последней метки;
+    # внутренние закрываются раньше внешних
+    for start, call_tid, call_task, call in reversed(open_calls.values()):
+        if call_task is not None:
+            task_slice("e", call.func_name, call_task, call_tid, last_ts, {"unfinished": True})
+            tasks[call_task][1] = last_ts
+            continue
+        out.emit({
+            "ph": "X",
+            "name": call.func_name,
+            "cat": "call",
+            "pid": pid,
+            "tid": call_tid,
+            "ts": start,
+            "dur": last_ts - start,
+            "args": {"unfinished": True},
+        })
+
+    for task_id, (tid, last, name) in tasks.items():
+        task_slice("e", name, task_id, tid, last, None)
+
+    return out.close()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import marshal
+import pstats
+from collections import defaultdict
+from typing import TYPE_CHECKING, Any
+
+from flowtrace.events import CallEvent
+
+if TYPE_CHECKING:
+    import os
+    from collections.abc import Iterable, Mapping
+
+    from flowtrace.events import TraceEvent
+
+# Ключ функции в pstats: (файл, первая строка, имя)
+FuncKey = tuple[str, int, str]
+# ребро caller → func: (nc, cc, tt, ct) — все вызовы, примитивные, собственное и полное время
+FuncStat = tuple[int, int, float, float]
+StatsDict = dict[FuncKey, tuple[int, int, float, float, dict[FuncKey, FuncStat]]]
+
+# поток и таска: рекурсия отслеживается внутри одного стека
+_Track = tuple[int, int | None]
+
+
+def func_key(name: str, locations: Mapping[str, tuple[str, int]]) -> FuncKey:
+    """
+    Ключ pstats для имени функции.
+
+    Без известного исходника — ``("~", 0, name)``, как у встроенных функций
+    в cProfile.
+    """
+    loc = locations.get(name)
+    return (loc[0], loc[1], name) if loc is not None else ("~", 0, name)
+
+
+def event_key(
+    ev: CallEvent, locations: Mapping[str, tuple[str, int]], cache: dict[str, FuncKey]
+) -> FuncKey:
+    """
+    Ключ функции call-события.
+
+    Исходник берётся из code object события, так что одноимённые функции
+    разных модулей не сливаются. У событий без code (прочитанных из файла)
+    — по имени из ``locations``; ``cache`` хранит такие ключи между вызовами.
+    """
+    code = ev.code
+    if code is not None:
+        return (code.co_filename, code.co_firstlineno, ev.func_name)
+    key = cache.get(ev.func_name)
+    if key is None:
+        key = cache[ev.func_name] = func_key(ev.func_name, locations)
+    return key
+
+
+class _Frame:
+    """Открытый вызов: ключ функции, вызвавший кадр и время прямых детей."""
+
+    __slots__ = ("children_time", "edge", "key", "level", "parent", "start")
+
+    def __init__(self, key: FuncKey, parent: _Frame | None, track: _Track, start: int | None):
+        self.key = key
+        self.parent = parent
+        self.level = (track, key)
+        self.edge = (track, parent.key if parent is not None else None, key)
+        self.start = start
+        self.children_time = 0.0
+
+
+def build_pstats(
+    events: Iterable[TraceEvent],
+    locations: Mapping[str, tuple[str, int]] | None = None,
+) -> StatsDict:
+    """
+    Словарь статистики в формате ``pstats.Stats.stats`` (как у cProfile).
+
+    ``func -> (cc, nc, tt, ct, callers)``, где ``callers`` —
+    ``caller -> (nc, cc, tt, ct)`` по прямым вызовам от этого caller'а (порядок
+    полей у рёбер именно такой, как пишет cProfile).
+    Один проход по событиям по тем же правилам, что в ``_lsprof``:
+
+    - ``tt`` — собственное время: полное минус полное время прямых детей;
+    - ``ct`` и примитивные вызовы ``cc`` учитывают вызов, только если функция
+      (для callers — ребро caller → func) ещё не активна на стеке, поэтому
+      рекурсия не удваивает время.
+
+    Уровни рекурсии ведутся отдельно для каждого потока и таски. Длительность —
+    ``duration`` return, иначе разница меток ``ts``.
+
+    Функция — это ``(файл, первая строка, имя)`` её code object, как в
+    cProfile. ``locations`` — имя → (файл, строка) для событий без code
+    object (прочитанных из файла); по умолчанию исходники функций последней
+    сессии (:func:`flowtrace.core.get_code_locations`).
+    """
+    if locations is None:
+        from flowtrace.core import get_code_locations
+
+        locations = get_code_locations()
+
+    keys: dict[str, FuncKey] = {}
+    funcs: dict[FuncKey, list[Any]] = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    edges: dict[tuple[FuncKey, FuncKey], list[Any]] = defaultdict(lambda: [0, 0, 0.0, 0.0])
+    levels: dict[tuple[_Track, FuncKey], int] = defaultdict(int)
+    edge_levels: dict[tuple[_Track, FuncKey | None, FuncKey], int] = defaultdict(int)
+    open_frames: dict[int, _Frame] = {}
+
+    for ev in events:
+        if not isinstance(ev, CallEvent):
+            continue
+
+        if ev.kind == "call":
+            key = event_key(ev, locations, keys)
+            parent = open_frames.get(ev.parent_id) if ev.parent_id is not None else None
+            ctx = ev.context
+            track = (ctx.thread_id, ctx.task_id) if ctx is not None else (0, None)
+            frame = _Frame(key, parent, track, ev.ts)
+            open_frames[ev.id] = frame
+            levels[frame.level] += 1
+            edge_levels[frame.edge] += 1
+            continue
+
+        opened = open_frames.pop(ev.parent_id, None) if ev.parent_id is not None else None
+        if opened is None:
+            continue
+        frame = opened
+        if ev.duration is not None:
+            total = ev.duration
+        elif frame.start is not None and ev.ts is not None:
+            total = (ev.ts - frame.start) / 1e9
+        else:
+            total = 0.0
+        own = max(0.0, total - frame.children_time)
+        if frame.parent is not None:
+            frame.parent.children_time += total
+
+        levels[frame.level] -= 1
+        outermost = levels[frame.level] == 0
+        stat = funcs[frame.key]
+        stat[0] += outermost
+        stat[1] += 1
+        stat[2] += own
+        stat[3] += total if outermost else 0.0
+
+        edge_levels[frame.edge] -= 1
+        if frame.parent is not None:
+            outermost = edge_levels[frame.edge] == 0
+            stat = edges[(frame.parent.key, frame.key)]
+            stat[0] += outermost
+            stat[1] += 1
+            stat[2] += own
+            stat[3] += total if outermost else 0.0
+
+    callers: dict[FuncKey, dict[FuncKey, FuncStat]] = defaultdict(dict)
+    for (caller, callee), (cc, nc, tt, ct) in edges.items():
+        # у рёбер cProfile порядок другой: (nc, cc, tt, ct)
+        callers[callee][caller] = (nc, cc, tt, ct)
+    return {key: (cc, nc, tt, ct, callers[key]) for key, (cc, nc, tt, ct) in funcs.items()}
+
+
+class _StatsSource:
+    """Объект с ``create_stats``/``stats``: так ``pstats.Stats`` принимает готовый профиль."""
+
+    def __init__(self, stats: StatsDict) -> None:
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+def to_pstats(
+    events: Iterable[TraceEvent],
+    locations: Mapping[str, tuple[str, int]] | None = None,
+) -> pstats.Stats:
+    """``pstats.Stats`` по трассе: ``sort_stats``, ``print_callers``, ``add`` к профилю cProfile."""
+    return pstats.Stats(_StatsSource(build_pstats(events, locations)))  # type: ignore[arg-type]
+
+
+def dump_pstats(
+    events: Iterable[TraceEvent],
+    path: str | os.PathLike[str],
+    locations: Mapping[str, tuple[str, int]] | None = None,
+) -> None:
+    """Сохраняет статистику в файл того же формата, что ``cProfile.Profile.dump_stats``."""
+    stats = build_pstats(events, locations)
+    with open(path, "wb") as f:
+        marshal.dump(stats, f)
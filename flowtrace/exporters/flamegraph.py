@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import json
+from typing import IO, TYPE_CHECKING, Any, Literal
+
+from flowtrace.events import CallEvent
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+    from flowtrace.events import TraceEvent
+
+# Вес стека во flamegraph: "self" — собственное время узла (без детей),
+# "inclusive" — полное время вызова вместе с детьми.
+FlameWeight = Literal["self", "inclusive"]
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class CallNode:
+    """
+    Узел дерева контекстов вызова (calling-context tree).
+
+    Один узел — один путь вызова от корня (``a → b → c``); все вызовы по
+    этому пути суммируются в нём. Время — в наносекундах.
+    """
+
+    __slots__ = ("calls", "children", "name", "total_ns")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.children: dict[str, CallNode] = {}
+        self.total_ns = 0
+        self.calls = 0
+
+    def child(self, name: str) -> CallNode:
+        node = self.children.get(name)
+        if node is None:
+            node = self.children[name] = CallNode(name)
+        return node
+
+    @property
+    def self_ns(self) -> int:
+        """Время узла без детей (не меньше нуля: у детей время могло мериться, а у узла нет)."""
+        return max(0, self.total_ns - sum(c.total_ns for c in self.children.values()))
+
+    def __repr__(self) -> str:
+        return f"<CallNode {self.name} calls={self.calls} total={self.total_ns}ns>"
+
+
+def build_call_tree(events: Iterable[TraceEvent]) -> CallNode:
+    """
+    Строит дерево контекстов вызова за один проход по ``parent_id``.
+
+    Длительность вызова — ``duration`` его return, иначе разница меток
+    ``ts``; вызовы без return (не завершились) времени не добавляют. Корень —
+    безымянный узел, его дети — корневые вызовы трассы.
+    """
+    root = CallNode("")
+    open_calls: dict[int, tuple[CallNode, int | None]] = {}
+    for ev in events:
+        if not isinstance(ev, CallEvent):
+            continue
+        if ev.kind == "call":
+            parent = open_calls.get(ev.parent_id) if ev.parent_id is not None else None
+            node = (parent[0] if parent is not None else root).child(ev.func_name)
+            node.calls += 1
+            open_calls[ev.id] = (node, ev.ts)
+            continue
+        opened = open_calls.pop(ev.parent_id, None) if ev.parent_id is not None else None
+        if opened is None:
+            continue
+        node, start = opened
+        if ev.duration is not None:
+            node.total_ns += round(ev.duration * 1e9)
+        elif start is not None and ev.ts is not None:
+            node.total_ns += ev.ts - start
+    return root
+
+
+def _frame(name: str) -> str:
+    # ";" разделяет кадры в folded-формате
+    return name.replace(";", ":")
+
+
+def iter_folded(root: CallNode, weight: FlameWeight = "self") -> Iterator[str]:
+    """Строки ``a;b;c <нс>`` для всех путей дерева с ненулевым весом."""
+    stack = [(c, _frame(c.name)) for c in reversed(root.children.values())]
+    while stack:
+        node, path = stack.pop()
+        value = node.self_ns if weight == "self" else node.total_ns
+        if value > 0:
+            yield f"{path} {value}"
+        stack.extend((c, f"{path};{_frame(c.name)}") for c in reversed(node.children.values()))
+
+
+def dump_folded(
+    events: Iterable[TraceEvent],
+    fp: IO[str],
+    *,
+    weight: FlameWeight = "self",
+) -> int:
+    """
+    Пишет свёрнутые стеки (формат flamegraph.pl / inferno) и возвращает число строк.
+
+    Вес — наносекунды собственного (``"self"``) или полного (``"inclusive"``)
+    времени, суммированные по одинаковым путям вызова.
+    """
+    lines = 0
+    for line in iter_folded(build_call_tree(events), weight):
+        fp.write(line + "\n")
+        lines += 1
+    return lines
+
+
+def dump_speedscope(
+    events: Iterable[TraceEvent],
+    fp: IO[str],
+    *,
+    name: str = "flowtrace",
+) -> None:
+    """
+    Пишет профиль speedscope (evented) по дереву контекстов вызова.
+
+    Одинаковые пути склеены, как во flamegraph: каждый узел — отрезок длиной
+    в его полное время, дети идут подряд внутри него, собственное время —
+    остаток. Открывается в https://www.speedscope.app.
+    """
+    root = build_call_tree(events)
+    frames: dict[str, int] = {}
+    out: list[dict[str, Any]] = []
+    cursor = 0
+    work: list[tuple[CallNode, int | None]] = [(c, None) for c in reversed(root.children.values())]
+    while work:
+        node, opened_at = work.pop()
+        frame = frames.setdefault(node.name, len(frames))
+        if opened_at is None:
+            out.append({"type": "O", "frame": frame, "at": cursor})
+            work.append((node, cursor))
+            work.extend((c, None) for c in reversed(node.children.values()))
+        else:
+            cursor = max(cursor, opened_at + node.total_ns)
+            out.append({"type": "C", "frame": frame, "at": cursor})
+
+    json.dump(
+        {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "shared": {"frames": [{"name": n} for n in frames]},
+            "profiles": [
+                {
+                    "type": "evented",
+                    "name": name,
+                    "unit": "nanoseconds",
+                    "startValue": 0,
+                    "endValue": cursor,
+                    "events": out,
+                }
+            ],
+            "name": name,
+            "exporter": "flowtrace",
+        },
+        fp,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
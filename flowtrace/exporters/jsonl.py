@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+from dataclasses import fields
+from itertools import islice
+from typing import IO, TYPE_CHECKING, Any
+
+from flowtrace.events import (
+    AsyncTransitionEvent,
+    CallEvent,
+    ExceptionEvent,
+    ExecutionContext,
+    TraceEvent,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# Формат JSON Lines: первая строка — заголовок, дальше по строке на запись.
+#   {"format": "flowtrace-jsonl", "version": 1[, "corrections": true]}
+#   {"type": "context", "ctx": 0, "thread_id": ..., "task_id": ..., ...}
+#   {"type": "CallEvent", "id": 0, ..., "context": 0}
+#   {"type": "caught", "id": 7, "caught": true}
+# Контекст описывается один раз, перед первым событием, которое на него ссылается;
+# поля события со значением None не пишутся. Запись "caught" — поправка к уже
+# записанному ExceptionEvent (её пишет потоковый сток, см. flowtrace.sink);
+# такие файлы помечены в заголовке "corrections": true.
+FORMAT = "flowtrace-jsonl"
+VERSION = 1
+# тип записи-поправки caught
+CAUGHT = "caught"
+
+_EVENT_TYPES: dict[str, type] = {
+    cls.__name__: cls for cls in (CallEvent, ExceptionEvent, AsyncTransitionEvent)
+}
+# context пишется ссылкой на таблицу контекстов, code живёт только в процессе
+_FIELDS = {
+    cls: tuple(f.name for f in fields(cls) if f.name not in ("context", "code"))
+    for cls in _EVENT_TYPES.values()
+}
+_CONTEXT_FIELDS = tuple(f.name for f in fields(ExecutionContext))
+
+_encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+_BATCH = 1024
+
+
+class JsonlEncoder:
+    """
+    Пошаговая запись формата: события подаются по одному, таблица контекстов
+    копится между вызовами. Общая для :func:`dump_jsonl` и потокового стока.
+    """
+
+    def __init__(self, *, corrections: bool = False) -> None:
+        self._contexts: dict[ExecutionContext, int] = {}
+        # в файле будут поправки caught: читателю надо помнить ExceptionEvent
+        self.corrections = corrections
+
+    def header(self) -> str:
+        rec: dict[str, Any] = {"format": FORMAT, "version": VERSION}
+        if self.corrections:
+            rec["corrections"] = True
+        return _encode(rec)
+
+    def lines(self, ev: TraceEvent, out: list[str]) -> None:
+        """Дописывает в ``out`` строки события (и его контекста, если он новый)."""
+        rec: dict[str, Any] = {"type": type(ev).__name__}
+        for name in _FIELDS[type(ev)]:
+            value = getattr(ev, name)
+            if value is not None:
+                rec[name] = value
+
+        ctx = ev.context
+        if ctx is not None:
+            idx = self._contexts.get(ctx)
+            if idx is None:
+                idx = self._contexts[ctx] = len(self._contexts)
+                ctx_rec: dict[str, Any] = {"type": "context", "ctx": idx}
+                for name in _CONTEXT_FIELDS:
+                    ctx_rec[name] = getattr(ctx, name)
+                out.append(_encode(ctx_rec))
+            rec["context"] = idx
+        out.append(_encode(rec))
+
+    @staticmethod
+    def caught(event_id: int, caught: bool) -> str:
+        """Строка-поправка: ExceptionEvent ``event_id`` получил ``caught``."""
+        return _encode({"type": CAUGHT, "id": event_id, "caught": caught})
+
+
+def dump_jsonl(events: Iterable[TraceEvent], fp: IO[str]) -> int:
+    """
+    Пишет события в ``fp`` построчно (JSON Lines) и возвращает их количество.
+
+    События читаются из итератора по одному, строки уходят в ``fp`` пачками:
+    список событий целиком не нужен. Повторяющиеся ExecutionContext
+    записываются один раз в таблицу контекстов, события ссылаются на них по
+    номеру. Прочитать обратно — :func:`iter_jsonl`.
+    """
+    encoder = JsonlEncoder()
+    fp.write(encoder.header() + "\n")
+    count = 0
+    it = iter(events)
+    while batch := list(islice(it, _BATCH)):
+        lines: list[str] = []
+        for ev in batch:
+            encoder.lines(ev, lines)
+        fp.write("\n".join(lines) + "\n")
+        count += len(batch)
+    return count
+
+
+def iter_jsonl(fp: Iterable[str]) -> Iterator[TraceEvent]:
+    """
+    Лениво читает события, записанные :func:`dump_jsonl`, в исходном порядке.
+
+    В памяти держится только таблица контекстов. Прочитанные ExceptionEvent
+    запоминаются, лишь если заголовок обещает поправки ``caught`` (файлы
+    потокового стока): поправка применяется к уже отданному событию, поправки
+    к отсутствующим событиям игнорируются. Круговой путь ``dump_jsonl`` →
+    ``iter_jsonl`` возвращает равные события.
+    """
+    lines = iter(fp)
+    header = json.loads(next(lines, "{}") or "{}")
+    if header.get("format") != FORMAT:
+        raise ValueError("[FlowTrace] not a FlowTrace JSON Lines trace")
+    if header.get("version") != VERSION:
+        raise ValueError(f"[FlowTrace] unsupported JSON Lines version {header.get('version')!r}")
+
+    contexts: dict[int, ExecutionContext] = {}
+    exceptions: dict[int, ExceptionEvent] | None = {} if header.get("corrections") else None
+    for line in lines:
+        if not line.strip():
+            continue
+        rec = json.loads(line)
+        kind = rec.pop("type")
+        if kind == "context":
+            idx = rec.pop("ctx")
+            contexts[idx] = ExecutionContext(**rec)
+            continue
+        if kind == CAUGHT:
+            exc = exceptions.get(rec["id"]) if exceptions is not None else None
+            if exc is not None:
+                exc.caught = rec["caught"]
+            continue
+        ctx = rec.get("context")
+        if ctx is not None:
+            rec["context"] = contexts[ctx]
+        ev = _EVENT_TYPES[kind](**rec)
+        if exceptions is not None and isinstance(ev, ExceptionEvent):
+            exceptions[ev.id] = ev
+        yield ev
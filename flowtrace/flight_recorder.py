@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import atexit
+import heapq
+import sys
+import threading
+from contextlib import suppress
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, TextIO
+
+from flowtrace.async_reconstruct import LiveTaskStore
+from flowtrace.session import TraceSession
+from flowtrace.storage import RingEventStore
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from types import TracebackType
+
+    from flowtrace.async_model import TaskTrace
+    from flowtrace.events import TraceEvent
+    from flowtrace.session import ThreadTrackers
+    from flowtrace.storage import EventStore
+
+
+class FlightRecorderSession(TraceSession):
+    """
+    Сессия-«бортовой самописец»: хранит только последние события.
+
+    События пишутся в заранее выделенный кольцевой буфер на ``max_events``
+    слотов (и, при ``max_age``, отбрасываются старше ``max_age`` секунд),
+    поэтому память постоянна при любой длительности работы процесса.
+    Буфер у каждого трассируемого потока свой, того же размера. События
+    завершившихся потоков сливаются в один общий архив на ``max_events``
+    последних событий, так что память не растёт и при текучке потоков.
+
+    Дамп — дерево вызовов последних событий — выполняется по запросу
+    (:meth:`dump`), при необработанном исключении (``sys.excepthook`` и
+    ``threading.excepthook``) и при завершении интерпретатора.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_events: int = 10_000,
+        max_age: float | None = None,
+        dump_on_crash: bool = True,
+        dump_on_exit: bool = True,
+        file: TextIO | None = None,
+        **kwargs: Any,
+    ) -> None:
+        self.max_events = max_events
+        self.max_age = max_age
+        # вытеснено из буферов и архива уже завершившихся потоков
+        self._retired_evicted = 0
+        self.ring = RingEventStore(max_events, max_age=max_age)
+        super().__init__(store=self.ring, **kwargs)
+
+        self.dump_on_crash = dump_on_crash
+        self.dump_on_exit = dump_on_exit
+        self.file = file
+
+        self._prev_excepthook: Any = None
+        self._prev_thread_excepthook: Any = None
+        self._crashed = False
+
+    def _new_store(self) -> EventStore:
+        return RingEventStore(self.max_events, max_age=self.max_age)
+
+    def _live_window(self) -> int | None:
+        return self.max_events
+
+    def _retire_events(self, trackers: ThreadTrackers) -> None:
+        # архив — одна отсортированная по id часть не длиннее max_events
+        # (вызывается под блокировкой _retire)
+        self._retired_evicted += _evicted(trackers)
+        events = self._thread_snapshot(trackers.state)
+        merged = list(heapq.merge(*self._retired, events, key=attrgetter("id")))
+        excess = len(merged) - self.max_events
+        if excess > 0:
+            self._retired_evicted += excess
+            merged = merged[excess:]
+        self._retired = [merged]
+
+    def _retire_tasks(self, tasks: dict[int, TaskTrace]) -> None:
+        retired = self._retired_tasks
+        retired.update(tasks)
+        while len(retired) > self.max_events:
+            del retired[next(iter(retired))]
+
+    @property
+    def evicted(self) -> int:
+        """Сколько событий вытеснено из буферов всех потоков."""
+        return self._retired_evicted + sum(_evicted(t) for t in list(self.threads.values()))
+
+    def dump(
+        self,
+        file: TextIO | None = None,
+        reason: str = "on demand",
+    ) -> Sequence[TraceEvent]:
+        """
+        Печатает дерево вызовов по последним событиям и возвращает их.
+
+        Сессия при этом продолжает запись.
+        """
+        from flowtrace.formatters import print_tree
+
+        events = self.snapshot()
+        out = file or self.file or sys.stderr
+        print(
+            f"[flowtrace] flight recorder ({reason}): "
+            f"{len(events)} событий, вытеснено {self.evicted}",
+            file=out,
+        )
+        # не через redirect_stdout: дамп идёт из excepthook, пока другие потоки печатают
+        print_tree(events, file=out)
+        out.flush()
+        return events
+
+    def start(self) -> None:
+        if self.state.active:
+            return
+        super().start()
+
+        if self.dump_on_crash:
+            self._prev_excepthook = sys.excepthook
+            self._prev_thread_excepthook = threading.excepthook
+            sys.excepthook = self._excepthook
+            threading.excepthook = self._thread_excepthook
+        if self.dump_on_exit:
+            atexit.register(self._dump_at_exit)
+
+    def stop(self) -> Sequence[TraceEvent]:
+        if self.state.active:
+            if self._prev_excepthook is not None:
+                sys.excepthook = self._prev_excepthook
+                threading.excepthook = self._prev_thread_excepthook
+                self._prev_excepthook = self._prev_thread_excepthook = None
+            atexit.unregister(self._dump_at_exit)
+        return super().stop()
+
+    def _excepthook(
+        self,
+        exc_type: type[BaseException],
+        exc: BaseException,
+        tb: TracebackType | None,
+    ) -> None:
+        self._crashed = True
+        with suppress(Exception):
+            self.dump(reason=f"unhandled {exc_type.__name__}")
+        prev = self._prev_excepthook or sys.__excepthook__
+        prev(exc_type, exc, tb)
+
+    def _thread_excepthook(self, args: threading.ExceptHookArgs) -> None:
+        with suppress(Exception):
+            self.dump(reason=f"unhandled {args.exc_type.__name__} in thread")
+        prev = self._prev_thread_excepthook or threading.__excepthook__
+        prev(args)
+
+    def _dump_at_exit(self) -> None:
+        # после аварийного дампа повторять то же самое при выходе незачем
+        if self._crashed or not self.state.active:
+            return
+        with suppress(Exception):
+            self.dump(reason="interpreter exit")
+
+
+def _evicted(trackers: ThreadTrackers) -> int:
+    ring = trackers.state.events
+    if isinstance(ring, LiveTaskStore):
+        ring = ring.inner
+    return ring.evicted if isinstance(ring, RingEventStore) else 0
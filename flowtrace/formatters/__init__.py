@@ -1,7 +1,8 @@
-from .async_tree import print_async_tree
+from .async_tree import AsyncIndex, print_async_tree
 from .formatters import print_events_debug, print_summary, print_tree
 
 __all__ = [
+    "AsyncIndex",
     "print_async_tree",
     "print_events_debug",
     "print_summary",
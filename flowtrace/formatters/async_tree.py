@@ -1,91 +1,183 @@
 from __future__ import annotations
 
+import sys
+from typing import IO, TYPE_CHECKING
+
 from ..async_model import AwaitSegment, TaskTrace
 from ..events import CallEvent, TraceEvent
 
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
 
-def print_async_tree(tasks: dict[int, TaskTrace], events: list[TraceEvent]) -> None:
-    ordered_tasks = sorted(tasks.values(), key=lambda t: t.first_event_index or 10**9)
-    for task in ordered_tasks:
-        print_task_tree(task, tasks, events)
-        print()
+# сколько строк копить перед записью в поток
+_BATCH = 4096
+
+# шаг обхода: готовая строка, поддерево вызова (id, таска, отступ) или await-сегмент
+_Item = str | tuple[int, TaskTrace, str] | tuple[AwaitSegment, str]
+
+
+class AsyncIndex:
+    """
+    Индексы для отрисовки за один проход по трассе: id → вызов, вызов → его
+    return и (таска, вызов) → await-сегменты. Вместо поиска по всей трассе и
+    по всем сегментам таски на каждый узел.
+
+    Кто печатает дерево по узлам (``print_call_subtree`` /
+    ``print_await_segment`` на каждый узел), строит индекс один раз и
+    передаёт его в ``index=`` — иначе каждый вызов заново проходит трассу.
+    """
+
+    __slots__ = ("_segments", "calls", "returns")
+
+    def __init__(self, events: Sequence[TraceEvent]) -> None:
+        self.calls: dict[int, CallEvent] = {}
+        self.returns: dict[int, CallEvent] = {}
+        for ev in events:
+            if not isinstance(ev, CallEvent):
+                continue
+            self.calls.setdefault(ev.id, ev)
+            if ev.kind == "return" and ev.parent_id is not None:
+                self.returns.setdefault(ev.parent_id, ev)
+        self._segments: dict[int, dict[int, list[AwaitSegment]]] = {}
 
+    def segments(self, task: TaskTrace, call_id: int) -> list[AwaitSegment]:
+        by_call = self._segments.get(task.task_id)
+        if by_call is None:
+            by_call = self._segments[task.task_id] = {}
+            for seg in task.await_segments:
+                by_call.setdefault(seg.call_id, []).append(seg)
+        return by_call.get(call_id, [])
 
-def print_task_tree(task: TaskTrace, tasks: dict[int, TaskTrace], events: list[TraceEvent]) -> None:
+
+def _task_header(task: TaskTrace) -> str:
     header = f"Task#{task.task_id}"
     if task.task_name:
         header += f" {task.task_name}"
     if task.parent_task_id is not None:
         header += f" (parent={task.parent_task_id})"
+    return header
+
 
-    print(header)
+def _render(
+    items: Iterable[_Item],
+    tasks: dict[int, TaskTrace],
+    index: AsyncIndex,
+    file: IO[str] | None,
+) -> None:
+    """Обходит шаги явным стеком (глубина не упирается в лимит рекурсии) и пишет пачками."""
+    out = sys.stdout if file is None else file
+    lines: list[str] = []
+    stack: list[_Item] = list(items)
+    stack.reverse()
+    while stack:
+        item = stack.pop()
+        todo: list[_Item] = []
+
+        if isinstance(item, str):
+            lines.append(item)
+
+        elif isinstance(item[0], AwaitSegment):
+            seg, indent = item
+            dur = f" [{seg.duration * 1000:.2f} ms]" if seg.duration is not None else ""
+            lines.append(f"{indent}↯ await{dur}")
+
+            # --- дети внутри await ---
+            for child_tid in seg.children_task_ids:
+                child = tasks.get(child_tid)
+                if child is None:
+                    continue
+                todo.append(f"{indent}  Task#{child_tid}")
+                todo.extend((root, child, indent + "    ") for root in child.roots)
+
+        else:
+            call_id, task, indent = item
+            ev = index.calls.get(call_id)
+            if ev is None:
+                continue
+            lines.append(f"{indent}→ {ev.func_name}()")
+
+            todo.extend((seg, indent + "  ") for seg in index.segments(task, call_id))
+            # --- печать детей функций ---
+            todo.extend(
+                (child_id, task, indent + "  ") for child_id in task.call_children.get(call_id, [])
+            )
+
+            ret = index.returns.get(call_id)
+            if ret is not None and ret.result_repr is not None:
+                todo.append(f"{indent}← {ev.func_name}() → {ret.result_repr}")
+            else:
+                todo.append(f"{indent}← {ev.func_name}()")
+
+        stack.extend(reversed(todo))
+        if len(lines) >= _BATCH:
+            out.write("\n".join(lines) + "\n")
+            lines.clear()
+
+    if lines:
+        out.write("\n".join(lines) + "\n")
+
+
+def print_async_tree(
+    tasks: dict[int, TaskTrace],
+    events: Sequence[TraceEvent],
+    file: IO[str] | None = None,
+    index: AsyncIndex | None = None,
+) -> None:
+    """
+    Печатает дерево вызовов и await-интервалов каждой таски.
 
-    for root_id in task.roots:
-        print_call_subtree(root_id, task, tasks, events, indent="  ")
+    Индексы строятся один раз на всю трассу (или берутся готовые из
+    ``index``), так что отрисовка линейна по числу событий; ``file`` — куда
+    писать (по умолчанию ``sys.stdout``).
+    """
+    ordered_tasks = sorted(tasks.values(), key=lambda t: t.first_event_index or 10**9)
+    items: list[_Item] = []
+    for task in ordered_tasks:
+        items.append(_task_header(task))
+        items.extend((root_id, task, "  ") for root_id in task.roots)
+        items.append("")
+    if index is None:
+        index = AsyncIndex(events)
+    _render(items, tasks, index, file)
+
+
+def print_task_tree(
+    task: TaskTrace,
+    tasks: dict[int, TaskTrace],
+    events: Sequence[TraceEvent],
+    file: IO[str] | None = None,
+    index: AsyncIndex | None = None,
+) -> None:
+    items: list[_Item] = [_task_header(task)]
+    items.extend((root_id, task, "  ") for root_id in task.roots)
+    if index is None:
+        index = AsyncIndex(events)
+    _render(items, tasks, index, file)
 
 
 def print_call_subtree(
     call_id: int,
     task: TaskTrace,
     tasks: dict[int, TaskTrace],
-    events: list[TraceEvent],
+    events: Sequence[TraceEvent],
     indent: str,
+    file: IO[str] | None = None,
+    index: AsyncIndex | None = None,
 ) -> None:
-    ev = _find_call(call_id, events)
-    if ev is None:
-        return
-
-    print(f"{indent}→ {ev.func_name}()")
-
-    for seg in task.await_segments:
-        if seg.call_id == call_id:
-            print_await_segment(seg, task, tasks, events, indent + "  ")
-
-    # --- печать детей функций ---
-    for child_id in task.call_children.get(call_id, []):
-        print_call_subtree(child_id, task, tasks, events, indent + "  ")
-
-    ret = _find_return(call_id, events)
-    if ret is not None and ret.result_repr is not None:
-        print(f"{indent}← {ev.func_name}() → {ret.result_repr}")
-    else:
-        print(f"{indent}← {ev.func_name}()")
+    if index is None:
+        index = AsyncIndex(events)
+    _render([(call_id, task, indent)], tasks, index, file)
 
 
 def print_await_segment(
     seg: AwaitSegment,
     task: TaskTrace,
     tasks: dict[int, TaskTrace],
-    events: list[TraceEvent],
+    events: Sequence[TraceEvent],
     indent: str,
+    file: IO[str] | None = None,
+    index: AsyncIndex | None = None,
 ) -> None:
-    detail = "await"
-    dur = ""
-
-    if seg.duration is not None:
-        dur = f" [{seg.duration * 1000:.2f} ms]"
-
-    print(f"{indent}↯ {detail}{dur}")
-
-    # --- дети внутри await ---
-    for child_tid in seg.children_task_ids:
-        child = tasks.get(child_tid)
-        if child is None:
-            continue
-        print(f"{indent}  Task#{child_tid}")
-        for root in child.roots:
-            print_call_subtree(root, child, tasks, events, indent + "    ")
-
-
-def _find_call(call_id: int, events: list[TraceEvent]) -> CallEvent | None:
-    for ev in events:
-        if isinstance(ev, CallEvent) and ev.id == call_id:
-            return ev
-    return None
-
-
-def _find_return(call_id: int, events: list[TraceEvent]) -> CallEvent | None:
-    for ev in events:
-        if isinstance(ev, CallEvent) and ev.kind == "return" and ev.parent_id == call_id:
-            return ev
-    return None
+    if index is None:
+        index = AsyncIndex(events)
+    _render([(seg, indent)], tasks, index, file)
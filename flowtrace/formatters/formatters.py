@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import sys
+from typing import IO, TYPE_CHECKING
+
 from flowtrace.config import get_config
-from flowtrace.core import get_trace_data
+from flowtrace.core import get_sampling_stats, get_trace_data
 from flowtrace.events import (
     AsyncTransitionEvent,
     CallEvent,
@@ -9,6 +12,11 @@ from flowtrace.events import (
     TraceEvent,
 )
 
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from flowtrace.sampling import SamplingStats
+
 _MAX_MSG = 200
 
 
@@ -22,6 +30,16 @@ def _trim(s: str | None, n: int = _MAX_MSG) -> str:
     return s if len(s) <= n else s[: n - 3] + "..."
 
 
+def _timing(ret: CallEvent) -> str:
+    """Длительность возврата: wall, CPU или обе ("0.001200s, cpu 0.000300s")."""
+    parts = []
+    if ret.duration is not None:
+        parts.append(f"{ret.duration:.6f}s")
+    if ret.cpu_duration is not None:
+        parts.append(f"cpu {ret.cpu_duration:.6f}s")
+    return ", ".join(parts)
+
+
 def _format_event(event: TraceEvent) -> str:
     # ---- CallEvent ----
     if isinstance(event, CallEvent):
@@ -35,8 +53,8 @@ def _format_event(event: TraceEvent) -> str:
             bits = ["return", event.func_name]
             if event.result_repr is not None:
                 bits.append(f"→ {event.result_repr}")
-            if event.duration is not None:
-                bits.append(f"({event.duration:.6f}s)")
+            if event.duration is not None or event.cpu_duration is not None:
+                bits.append(f"({_timing(event)})")
             return "    " + " ".join(bits)
 
     # ---- ExceptionEvent ----
@@ -58,7 +76,7 @@ def _format_event(event: TraceEvent) -> str:
     return f"    {event.kind:7} {event.func_name}"
 
 
-def print_events_debug(events: list[TraceEvent] | None = None) -> None:
+def print_events_debug(events: Sequence[TraceEvent] | None = None) -> None:
     if events is None:
         events = get_trace_data()
 
@@ -79,12 +97,36 @@ def print_events_debug(events: list[TraceEvent] | None = None) -> None:
         print_async_tree(tasks, events)
 
 
-def print_summary(events: list[TraceEvent] | None = None) -> None:
+def format_sampling(stats: SamplingStats) -> str:
+    mode = f"1/{stats.every}" if stats.every is not None else f"rate={stats.rate:g}"
+    line = (
+        f"[flowtrace] сэмплирование {mode}: записано {stats.roots_sampled} "
+        f"из {stats.roots_seen} корневых вызовов ({stats.fraction:.2%})"
+    )
+    if stats.roots_sampled:
+        line += f", множитель экстраполяции {stats.scale:.2f}"
+    return line
+
+
+def print_summary(
+    events: Sequence[TraceEvent] | None = None,
+    sampling: SamplingStats | None = None,
+) -> None:
+    """
+    Краткая сводка по трассе.
+
+    ``sampling`` — итоги сэмплирования; по умолчанию берутся из последней
+    остановленной сессии, если сэмплирование в ней было включено.
+    """
     if events is None:
         events = get_trace_data()
+    if sampling is None:
+        sampling = get_sampling_stats()
 
     if not events:
         print("[flowtrace] (пустая трасса)")
+        if sampling is not None:
+            print(format_sampling(sampling))
         return
 
     # учитывать duration можно только у CallEvent(return)
@@ -92,108 +134,146 @@ def print_summary(events: list[TraceEvent] | None = None) -> None:
     duration = sum(
         (e.duration or 0.0) for e in events if isinstance(e, CallEvent) and e.duration is not None
     )
+    cpu = [
+        e.cpu_duration for e in events if isinstance(e, CallEvent) and e.cpu_duration is not None
+    ]
 
     # последняя функция — логично брать из последнего CallEvent или ExceptionEvent
     last = next(
         (e.func_name for e in reversed(events) if isinstance(e, (CallEvent, ExceptionEvent))), "—"
     )
 
-    print(f"[flowtrace] {total} событий, {duration:.6f}s, последняя функция: {last}")
+    cpu_part = f", cpu {sum(cpu):.6f}s" if cpu else ""
+    print(f"[flowtrace] {total} событий, {duration:.6f}s{cpu_part}, последняя функция: {last}")
+    if sampling is not None:
+        print(format_sampling(sampling))
+
+
+class _TreeIndex:
+    """
+    Индексы для print_tree за один проход: прямые дети вызова, его return и
+    исключения в порядке трассы. Вместо поиска по всей трассе на каждый узел.
+    """
+
+    __slots__ = ("children", "excs", "returns", "roots")
+
+    def __init__(self, events: Sequence[TraceEvent]) -> None:
+        self.children: dict[int, list[CallEvent]] = {}
+        self.excs: dict[int, list[ExceptionEvent]] = {}
+        self.returns: dict[int, CallEvent] = {}
+        calls: list[CallEvent] = []
+        for e in events:
+            if isinstance(e, CallEvent):
+                if e.kind == "call":
+                    calls.append(e)
+                    if e.parent_id is not None:
+                        self.children.setdefault(e.parent_id, []).append(e)
+                elif e.kind == "return" and e.parent_id is not None:
+                    # первый return вызова, как и раньше
+                    self.returns.setdefault(e.parent_id, e)
+            elif isinstance(e, ExceptionEvent) and e.parent_id is not None:
+                self.excs.setdefault(e.parent_id, []).append(e)
+
+        # корни: вызовы без родителя, а также те, чей родитель не попал в трассу
+        # (например, вытеснен из кольцевого буфера) — иначе они пропадут из дерева
+        call_ids = {e.id for e in calls}
+        self.roots = [e for e in calls if e.parent_id is None or e.parent_id not in call_ids]
+
+
+# сколько строк копить перед записью в поток
+_TREE_BATCH = 4096
 
 
 def print_tree(
-    events: list[TraceEvent] | None = None,
+    events: Sequence[TraceEvent] | None = None,
     indent: int = 0,
     parent_id: int | None = None,
     inline_return: bool | None = None,
+    file: IO[str] | None = None,
 ) -> None:
+    """
+    Печатает дерево вызовов.
+
+    Индексы детей, return и исключений строятся за один проход, дерево
+    обходится явным стеком (глубина трассы не упирается в лимит рекурсии),
+    строки пишутся в ``file`` (по умолчанию ``sys.stdout``) пачками.
+    ``parent_id`` — печатать только поддеревья детей этого вызова.
+    """
+    out = sys.stdout if file is None else file
     if events is None:
         events = get_trace_data()
 
     if not events:
-        print("[flowtrace] (пустая трасса)")
+        out.write("[flowtrace] (пустая трасса)\n")
         return
 
     cfg = get_config()
     inline = cfg.inline_return if inline_return is None else inline_return
 
-    indent_str = "  " * indent
-
-    # берем только CallEvent с нужным parent_id
-    calls = [
-        e
-        for e in events
-        if isinstance(e, CallEvent) and e.kind == "call" and e.parent_id == parent_id
-    ]
-
-    for call in calls:
-        # дети = CallEvent
-        children = [
-            e
-            for e in events
-            if isinstance(e, CallEvent) and e.kind == "call" and e.parent_id == call.id
-        ]
-
-        # исключения = ExceptionEvent
-        excs = [e for e in events if isinstance(e, ExceptionEvent) and e.parent_id == call.id]
-
-        # return = CallEvent(kind="return")
-        ret = next(
-            (
-                r
-                for r in events
-                if isinstance(r, CallEvent) and r.kind == "return" and r.parent_id == call.id
-            ),
-            None,
-        )
-
-        # условие однострочного листа
-        is_leaf_normal = (
-            inline and not children and not excs and ret is not None and not ret.via_exception
-        )
-
-        if is_leaf_normal:
-            line = f"{indent_str}→ {_sig(call.func_name, call.args_repr)}"
+    index = _TreeIndex(events)
+    top = index.roots if parent_id is None else index.children.get(parent_id, [])
+    lines: list[str] = []
 
-            if ret is not None and ret.duration is not None:
-                line += f" [{ret.duration:.6f}s]"
+    # (вызов, отступ, закрывающий ли шаг): после детей печатаются исключения и хвост
+    stack: list[tuple[CallEvent, int, bool]] = [(c, indent, False) for c in reversed(top)]
+    while stack:
+        call, depth, closing = stack.pop()
+        indent_str = "  " * depth
+        sig = _sig(call.func_name, call.args_repr)
+        ret = index.returns.get(call.id)
 
-            if ret is not None and ret.result_repr is not None:
-                line += f" → {ret.result_repr}"
-
-            print(line)
-            continue
-
-        # многострочный вывод
-        print(f"{indent_str}→ {_sig(call.func_name, call.args_repr)}")
-
-        if children:
-            print_tree(events, indent + 1, call.id, inline_return=inline)
-
-        if excs:
-            exc_indent = "  " * (indent + 1)
-            for ex in excs:
+        if closing:
+            for ex in index.excs.get(call.id, ()):
                 tag = (
                     " [caught]"
                     if ex.caught is True
                     else (" [propagated]" if ex.caught is False else "")
                 )
                 msg = _trim(ex.exc_msg)
-                print(
-                    f"{exc_indent}↯ {_sig(call.func_name, call.args_repr)} {ex.exc_type}: {msg}{tag}"
-                )
+                lines.append(f"{indent_str}  ↯ {sig} {ex.exc_type}: {msg}{tag}")
                 if ex.exc_tb:
-                    print(f"{exc_indent}   ⤷ {ex.exc_tb}")
-
-        # хвостовая стрелка
-        end_arrow = "↯" if (ret and ret.via_exception) else "←"
-        end_line = f"{indent_str}{end_arrow} {_sig(call.func_name, call.args_repr)}"
-
-        if ret and ret.duration is not None:
-            end_line += f" [{ret.duration:.6f}s]"
-        if ret and not ret.via_exception and ret.result_repr is not None:
-            end_line += f" → {ret.result_repr}"
-        if ret and ret.via_exception:
-            end_line += " [exc-return]"
-
-        print(end_line)
+                    lines.append(f"{indent_str}     ⤷ {ex.exc_tb}")
+
+            # хвостовая стрелка
+            end_arrow = "↯" if (ret and ret.via_exception) else "←"
+            end_line = f"{indent_str}{end_arrow} {sig}"
+
+            if ret and (ret.duration is not None or ret.cpu_duration is not None):
+                end_line += f" [{_timing(ret)}]"
+            if ret and not ret.via_exception and ret.result_repr is not None:
+                end_line += f" → {ret.result_repr}"
+            if ret and ret.via_exception:
+                end_line += " [exc-return]"
+            lines.append(end_line)
+        else:
+            children = index.children.get(call.id)
+
+            # условие однострочного листа
+            is_leaf_normal = (
+                inline
+                and not children
+                and call.id not in index.excs
+                and ret is not None
+                and not ret.via_exception
+            )
+
+            if is_leaf_normal:
+                line = f"{indent_str}→ {sig}"
+                if ret is not None and (ret.duration is not None or ret.cpu_duration is not None):
+                    line += f" [{_timing(ret)}]"
+                if ret is not None and ret.result_repr is not None:
+                    line += f" → {ret.result_repr}"
+                lines.append(line)
+            else:
+                # многострочный вывод: шапка, дети, затем закрывающий шаг
+                lines.append(f"{indent_str}→ {sig}")
+                stack.append((call, depth, True))
+                if children:
+                    stack.extend((c, depth + 1, False) for c in reversed(children))
+
+        if len(lines) >= _TREE_BATCH:
+            out.write("\n".join(lines) + "\n")
+            lines.clear()
+
+    if lines:
+        out.write("\n".join(lines) + "\n")
@@ -1,51 +1,128 @@
 from __future__ import annotations
 
-import logging
+import fnmatch
+import re
 import sys
 import weakref
 from collections.abc import Callable
 from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from types import CodeType
+
+    from flowtrace.config import EventProfile
 
 Cb = Callable[..., None]
 
 # Активные колбеки на tool_id
 _ACTIVE_CALLBACKS: dict[int, dict[str, Cb]] = {}
 
+# Scoped-режим: маска локальных событий и code objects, на которых она включена
+_LOCAL_MASKS: dict[int, int] = {}
+_ARMED_CODES: dict[int, set[CodeType]] = {}
+
+# Все события, на которые может подписываться FlowTrace.
+EVENT_NAMES = (
+    "PY_START",
+    "PY_RETURN",
+    "RAISE",
+    "RERAISE",
+    "PY_UNWIND",
+    "EXCEPTION_HANDLED",
+    "PY_RESUME",
+    "PY_YIELD",
+    "CALL",
+)
+
+# Какие события нужны каждому профилю (см. flowtrace.config.EventProfile).
+# PY_UNWIND есть везде: без него стек вызовов расходится при исключениях.
+_CALL_EVENTS = ("PY_START", "PY_RETURN", "PY_UNWIND")
+_EXCEPTION_EVENTS = ("RAISE", "RERAISE", "EXCEPTION_HANDLED")
+_ASYNC_EVENTS = ("PY_RESUME", "PY_YIELD")
+
+PROFILE_EVENTS: dict[str, frozenset[str]] = {
+    "calls": frozenset(_CALL_EVENTS),
+    "exceptions": frozenset(_CALL_EVENTS + _EXCEPTION_EVENTS),
+    "full": frozenset(_CALL_EVENTS + _EXCEPTION_EVENTS + _ASYNC_EVENTS),
+}
+
+
+def profile_events(profile: EventProfile) -> frozenset[str]:
+    """Имена событий sys.monitoring для профиля; ValueError для неизвестного."""
+    try:
+        return PROFILE_EVENTS[profile]
+    except KeyError:
+        raise ValueError(
+            f"[FlowTrace] Unknown event profile {profile!r}; "
+            f"expected one of: {', '.join(PROFILE_EVENTS)}"
+        ) from None
+
 
-def start_monitoring(tool_id: int) -> None:
+# События, которые можно включать на отдельных code objects (set_local_events).
+# RAISE/RERAISE/PY_UNWIND/EXCEPTION_HANDLED бывают только глобальными.
+LOCAL_EVENT_NAMES = frozenset({"PY_START", "PY_RETURN", "PY_RESUME", "PY_YIELD", "CALL"})
+
+
+def start_monitoring(tool_id: int, callbacks: dict[str, Cb], *, scoped: bool = False) -> None:
     """
-    Включает мониторинг для заданного tool_id и делегирует все события в dispatch.
+    Включает мониторинг для заданного tool_id.
+
+    ``callbacks`` — готовые колбеки на каждый тип события (``"PY_START"`` → cb),
+    которые регистрируются в sys.monitoring напрямую, без промежуточного
+    диспетчера. Места кода, отключённые колбеками через
+    ``sys.monitoring.DISABLE`` в прошлых сессиях, снова включаются.
+
+    При ``scoped=True`` глобально включаются только события исключений, а
+    локальные события (вызовы, возвраты, async-переходы) — лишь на тех
+    code objects, которые переданы в :func:`arm_code`. Остальной код
+    интерпретатор исполняет без инструментирования.
     """
     events = sys.monitoring.events
 
-    handlers = {
-        "PY_START": make_handler("PY_START", _dispatch_event),
-        "PY_RETURN": make_handler("PY_RETURN", _dispatch_event),
-        "RAISE": make_handler("RAISE", _dispatch_event),
-        "RERAISE": make_handler("RERAISE", _dispatch_event),
-        "PY_UNWIND": make_handler("PY_UNWIND", _dispatch_event),
-        "EXCEPTION_HANDLED": make_handler("EXCEPTION_HANDLED", _dispatch_event),
-        "PY_RESUME": make_handler("PY_RESUME", _dispatch_event),
-        "PY_YIELD": make_handler("PY_YIELD", _dispatch_event),
-    }
-
-    for name, cb in handlers.items():
+    mask = events.NO_EVENTS
+    local_mask = events.NO_EVENTS
+    for name, cb in callbacks.items():
         ev = getattr(events, name)
         sys.monitoring.register_callback(tool_id, ev, cb)
+        mask |= ev
+        if name in LOCAL_EVENT_NAMES:
+            local_mask |= ev
 
-    sys.monitoring.set_events(
-        tool_id,
-        events.PY_START
-        | events.PY_RETURN
-        | events.RAISE
-        | events.RERAISE
-        | events.PY_UNWIND
-        | events.EXCEPTION_HANDLED
-        | events.PY_RESUME
-        | events.PY_YIELD,
-    )
+    if scoped:
+        sys.monitoring.set_events(tool_id, mask & ~local_mask)
+        _LOCAL_MASKS[tool_id] = local_mask
+        _ARMED_CODES[tool_id] = set()
+    else:
+        sys.monitoring.set_events(tool_id, mask)
+
+    _ACTIVE_CALLBACKS[tool_id] = dict(callbacks)
+    rearm_filtered_events()
+
+
+def arm_code(tool_id: int, code: CodeType) -> None:
+    """
+    Включает локальные события scoped-режима на одном code object.
+
+    Вне scoped-режима и для уже включённого кода ничего не делает.
+    """
+    armed = _ARMED_CODES.get(tool_id)
+    if armed is None or code in armed:
+        return
+    sys.monitoring.set_local_events(tool_id, code, _LOCAL_MASKS[tool_id])
+    armed.add(code)
 
-    _ACTIVE_CALLBACKS[tool_id] = handlers
+
+def rearm_filtered_events() -> None:
+    """
+    Снова включает места, отключённые через ``sys.monitoring.DISABLE``.
+
+    Нужно вызывать при старте новой сессии и при любом изменении правил
+    фильтрации: иначе код, однажды признанный непользовательским, так и
+    останется без событий.
+    """
+    sys.monitoring.restart_events()
 
 
 def stop_monitoring(tool_id: int) -> None:
@@ -56,23 +133,15 @@ def stop_monitoring(tool_id: int) -> None:
 
     # отключаем генерацию событий
     sys.monitoring.set_events(tool_id, events.NO_EVENTS)
+    for code in _ARMED_CODES.pop(tool_id, ()):
+        sys.monitoring.set_local_events(tool_id, code, events.NO_EVENTS)
+    _LOCAL_MASKS.pop(tool_id, None)
 
     handlers = _ACTIVE_CALLBACKS.pop(tool_id, None)
 
     # даже если по какой-то причине в _ACTIVE_CALLBACKS ничего нет —
     # подчистим callbacks на всякий
-    names = (
-        "PY_START",
-        "PY_RETURN",
-        "RAISE",
-        "RERAISE",
-        "PY_UNWIND",
-        "EXCEPTION_HANDLED",
-        "PY_RESUME",
-        "PY_YIELD",
-    )
-
-    for name in names if handlers is None else handlers.keys():
+    for name in EVENT_NAMES if handlers is None else handlers.keys():
         ev = getattr(events, name)
         sys.monitoring.register_callback(tool_id, ev, None)
 
@@ -89,30 +158,6 @@ def reserve_tool_id(name: str = "flowtrace") -> int:
     )
 
 
-def make_handler(event_label: str, dispatch):
-    """Создаёт колбэк sys.monitoring → вызывает общий диспетчер."""
-
-    def handler(*args):
-        if not args:
-            return
-        code = args[0]
-        try:
-            dispatch(event_label, code, args)
-        except Exception as e:
-            logging.debug("[flowtrace-debug] handler error: %s", e)
-
-    return handler
-
-
-def _dispatch_event(label: str, code, raw_args):
-    from flowtrace.session import CURRENT_SESSION
-
-    sess = CURRENT_SESSION.get()
-    if not (sess and sess.state.active):
-        return
-    sess.raw_dispatcher.dispatch(label, code, raw_args)
-
-
 def _norm(p: Path) -> str:
     """Нормализация путей"""
     return str(p).replace("\\", "/").lower()
@@ -121,21 +166,85 @@ def _norm(p: Path) -> str:
 _REPO_ROOT_STR = _norm(Path(__file__).resolve().parent.parent)
 _EXAMPLES_DIR_STR = _REPO_ROOT_STR + "/examples"
 _TESTS_DIR_STR = _REPO_ROOT_STR + "/tests"
+_BENCHMARKS_DIR_STR = _REPO_ROOT_STR + "/benchmarks"
 _STD_PREFIXES_STR = tuple(_norm(p) for p in {Path(sys.prefix), Path(sys.base_prefix)} if p.exists())
 
 # слабый кэш для фильтрации кода (ускоряет _is_user_code)
 _IS_USER_CODE_CACHE: weakref.WeakKeyDictionary[object, bool] = weakref.WeakKeyDictionary()
+# co_filename / путь кадра traceback -> решение; избавляет от Path.resolve() на каждый вызов
+_IS_USER_PATH_CACHE: dict[str, bool] = {}
+
+# Пользовательские правила (config(include=..., exclude=...)), скомпилированные
+# в одно регулярное выражение на список. exclude важнее include.
+_FILTER_PATTERNS: tuple[tuple[str, ...], tuple[str, ...]] = ((), ())
+_INCLUDE_RE: re.Pattern[str] | None = None
+_EXCLUDE_RE: re.Pattern[str] | None = None
+
+# объекты со своими кэшами решений фильтра (диспетчеры активных сессий)
+_FILTER_WATCHERS: weakref.WeakSet[Any] = weakref.WeakSet()
+
+
+def _compile_patterns(patterns: tuple[str, ...]) -> re.Pattern[str] | None:
+    """
+    Собирает glob-и и регулярные выражения в один matcher.
+
+    Glob сопоставляется с нормализованным абсолютным путём целиком
+    (``*`` захватывает и ``/``); шаблон с префиксом ``re:`` — регулярное
+    выражение, которое ищется в любом месте пути.
+    """
+    if not patterns:
+        return None
+    parts: list[str] = []
+    for pattern in patterns:
+        if pattern.startswith("re:"):
+            parts.append(f"(?:{pattern[3:]})")
+        else:
+            parts.append("^" + fnmatch.translate(pattern.replace("\\", "/")))
+    try:
+        return re.compile("|".join(parts), re.IGNORECASE)
+    except re.error as e:
+        raise ValueError(f"[FlowTrace] Invalid filter pattern: {e}") from None
+
+
+def set_path_filters(include: Iterable[str] = (), exclude: Iterable[str] = ()) -> None:
+    """
+    Задаёт пользовательские правила фильтрации кода.
+
+    При изменении правил сбрасываются все кэши решений и снова включаются
+    события, отключённые через ``sys.monitoring.DISABLE``.
+    """
+    global _FILTER_PATTERNS, _INCLUDE_RE, _EXCLUDE_RE
+
+    patterns = (tuple(include), tuple(exclude))
+    if patterns == _FILTER_PATTERNS:
+        return
+    include_re = _compile_patterns(patterns[0])
+    exclude_re = _compile_patterns(patterns[1])
+    _FILTER_PATTERNS, _INCLUDE_RE, _EXCLUDE_RE = patterns, include_re, exclude_re
+
+    _IS_USER_CODE_CACHE.clear()
+    _IS_USER_PATH_CACHE.clear()
+    for watcher in list(_FILTER_WATCHERS):
+        watcher.invalidate_filter_cache()
+    rearm_filtered_events()
+
+
+def watch_path_filters(watcher: Any) -> None:
+    """Подписывает объект с ``invalidate_filter_cache()`` на смену правил фильтрации."""
+    _FILTER_WATCHERS.add(watcher)
 
 
 def _is_user_path_norm(sp: str) -> bool:
     """Правило фильтрации уже нормализованного абсолютного пути."""
-    if any(sp.startswith(pref) for pref in _STD_PREFIXES_STR) or "site-packages/" in sp:
+    if _EXCLUDE_RE is not None and _EXCLUDE_RE.search(sp):
         return False
-
-    if sp.startswith(_EXAMPLES_DIR_STR):
+    if _INCLUDE_RE is not None and _INCLUDE_RE.search(sp):
         return True
 
-    if sp.startswith(_EXAMPLES_DIR_STR) or sp.startswith(_TESTS_DIR_STR):
+    if any(sp.startswith(pref) for pref in _STD_PREFIXES_STR) or "site-packages/" in sp:
+        return False
+
+    if sp.startswith((_EXAMPLES_DIR_STR, _TESTS_DIR_STR, _BENCHMARKS_DIR_STR)):
         return True
 
     return not sp.startswith(_REPO_ROOT_STR)
@@ -147,22 +256,20 @@ def _is_user_code(code) -> bool:
     if cached is not None:
         return cached
 
-    try:
-        p = Path(code.co_filename).resolve()
-    except Exception:
-        _IS_USER_CODE_CACHE[code] = False
-        return False
-
-    result = _is_user_path_norm(_norm(p))
+    result = _is_user_path(code.co_filename)
     _IS_USER_CODE_CACHE[code] = result
     return result
 
 
 def _is_user_path(path: str) -> bool:
     """Определяет, относится ли путь к пользовательскому коду."""
+    cached = _IS_USER_PATH_CACHE.get(path)
+    if cached is not None:
+        return cached
+
     try:
-        p = Path(path).resolve()
+        result = _is_user_path_norm(_norm(Path(path).resolve()))
     except Exception:
-        return False
-
-    return _is_user_path_norm(_norm(p))
+        result = False
+    _IS_USER_PATH_CACHE[path] = result
+    return result
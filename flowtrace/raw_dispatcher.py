@@ -1,138 +1,256 @@
 from __future__ import annotations
 
+import logging
+import sys
 import traceback
+import weakref
 from pathlib import Path
+from threading import get_ident
 from typing import TYPE_CHECKING, Any, Literal
 
-from flowtrace.monitoring import _is_user_code, _is_user_path
+from flowtrace.monitoring import (
+    _is_user_code,
+    _is_user_path,
+    arm_code,
+    profile_events,
+    watch_path_filters,
+)
+from flowtrace.utils.code_objects import callable_codes
 
 if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
     from types import CodeType
 
-    from flowtrace.session import (
-        AsyncTracker,
-        CallStackInspector,
-        CallTracker,
-        ExceptionTracker,
-        SessionState,
-    )
+    from flowtrace.config import EventProfile
+    from flowtrace.session import ThreadTrackers
 from flowtrace.utils.code_flags import is_async_gen_code, is_coroutine_code
 
+# Имена, зарегистрированные декоратором @trace: code object функции → имя.
+# Слабые ссылки, чтобы реестр не удерживал код выгруженных модулей.
+_REGISTERED_NAMES: weakref.WeakKeyDictionary[CodeType, str] = weakref.WeakKeyDictionary()
+
+
+def register_code_name(code: CodeType, name: str) -> None:
+    """Задаёт отображаемое имя для функции с данным code object."""
+    _REGISTERED_NAMES[code] = name
+
 
 class CodeNameResolver:
     """
     Разрешает отображаемое имя функции по code object.
 
-    Использует внутренний кэш ``code -> resolved_name``, чтобы
-    не выполнять дорогой поиск через ``gc.get_referrers(...)``
-    на каждом raw-событии.
+    Имя берётся из реестра :func:`register_code_name` (его заполняет
+    ``@trace``), иначе — ``code.co_qualname``, которое уже содержит класс
+    для методов. Оба пути O(1), без обхода кучи.
     """
 
-    def __init__(self) -> None:
-        self._cache: dict[CodeType, str] = {}
-
     def resolve(self, code: CodeType) -> str:
         """
         Возвращает имя функции для указанного code object.
 
-        Сначала проверяет кэш. Если имя ещё не было вычислено,
-        пытается найти функцию или метод, ссылающийся на данный
-        ``code`` object, и извлечь ``__flowtrace_real_name__``.
-        Если это не удалось, использует ``code.co_name``.
-
         :param code: Code object исполняемой функции.
         :return: Разрешённое имя функции.
         """
-        if code in self._cache:
-            return self._cache[code]
+        name = _REGISTERED_NAMES.get(code)
+        return name if name is not None else code.co_qualname
 
-        resolved_name = code.co_name
 
-        try:
-            import gc
-            import inspect
+class RawEventDispatcher:
+    """
+    Движок захвата: по одному колбеку sys.monitoring на каждый тип события.
 
-            for obj in gc.get_referrers(code):
-                if (inspect.isfunction(obj) or inspect.ismethod(obj)) and getattr(
-                    obj, "__code__", None
-                ) is code:
-                    real = getattr(obj, "__flowtrace_real_name__", None)
-                    if real:
-                        resolved_name = real
-                    break
-        except Exception:
-            pass
+    Колбеки ``on_*`` регистрируются в sys.monitoring напрямую (см.
+    :meth:`callbacks`), поэтому сессия и её трекеры связываются с ними один
+    раз при ``start_tracing``, а не ищутся на каждом событии.
 
-        self._cache[code] = resolved_name
-        return resolved_name
+    Фильтр пользовательского кода и имя функции кэшируются вместе в одном
+    словаре ``code -> name | None``: ``None`` означает, что код отфильтрован.
+    Для локальных событий такой код получает ``sys.monitoring.DISABLE``,
+    если включён ``disable_filtered``.
 
+    ``event_profile`` определяет, какие колбеки вообще регистрируются: события
+    вне профиля не доставляются интерпретатором и ничего не стоят.
+
+    Если задан ``scope``, диспетчер работает в scoped-режиме: трассируются
+    только code objects из ``scope`` и пользовательский код, который из них
+    вызывается. Новые функции добавляются в ``scope`` по событию CALL.
+
+    Стек, буфер и трекеры у каждого потока свои (``threads``: id потока →
+    :class:`~flowtrace.session.ThreadTrackers`); поток получает их при первом
+    событии через ``new_thread``, дальше — одним поиском в словаре без блокировок.
+    """
 
-class RawEventDispatcher:
     def __init__(
         self,
-        state: SessionState,
-        call_tracker: CallTracker,
-        exception_tracker: ExceptionTracker,
-        async_tracker: AsyncTracker,
-        stack_inspector: CallStackInspector,
+        threads: dict[int, ThreadTrackers],
+        new_thread: Callable[[], ThreadTrackers],
         *,
         default_exc_tb_depth: int,
+        disable_filtered: bool = True,
+        scope: Iterable[CodeType] | None = None,
+        event_profile: EventProfile = "full",
     ):
-        self.state = state
-        self.call_tracker = call_tracker
-        self.exception_tracker = exception_tracker
-        self.async_tracker = async_tracker
-        self.stack_inspector = stack_inspector
+        self._threads = threads
+        self._new_thread = new_thread
         self.default_exc_tb_depth = default_exc_tb_depth
 
         self.code_name_resolver = CodeNameResolver()
-
-    def dispatch(self, label: str, code: CodeType, raw: tuple[Any, ...]) -> None:
-        if not _is_user_code(code):
-            return
-
-        func_name = self.code_name_resolver.resolve(code)
-
-        if label == "PY_START":
-            self.call_tracker.on_call(func_name)
+        # code -> имя функции, либо None для отфильтрованного кода
+        self._names: dict[CodeType, str | None] = {}
+        self._rejected = sys.monitoring.DISABLE if disable_filtered else None
+
+        self.scope: set[CodeType] | None = set(scope) if scope is not None else None
+        self._tool_id: int | None = None
+        self.events = profile_events(event_profile)
+        watch_path_filters(self)
+
+    def code_locations(self) -> dict[str, tuple[str, int]]:
+        """Имя функции → (файл, первая строка) для всего кода, прошедшего фильтр."""
+        return {
+            name: (code.co_filename, code.co_firstlineno)
+            for code, name in list(self._names.items())
+            if name is not None
+        }
+
+    def invalidate_filter_cache(self) -> None:
+        """Сбрасывает решения фильтра: правила include/exclude изменились."""
+        self._names.clear()
+
+    @property
+    def scoped(self) -> bool:
+        return self.scope is not None
+
+    def attach(self, tool_id: int) -> None:
+        """Привязывает диспетчер к tool_id и включает события на исходном scope."""
+        self._tool_id = tool_id
+        for code in self.scope or ():
+            arm_code(tool_id, code)
+
+    def extend_scope(self, code: CodeType) -> None:
+        """Добавляет code object в scope и включает на нём локальные события."""
+        if self.scope is None or code in self.scope:
             return
+        self.scope.add(code)
+        self._names.pop(code, None)
+        if self._tool_id is not None:
+            arm_code(self._tool_id, code)
 
-        elif label == "PY_RETURN":
-            value = raw[-1] if raw else None
-            self.call_tracker.on_return(value)
-            return
+    def callbacks(self) -> dict[str, Callable[..., Any]]:
+        """
+        Колбеки для регистрации в sys.monitoring: имя события → bound-метод.
 
-        elif label == "RAISE":
-            exc = raw[-1] if raw else None
-            self._dispatch_raise(func_name, exc)
-            return
+        Возвращаются только события профиля. Если исключения не отслеживаются,
+        PY_UNWIND лишь закрывает кадр, не создавая ExceptionEvent.
+        """
+        table: dict[str, Callable[..., Any]] = {
+            "PY_START": self.on_py_start,
+            "PY_RETURN": self.on_py_return,
+            "RAISE": self.on_raise,
+            "RERAISE": self.on_reraise,
+            "PY_UNWIND": self.on_py_unwind if "RAISE" in self.events else self.on_frame_unwind,
+            "EXCEPTION_HANDLED": self.on_exception_handled,
+            "PY_RESUME": self.on_py_resume,
+            "PY_YIELD": self.on_py_yield,
+        }
+        callbacks = {name: cb for name, cb in table.items() if name in self.events}
+        if self.scope is not None:
+            callbacks["CALL"] = self.on_call_site
+        return callbacks
+
+    def _resolve(self, code: CodeType) -> str | None:
+        """Медленный путь: классифицирует code object и кэширует результат."""
+        if self.scope is not None:
+            accepted = code in self.scope
+        else:
+            accepted = _is_user_code(code)
+        name = self.code_name_resolver.resolve(code) if accepted else None
+        self._names[code] = name
+        return name
+
+    def on_call_site(self, code: CodeType, offset: int, callable_: object, arg0: object) -> Any:
+        """
+        CALL внутри scoped-кода: расширяет scope на вызываемый пользовательский код.
 
-        elif label == "RERAISE":
-            exc = raw[-1] if raw else None
-            exc_type, exc_msg = self._extract_exc_info(exc)
-            self.exception_tracker.on_reraise(func_name, exc_type, exc_msg)
-            return
+        DISABLE отключил бы CALL для всего места вызова, а не для одного
+        вызываемого: полиморфное место (``for f in (len, user_fn): f(x)``)
+        больше не дошло бы до ``user_fn``. Поэтому места с builtins не
+        отключаются.
+        """
+        try:
+            for target in callable_codes(callable_):
+                if _is_user_code(target):
+                    self.extend_scope(target)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] CALL handler error: %s", e)
+        return None
 
-        elif label == "EXCEPTION_HANDLED":
-            exc = raw[-1] if raw else None
-            exc_type, exc_msg = self._extract_exc_info(exc)
-            self.exception_tracker.on_exception_handled(func_name, exc_type, exc_msg)
-            return
+    # --- локальные события: отфильтрованный код можно отключить ---
 
-        elif label == "PY_UNWIND":
-            exc = raw[-1] if raw else None
-            exc_type, exc_msg = self._extract_exc_info(exc)
-            self.exception_tracker.on_unwind(func_name, exc_type, exc_msg)
-            return
+    def on_py_start(self, code: CodeType, offset: int) -> Any:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return self._rejected
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        try:
+            t.call_tracker.on_call(name, code)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_START handler error: %s", e)
+        return None
 
-        elif label == "PY_RESUME":
-            self.async_tracker.on_async("resume", func_name)
-            return
+    def on_py_return(self, code: CodeType, offset: int, retval: object) -> Any:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return self._rejected
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        try:
+            t.call_tracker.on_return(retval)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_RETURN handler error: %s", e)
+        return None
 
-        elif label == "PY_YIELD":
-            value = raw[-1] if raw else None
-            detail = self._safe_repr(value)
+    def on_py_resume(self, code: CodeType, offset: int) -> Any:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return self._rejected
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        try:
+            t.async_tracker.on_async("resume", name)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_RESUME handler error: %s", e)
+        return None
 
+    def on_py_yield(self, code: CodeType, offset: int, retval: object) -> Any:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return self._rejected
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        if t.suppressed():
+            return None
+        try:
             if is_async_gen_code(code):
                 kind: Literal["await", "resume", "yield"] = "yield"
             elif is_coroutine_code(code):
@@ -140,23 +258,123 @@ class RawEventDispatcher:
             else:
                 kind = "yield"
 
-            self.async_tracker.on_async(kind, func_name, detail)
+            t.async_tracker.on_async(kind, name, self._safe_repr(retval))
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_YIELD handler error: %s", e)
+        return None
+
+    # --- события исключений: не локальные, DISABLE для них не работает ---
+
+    def on_raise(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        if t.suppressed():
+            return
+        try:
+            self._dispatch_raise(t, name, exc)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] RAISE handler error: %s", e)
+
+    def on_reraise(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        if t.suppressed():
+            return
+        try:
+            exc_type, exc_msg = self._extract_exc_info(exc)
+            t.exception_tracker.on_reraise(name, exc_type, exc_msg)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] RERAISE handler error: %s", e)
+
+    def on_exception_handled(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        if t.suppressed():
+            return
+        try:
+            exc_type, exc_msg = self._extract_exc_info(exc)
+            t.exception_tracker.on_exception_handled(name, exc_type, exc_msg)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] EXCEPTION_HANDLED handler error: %s", e)
 
-    def _dispatch_raise(self, func_name: str, exc: BaseException | None) -> None:
+    def on_py_unwind(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        try:
+            exc_type, exc_msg = self._extract_exc_info(exc)
+            t.exception_tracker.on_unwind(name, exc_type, exc_msg)
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_UNWIND handler error: %s", e)
+
+    def on_frame_unwind(self, code: CodeType, offset: int, exc: BaseException) -> None:
+        """PY_UNWIND для профиля ``"calls"``: только закрывает кадр."""
+        try:
+            name = self._names[code]
+        except KeyError:
+            name = self._resolve(code)
+        if name is None:
+            return
+        try:
+            t = self._threads[get_ident()]
+        except KeyError:
+            t = self._new_thread()
+        try:
+            t.exception_tracker.close_frame()
+        except Exception as e:
+            logging.debug("[flowtrace-debug] PY_UNWIND handler error: %s", e)
+
+    def _dispatch_raise(
+        self,
+        t: ThreadTrackers,
+        func_name: str,
+        exc: BaseException | None,
+    ) -> None:
         exc_type, exc_msg = self._extract_exc_info(exc)
 
-        call_event_id = self.stack_inspector.current_call_event_id()
-        if call_event_id is None and self.state.stack:
-            call_event_id = self.state.stack[-1].call_event_id
+        call_event_id = t.stack_inspector.current_call_event_id()
+        if call_event_id is None and t.state.stack:
+            call_event_id = t.state.stack[-1].call_event_id
 
-        depth = self.state.exc_depth_by_call.get(
+        depth = t.state.exc_depth_by_call.get(
             call_event_id if call_event_id is not None else -1,
             self.default_exc_tb_depth,
         )
 
         tb_text = self._format_exc_tb(exc, depth)
 
-        self.exception_tracker.on_exception_raised(
+        t.exception_tracker.on_exception_raised(
             func_name,
             exc_type,
             exc_msg,
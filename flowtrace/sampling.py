@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from itertools import count
+
+
+@dataclass(frozen=True, slots=True)
+class SamplingStats:
+    """Итоги сэмплирования корневых деревьев вызовов."""
+
+    roots_seen: int
+    roots_sampled: int
+    rate: float | None = None
+    every: int | None = None
+
+    @property
+    def fraction(self) -> float:
+        """Доля записанных деревьев."""
+        return self.roots_sampled / self.roots_seen if self.roots_seen else 0.0
+
+    @property
+    def scale(self) -> float:
+        """Множитель для экстраполяции статистики записанных деревьев на все."""
+        return self.roots_seen / self.roots_sampled if self.roots_sampled else 0.0
+
+
+class Sampler:
+    """
+    Решает, записывать ли очередное корневое дерево вызовов.
+
+    ``rate`` — вероятностный режим (доля от 0 до 1), ``every`` — каждое
+    N-е дерево, начиная с первого. Задаётся ровно один из параметров.
+    """
+
+    def __init__(
+        self,
+        rate: float | None = None,
+        every: int | None = None,
+        *,
+        seed: int | None = None,
+    ) -> None:
+        if (rate is None) == (every is None):
+            raise ValueError("[FlowTrace] sampling needs exactly one of sample_rate / sample_every")
+        if rate is not None and not 0.0 <= rate <= 1.0:
+            raise ValueError(f"[FlowTrace] sample_rate must be within [0, 1], got {rate!r}")
+        if every is not None and every < 1:
+            raise ValueError(f"[FlowTrace] sample_every must be >= 1, got {every!r}")
+
+        self.rate = rate
+        self.every = every
+        self._random = random.Random(seed).random
+
+        # next() у itertools.count атомарен под GIL: корни могут приходить из разных потоков
+        self._seen = count(1)
+        self._sampled = count(1)
+        self.roots_seen = 0
+        self.roots_sampled = 0
+
+    @classmethod
+    def create(
+        cls,
+        rate: float | None = None,
+        every: int | None = None,
+    ) -> Sampler | None:
+        """Sampler для заданных параметров или ``None``, если сэмплирование не включено."""
+        if rate is None and every is None:
+            return None
+        return cls(rate=rate, every=every)
+
+    def decide(self) -> bool:
+        """Принимает решение по очередному корню и учитывает его в статистике."""
+        seen = next(self._seen)
+        self.roots_seen = max(self.roots_seen, seen)
+        if self.every is not None:
+            sampled = (seen - 1) % self.every == 0
+        else:
+            sampled = self._random() < (self.rate or 0.0)
+        if sampled:
+            self.roots_sampled = max(self.roots_sampled, next(self._sampled))
+        return sampled
+
+    def stats(self) -> SamplingStats:
+        return SamplingStats(
+            roots_seen=self.roots_seen,
+            roots_sampled=self.roots_sampled,
+            rate=self.rate,
+            every=self.every,
+        )
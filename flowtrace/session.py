@@ -1,20 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
 import threading
+import weakref
+from asyncio import _get_running_loop
 from collections import defaultdict
 from contextlib import suppress
 from contextvars import ContextVar
 from dataclasses import dataclass, field
-from time import perf_counter
-from typing import Any, Literal
+from itertools import count
+from operator import attrgetter
+from time import perf_counter, perf_counter_ns
+from typing import TYPE_CHECKING, Any, Literal
 
+from flowtrace.async_reconstruct import LiveTaskStore
 from flowtrace.asyncio_support import (
-    ASYNC_PARENT,
-    get_async_id,
+    TaskRegistry,
     install_task_factory,
     uninstall_task_factory,
 )
+from flowtrace.clocks import cpu_clock, measures_wall
 from flowtrace.events import (
     AsyncTransitionEvent,
     CallEvent,
@@ -23,6 +29,19 @@ from flowtrace.events import (
     TraceEvent,
 )
 from flowtrace.raw_dispatcher import RawEventDispatcher
+from flowtrace.sink import SinkEventStore
+from flowtrace.storage import EventStore, ListEventStore, make_store
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator, Sequence
+    from types import CodeType
+
+    from flowtrace.async_model import ParkedTask, TaskTrace
+    from flowtrace.clocks import ClockKind
+    from flowtrace.config import EventProfile
+    from flowtrace.sampling import Sampler, SamplingStats
+    from flowtrace.sink import EventSink
+    from flowtrace.storage import StorageKind
 
 CURRENT_SESSION: ContextVar[TraceSession | None] = ContextVar(
     "flowtrace_session",
@@ -37,6 +56,13 @@ class ActiveCall:
     call_event_id: int
     func_name: str
     start_time: float
+    # CallEvent этого вызова: нужен при возврате и для снимков, в которых
+    # само событие уже вытеснено из хранилища (flight recorder)
+    event: CallEvent | None = None
+    # показание CPU-часов на входе (нс); None — CPU-время не меряется
+    cpu_start: int | None = None
+    # интернированный контекст таски (потока), в которой начался вызов
+    context: ExecutionContext | None = None
 
 
 @dataclass(slots=True)
@@ -48,14 +74,25 @@ class PendingCallMeta:
     show_result: bool
     show_timing: bool
     exc_tb_depth: int
+    # решение сэмплера декоратора для корневого вызова; None — решает сессия
+    sampled: bool | None = None
 
 
 @dataclass(slots=True)
 class SessionState:
-    """Хранение состояния трассировки."""
+    """
+    Хранение состояния трассировки одного потока.
+
+    У каждого потока сессии свой SessionState: стек, буфер событий и
+    служебные словари не разделяются, поэтому запись идёт без блокировок.
+    Общий у всех потоков только счётчик ``ids``: по нему буферы сливаются
+    в один упорядоченный поток событий.
+    """
 
     active: bool = False
-    events: list[TraceEvent] = field(default_factory=list)
+    events: EventStore = field(default_factory=ListEventStore)
+    # источник id событий: монотонный счётчик, не зависящий от хранилища
+    ids: Iterator[int] = field(default_factory=count)
     stack: list[ActiveCall] = field(default_factory=list)
     # очередь метаданных от декоратора для КОНКРЕТНОГО следующего вызова функции
     # func_name -> list[PendingCallMeta]
@@ -66,35 +103,113 @@ class SessionState:
         default_factory=dict
     )  # call_event_id -> event_id исключения
     exc_depth_by_call: dict[int, int] = field(default_factory=dict)
+    # глубина внутри корневого дерева, не попавшего в выборку (0 — запись идёт)
+    suppressed_depth: int = 0
+    # открытые записанные вызовы текущей asyncio-таски (вне тасок — потока):
+    # 0 — следующий вызов корневой. Эти два поля — состояние текущей таски,
+    # ExecutionContextProvider подменяет их при смене таски
+    task_depth: int = 0
 
 
 class ExecutionContextProvider:
-    @staticmethod
-    def get_current() -> ExecutionContext:
-        """Возвращает свежий ExecutionContext для текущего события."""
-        thread_id = threading.get_ident()
-        task_id = None
-        parent_id = None
-        task_name = None
+    """
+    Выдаёт ExecutionContext для событий одного потока.
+
+    Контексты интернированы: один объект на поток вне задач и по одному на
+    каждую asyncio.Task, поэтому события разделяют их, а на горячем пути нет
+    ни аллокаций, ни обращений к реестру async_id. Синхронный код платит
+    только за проверку «запущен ли event loop», асинхронный — ещё за
+    сравнение текущей задачи с предыдущей. Кэш задачи сбрасывается, как
+    только задача сменилась, в том числе внутри отфильтрованного кода
+    библиотек, где событий PY_RESUME не видно.
+
+    Таски одного потока перемежаются, поэтому решение сэмплера о корневом
+    дереве принадлежит таске: при смене таски провайдер сохраняет
+    ``suppressed_depth`` / ``task_depth`` в ``state`` прежней и подставляет
+    значения новой. Трекеры вызывают :meth:`get_current` до того, как читать
+    эти поля.
+    """
 
-        try:
-            task = asyncio.current_task()
-        except RuntimeError:
-            task = None
+    def __init__(self, registry: TaskRegistry, state: SessionState | None = None) -> None:
+        self.registry = registry
+        self.state = state
+        # (suppressed_depth, task_depth) тасок, которые сейчас не выполняются, и кода вне тасок
+        self._depths: weakref.WeakKeyDictionary[asyncio.Task, tuple[int, int]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._no_task_depths = (0, 0)
+        self.thread_id = threading.get_ident()
+        self._no_task = ExecutionContext(thread_id=self.thread_id)
+        self._task: asyncio.Task | None = None
+        self._current = self._no_task
+        self._by_task: weakref.WeakKeyDictionary[asyncio.Task, ExecutionContext] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get_current(self) -> ExecutionContext:
+        """Возвращает ExecutionContext для текущего события."""
+        loop = _get_running_loop()
+        if loop is None:
+            return self._no_task
+        task = asyncio.current_task(loop)
+        if task is self._task:
+            return self._current
+        return self._switch(task)
+
+    def reset(self) -> None:
+        """Забывает закэшированную задачу (не держим её после остановки сессии)."""
+        self._swap_depths(None)
+        self._depths.clear()
+        self._task = None
+        self._current = self._no_task
+
+    def _swap_depths(self, task: asyncio.Task | None) -> None:
+        """Сохраняет глубины уходящей таски в ``state`` и подставляет глубины ``task``."""
+        state = self.state
+        if state is None:
+            return
+        depths = (state.suppressed_depth, state.task_depth)
+        prev = self._task
+        if prev is None:
+            self._no_task_depths = depths
+        elif depths != (0, 0):
+            with suppress(TypeError):
+                self._depths[prev] = depths
+        else:
+            self._depths.pop(prev, None)
+        if task is None:
+            depths = self._no_task_depths
+        else:
+            depths = self._depths.get(task, (0, 0))
+        state.suppressed_depth, state.task_depth = depths
 
-        if task is not None:
-            task_id = get_async_id(task)
-            if task_id is not None:
-                parent_id = ASYNC_PARENT.get(task_id)
-            with suppress(Exception):
-                task_name = task.get_name()
+    def _switch(self, task: asyncio.Task | None) -> ExecutionContext:
+        """Медленный путь: задача сменилась — берём (или создаём) её контекст."""
+        if task is None:
+            context = self._no_task
+        else:
+            context = self._by_task.get(task) or self._build(task)
+        self._swap_depths(task)
+        self._task = task
+        self._current = context
+        return context
+
+    def _build(self, task: asyncio.Task) -> ExecutionContext:
+        task_id = self.registry.get_async_id(task)
+        parent_id = self.registry.parent_id(task)
+        task_name = None
+        with suppress(Exception):
+            task_name = task.get_name()
 
-        return ExecutionContext(
-            thread_id=thread_id,
+        context = ExecutionContext(
+            thread_id=self.thread_id,
             task_id=task_id,
             task_parent_id=parent_id,
             task_name=task_name,
         )
+        with suppress(TypeError):
+            self._by_task[task] = context
+        return context
 
 
 class CallStackInspector:
@@ -104,21 +219,42 @@ class CallStackInspector:
     Инспектор не изменяет состояние трассировки и предоставляет
     только безопасные методы чтения текущего стека вызовов.
     Основной идентификатор вызова — ``call_event_id``.
+
+    Стек один на поток, а asyncio-таски потока перемежаются: вершина стека
+    может принадлежать другой таске. Поэтому «верхний» вызов — самый
+    глубокий открытый вызов текущей таски, а вершина стека — только если у
+    таски своих открытых вызовов нет.
     """
 
-    def __init__(self, state: SessionState) -> None:
+    def __init__(
+        self,
+        state: SessionState,
+        execution_context_provider: ExecutionContextProvider | None = None,
+    ) -> None:
         """
         Инициализирует инспектор стека вызовов.
         """
         self.state = state
+        self.execution_context_provider = execution_context_provider
 
     def top_call(self) -> ActiveCall | None:
         """
-        Возвращает верхний активный вызов из стека.
+        Возвращает верхний активный вызов текущей таски (см. описание класса).
         """
-        if not self.state.stack:
+        stack = self.state.stack
+        if not stack:
             return None
-        return self.state.stack[-1]
+        top = stack[-1]
+        provider = self.execution_context_provider
+        if provider is None:
+            return top
+        context = provider.get_current()
+        if top.context is context or not self.state.task_depth:
+            return top
+        for active_call in reversed(stack):
+            if active_call.context is context:
+                return active_call
+        return top
 
     def top_call_event_id(self) -> int | None:
         """
@@ -167,56 +303,98 @@ class CallTracker:
         default_show_result: bool,
         default_show_timing: bool,
         default_exc_tb_depth: int,
+        sampler: Sampler | None = None,
+        timestamps: bool = False,
+        clock: ClockKind = "wall",
     ):
         self.state = state
         self.stack_inspector = stack_inspector
         self.execution_context_provider = execution_context_provider
+        self.sampler = sampler
+        self.timestamps = timestamps
+        self.wall_clock = measures_wall(clock)
+        self.cpu_clock = cpu_clock(clock)
 
         self.default_show_args = default_show_args
         self.default_show_result = default_show_result
         self.default_show_timing = default_show_timing
         self.default_exc_tb_depth = default_exc_tb_depth
 
-    def on_call(self, func_name: str) -> None:
+    def on_call(self, func_name: str, code: CodeType | None = None) -> None:
         if not self.state.active:
             return
 
-        parent_id = self.state.stack[-1].call_event_id if self.state.stack else None
+        # до чтения глубин: провайдер подставляет состояние текущей таски
+        context = self.execution_context_provider.get_current()
+        if self.state.suppressed_depth:
+            # дерево вне выборки: только считаем глубину, событий не создаём
+            self.state.suppressed_depth += 1
+            if func_name in self.state.pending_meta:
+                self._resolve_meta(func_name)
+            return
+
+        parent_id = self.stack_inspector.top_call_event_id()
         meta = self._resolve_meta(func_name)
 
+        # корень — первый вызов таски (вне тасок — потока), даже если снаружи
+        # открыт вызов другой таски
+        if not self.state.task_depth and not self._sample_root(meta):
+            self.state.suppressed_depth = 1
+            return
+
         args_repr = meta.args_repr
         show_args = meta.show_args
         show_result = meta.show_result
         show_timing = meta.show_timing
         exc_tb_depth = meta.exc_tb_depth
 
-        start_time = perf_counter() if show_timing else 0.0
-        call_event_id = len(self.state.events)
-        context = self.execution_context_provider.get_current()
-
-        self.state.events.append(
-            CallEvent(
-                id=call_event_id,
-                kind="call",
-                func_name=func_name,
-                parent_id=parent_id,
-                args_repr=args_repr if show_args else None,
-                show_args=show_args,
-                show_result=show_result,
-                show_timing=show_timing,
-                context=context,
-            )
+        ts = perf_counter_ns() if self.timestamps else None
+        start_time = 0.0
+        cpu_start: int | None = None
+        if show_timing:
+            if self.wall_clock:
+                # одно чтение часов на метку и на замер длительности
+                start_time = ts / 1e9 if ts is not None else perf_counter()
+            if self.cpu_clock is not None:
+                cpu_start = self.cpu_clock()
+        call_event_id = next(self.state.ids)
+
+        call_ev = CallEvent(
+            id=call_event_id,
+            kind="call",
+            func_name=func_name,
+            parent_id=parent_id,
+            args_repr=args_repr if show_args else None,
+            show_args=show_args,
+            show_result=show_result,
+            show_timing=show_timing,
+            context=context,
+            ts=ts,
+            code=code,
         )
+        self.state.events.append(call_ev)
         self.state.stack.append(
             ActiveCall(
                 func_name=func_name,
                 start_time=start_time,
                 call_event_id=call_event_id,
+                event=call_ev,
+                cpu_start=cpu_start,
+                context=context,
             )
         )
+        self.state.task_depth += 1
         # Запоминаем глубину traceback именно для этого call_id
         self.state.exc_depth_by_call[call_event_id] = exc_tb_depth
 
+    def _sample_root(self, meta: PendingCallMeta) -> bool:
+        """Решение о записи корневого дерева: сначала декоратор, затем сэмплер сессии."""
+        if meta.sampled is not None:
+            return meta.sampled
+        if self.sampler is None:
+            return True
+        return self.sampler.decide()
+
     def _resolve_meta(self, func_name: str) -> PendingCallMeta:
         q = self.state.pending_meta.get(func_name)
         if q:
@@ -242,6 +420,11 @@ class CallTracker:
         if not self.state.active:
             return None
 
+        context = self.execution_context_provider.get_current()
+        if self.state.suppressed_depth:
+            self.state.suppressed_depth -= 1
+            return None
+
         active_call = self.stack_inspector.current_active_call()
         if active_call is None:
             return None
@@ -250,17 +433,21 @@ class CallTracker:
         func_name = active_call.func_name
         start_time = active_call.start_time
 
-        call_ev = self.state.events[call_event_id]
-        if isinstance(call_ev, CallEvent):
+        call_ev = active_call.event
+        if call_ev is not None:
             show_timing = call_ev.show_timing
             show_result = call_ev.show_result
         else:
             show_timing = False
             show_result = False
 
+        cpu_duration: float | None = None
+        if show_timing and active_call.cpu_start is not None and self.cpu_clock is not None:
+            cpu_duration = (self.cpu_clock() - active_call.cpu_start) / 1e9
+        ts = perf_counter_ns() if self.timestamps else None
         duration: float | None = None
         if show_timing and start_time > 0.0:
-            duration = perf_counter() - start_time
+            duration = (ts / 1e9 if ts is not None else perf_counter()) - start_time
 
         result_repr: str | None = None
         if not via_exception and show_result:
@@ -272,22 +459,34 @@ class CallTracker:
             except Exception:
                 result_repr = "<unrepr>"
 
-        context = self.execution_context_provider.get_current()
-
         self.state.events.append(
             CallEvent(
-                id=len(self.state.events),
+                id=next(self.state.ids),
                 kind="return",
                 func_name=func_name,
                 parent_id=call_event_id,
                 result_repr=result_repr,
                 duration=duration,
+                cpu_duration=cpu_duration,
                 via_exception=via_exception,
                 context=context,
+                ts=ts,
             )
         )
 
-        self.state.stack.pop()
+        stack = self.state.stack
+        if stack[-1] is active_call:
+            stack.pop()
+        else:
+            # вызов текущей таски лежит под вызовами других тасок
+            for i in range(len(stack) - 2, -1, -1):
+                if stack[i] is active_call:
+                    del stack[i]
+                    break
+        if self.state.task_depth:
+            self.state.task_depth -= 1
+        self.state.current_exc_by_call.pop(call_event_id, None)
+        self.state.exc_depth_by_call.pop(call_event_id, None)
         return call_event_id
 
     def on_return(self, result: Any = None) -> None:
@@ -304,11 +503,13 @@ class ExceptionTracker:
         stack_inspector: CallStackInspector,
         execution_context_provider: ExecutionContextProvider,
         call_tracker: CallTracker,
+        timestamps: bool = False,
     ):
         self.state = state
         self.stack_inspector = stack_inspector
         self.execution_context_provider = execution_context_provider
         self.call_tracker = call_tracker
+        self.timestamps = timestamps
 
     def _append_exception(
         self,
@@ -322,7 +523,7 @@ class ExceptionTracker:
         context = self.execution_context_provider.get_current()
 
         ev = ExceptionEvent(
-            id=len(self.state.events),
+            id=next(self.state.ids),
             func_name=func_name,
             parent_id=call_event_id,
             exc_type=exc_type,
@@ -331,6 +532,7 @@ class ExceptionTracker:
             via_exception=False,  # это просто “исключение произошло”, а не “return через exc”
             exc_tb=exc_tb,
             context=context,
+            ts=perf_counter_ns() if self.timestamps else None,
         )
 
         self.state.events.append(ev)
@@ -348,7 +550,8 @@ class ExceptionTracker:
         exc_tb: str | None = None,
     ) -> None:
         # при raised exception мы еще не знаем судьбу этого exception, поэтому его статус будет None.
-        if not self.state.active:
+        self.execution_context_provider.get_current()
+        if not self.state.active or self.state.suppressed_depth:
             return
 
         call_event_id = self.stack_inspector.current_call_event_id()
@@ -359,7 +562,8 @@ class ExceptionTracker:
 
     def on_exception_handled(self, func_name: str, exc_type: str, exc_msg: str) -> None:
         # если exception попадает в EXCEPTION_HANDLED, то except уже сработал - убираем из открытых
-        if not self.state.active:
+        self.execution_context_provider.get_current()
+        if not self.state.active or self.state.suppressed_depth:
             return
 
         call_event_id = self.stack_inspector.current_call_event_id()
@@ -368,38 +572,48 @@ class ExceptionTracker:
             return
 
         ev_id = self.state.current_exc_by_call.pop(call_event_id, None)
-        if ev_id is not None:
-            ev = self.state.events[ev_id]
-            if isinstance(ev, ExceptionEvent):
-                ev.caught = True
-            else:
-                self._append_exception(call_event_id, func_name, exc_type, exc_msg, caught=True)
-        else:
+        if ev_id is None or not self.state.events.set_caught(ev_id, True):
             self._append_exception(call_event_id, func_name, exc_type, exc_msg, caught=True)
 
     def on_unwind(self, func_name, exc_type, exc_msg):
         # сигнал о сворачивании кадра из-за exception, но не означает, что exception поймали.
         if not self.state.active:
             return
+        self.execution_context_provider.get_current()
+        if self.state.suppressed_depth:
+            self.close_frame()
+            return
 
         call_event_id = self.stack_inspector.current_call_event_id()
 
         if call_event_id is not None:
             ev_id = self.state.current_exc_by_call.get(call_event_id)
             if ev_id is not None:
-                ev = self.state.events[ev_id]
-                if isinstance(ev, ExceptionEvent) and ev.caught is not False:
-                    ev.caught = False
+                self.state.events.set_caught(ev_id, False)
             else:
                 self._append_exception(call_event_id, func_name, exc_type, exc_msg, caught=False)
 
+        self.close_frame()
+
+    def close_frame(self) -> None:
+        """
+        Закрывает текущий вызов как завершённый исключением, не записывая само исключение.
+
+        Используется и из :meth:`on_unwind`, и напрямую в профиле событий
+        ``"calls"``, где исключения не отслеживаются, но стек должен оставаться
+        согласованным.
+        """
+        if not self.state.active:
+            return
+
         closed_call_event_id = self.call_tracker.close_via_exception()
         if closed_call_event_id is not None:
             self._clear_exception_state(closed_call_event_id)
 
     def on_reraise(self, func_name, exc_type, exc_msg):
         # сигнал о том, что исключение не погашено данным кадром и улетает дальше.
-        if not self.state.active:
+        self.execution_context_provider.get_current()
+        if not self.state.active or self.state.suppressed_depth:
             return
 
         call_event_id = self.stack_inspector.current_call_event_id()
@@ -408,13 +622,7 @@ class ExceptionTracker:
             return
 
         ev_id = self.state.current_exc_by_call.get(call_event_id)
-        if ev_id is not None:
-            ev = self.state.events[ev_id]
-            if isinstance(ev, ExceptionEvent):
-                ev.caught = False
-            else:
-                self._append_exception(call_event_id, func_name, exc_type, exc_msg, caught=False)
-        else:
+        if ev_id is None or not self.state.events.set_caught(ev_id, False):
             self._append_exception(call_event_id, func_name, exc_type, exc_msg, caught=False)
 
     def _clear_exception_state(self, call_event_id: int) -> None:
@@ -427,9 +635,11 @@ class AsyncTracker:
         self,
         state: SessionState,
         execution_context_provider: ExecutionContextProvider,
+        timestamps: bool = False,
     ):
         self.state = state
         self.execution_context_provider = execution_context_provider
+        self.timestamps = timestamps
 
     def on_async(
         self,
@@ -440,33 +650,58 @@ class AsyncTracker:
         if not self.state.active:
             return
 
-        async_id: int | None = None
-        parent_async_id: int | None = None
-
-        if asyncio is not None:
-            try:
-                async_id = get_async_id()
-                if async_id is not None:
-                    parent_async_id = ASYNC_PARENT.get(async_id)
-            except Exception:
-                # если что-то странное с asyncio — просто не заполняем async_id
-                async_id = None
-                parent_async_id = None
-
+        # async_id текущей задачи уже есть в (кэшированном) контексте
         context = self.execution_context_provider.get_current()
+        if self.state.suppressed_depth:
+            return
 
         ev = AsyncTransitionEvent(
-            id=len(self.state.events),
+            id=next(self.state.ids),
             kind=kind,
             func_name=func_name,
-            async_id=async_id,
-            parent_async_id=parent_async_id,
+            async_id=context.task_id,
+            parent_async_id=context.task_parent_id,
             detail=detail,
             context=context,
+            ts=perf_counter_ns() if self.timestamps else None,
         )
         self.state.events.append(ev)
 
 
+@dataclass(slots=True, weakref_slot=True)
+class ThreadTrackers:
+    """Состояние и трекеры одного потока сессии."""
+
+    state: SessionState
+    execution_context_provider: ExecutionContextProvider
+    stack_inspector: CallStackInspector
+    call_tracker: CallTracker
+    exception_tracker: ExceptionTracker
+    async_tracker: AsyncTracker
+
+    def suppressed(self) -> bool:
+        """Идёт ли в текущей таске потока дерево вне выборки."""
+        self.execution_context_provider.get_current()
+        return bool(self.state.suppressed_depth)
+
+
+class _ThreadGuard:
+    """Объект в ``threading.local``: умирает вместе с потоком."""
+
+    __slots__ = ("__weakref__",)
+
+
+def _retire_thread(
+    session_ref: weakref.ref[TraceSession],
+    thread_id: int,
+    trackers_ref: weakref.ref[ThreadTrackers],
+) -> None:
+    session = session_ref()
+    trackers = trackers_ref()
+    if session is not None and trackers is not None:
+        session._retire(thread_id, trackers)
+
+
 class TraceSession:
     def __init__(
         self,
@@ -474,44 +709,233 @@ class TraceSession:
         default_show_result: bool = True,
         default_show_timing: bool = True,
         default_exc_tb_depth: int = 2,
+        disable_filtered: bool = True,
+        scope: Iterable[CodeType] | None = None,
+        event_profile: EventProfile = "full",
+        store: EventStore | None = None,
+        sampler: Sampler | None = None,
+        storage: StorageKind = "objects",
+        timestamps: bool = False,
+        clock: ClockKind = "wall",
+        sink: EventSink | None = None,
+        live_tasks: bool = False,
     ):
         self.default_show_args = default_show_args
         self.default_show_result = default_show_result
         self.default_show_timing = default_show_timing
         self.default_exc_tb_depth = default_exc_tb_depth
 
-        self.state = SessionState()
-        self.stack_inspector = CallStackInspector(self.state)
-        self.execution_context_provider = ExecutionContextProvider()
-        self.call_tracker = CallTracker(
-            state=self.state,
-            stack_inspector=self.stack_inspector,
+        self.sampler = sampler
+        self.storage = storage
+        self.timestamps = timestamps
+        self.clock = clock
+        # потоковая запись: события уходят в файл, сессия их не накапливает
+        self.sink = sink
+        # TaskTrace обновляются по мере записи событий (см. task_traces / parked_tasks)
+        self.live_tasks = live_tasks
+        self._live_stores: list[LiveTaskStore] = []
+        # async_id задач этой сессии; задачи в нём — по слабым ссылкам
+        self.task_registry = TaskRegistry()
+        # события и таски завершившихся потоков (см. _retire)
+        self._retired: list[Sequence[TraceEvent]] = []
+        self._retired_tasks: dict[int, TaskTrace] = {}
+        self._local = threading.local()
+        # потоки завершаются одновременно; горячего пути блокировка не касается
+        self._retire_lock = threading.Lock()
+
+        # состояние потока, запустившего сессию; остальные потоки получают
+        # своё при первом событии (см. for_thread)
+        self.state = SessionState(
+            events=self._thread_store(store if store is not None else self._new_store())
+        )
+        main = self._make_trackers(self.state)
+        self.execution_context_provider = main.execution_context_provider
+        self.stack_inspector = main.stack_inspector
+        self.call_tracker = main.call_tracker
+        self.exception_tracker = main.exception_tracker
+        self.async_tracker = main.async_tracker
+        self.threads: dict[int, ThreadTrackers] = {threading.get_ident(): main}
+        self._watch_thread(threading.get_ident(), main)
+
+        self.raw_dispatcher = RawEventDispatcher(
+            self.threads,
+            self.for_thread,
+            default_exc_tb_depth=self.default_exc_tb_depth,
+            disable_filtered=disable_filtered,
+            scope=scope,
+            event_profile=event_profile,
+        )
+
+    def _make_trackers(self, state: SessionState) -> ThreadTrackers:
+        """Трекеры для потока, в котором вызван метод (контекст привязан к нему)."""
+        context_provider = ExecutionContextProvider(self.task_registry, state)
+        stack_inspector = CallStackInspector(state, context_provider)
+        call_tracker = CallTracker(
+            state=state,
+            sampler=self.sampler,
+            stack_inspector=stack_inspector,
             default_show_timing=self.default_show_timing,
             default_exc_tb_depth=self.default_exc_tb_depth,
             default_show_result=self.default_show_result,
             default_show_args=self.default_show_args,
-            execution_context_provider=self.execution_context_provider,
+            execution_context_provider=context_provider,
+            timestamps=self.timestamps,
+            clock=self.clock,
         )
-        self.exception_tracker = ExceptionTracker(
-            state=self.state,
-            stack_inspector=self.stack_inspector,
-            execution_context_provider=self.execution_context_provider,
-            call_tracker=self.call_tracker,
+        exception_tracker = ExceptionTracker(
+            state=state,
+            stack_inspector=stack_inspector,
+            execution_context_provider=context_provider,
+            call_tracker=call_tracker,
+            timestamps=self.timestamps,
         )
-        self.async_tracker = AsyncTracker(
-            state=self.state, execution_context_provider=self.execution_context_provider
+        async_tracker = AsyncTracker(
+            state=state,
+            execution_context_provider=context_provider,
+            timestamps=self.timestamps,
         )
-        self.raw_dispatcher = RawEventDispatcher(
-            state=self.state,
-            stack_inspector=self.stack_inspector,
-            call_tracker=self.call_tracker,
-            exception_tracker=self.exception_tracker,
-            async_tracker=self.async_tracker,
-            default_exc_tb_depth=self.default_exc_tb_depth,
+        return ThreadTrackers(
+            state,
+            context_provider,
+            stack_inspector,
+            call_tracker,
+            exception_tracker,
+            async_tracker,
         )
 
-    @staticmethod
-    def _async_hooks_on():
+    def _watch_thread(self, thread_id: int, trackers: ThreadTrackers) -> None:
+        """
+        Снимает состояние текущего потока с учёта, когда поток завершится.
+
+        Финализатор висит на объекте в ``threading.local``: тот освобождается
+        при завершении потока, раньше, чем ОС может выдать его ident новому
+        потоку. Сессию и трекеры финализатор держит по слабым ссылкам.
+        """
+        guard = _ThreadGuard()
+        self._local.guard = guard
+        finalizer = weakref.finalize(
+            guard, _retire_thread, weakref.ref(self), thread_id, weakref.ref(trackers)
+        )
+        finalizer.atexit = False
+
+    def _retire(self, thread_id: int, trackers: ThreadTrackers) -> None:
+        """Поток завершился: его события и таски переходят в архив сессии."""
+        with self._retire_lock:
+            # ident уже мог достаться новому потоку — тогда запись не наша
+            if self.threads.get(thread_id) is not trackers:
+                return
+            del self.threads[thread_id]
+            events = trackers.state.events
+            if isinstance(events, LiveTaskStore):
+                with suppress(ValueError):
+                    self._live_stores.remove(events)
+                self._retire_tasks(events.builder.tasks)
+            self._retire_events(trackers)
+
+    def _retire_events(self, trackers: ThreadTrackers) -> None:
+        """Сохраняет события завершившегося потока до снимка."""
+        events = self._thread_snapshot(trackers.state)
+        if events:
+            self._retired.append(events)
+
+    def _retire_tasks(self, tasks: dict[int, TaskTrace]) -> None:
+        self._retired_tasks.update(tasks)
+
+    def _new_store(self) -> EventStore:
+        """Буфер событий для очередного потока."""
+        if self.sink is not None:
+            return SinkEventStore(self.sink)
+        return make_store(self.storage)
+
+    def _thread_store(self, store: EventStore) -> EventStore:
+        """В живом режиме оборачивает буфер потока, чтобы события сразу шли в TaskTrace."""
+        if not self.live_tasks:
+            return store
+        live = LiveTaskStore(store, window=self._live_window())
+        self._live_stores.append(live)
+        return live
+
+    def _live_window(self) -> int | None:
+        """
+        Сколько завершённых тасок держать живыми TaskTrace; ``None`` — все.
+
+        Сессия со стоком событий не накапливает, поэтому и TaskTrace не
+        должны расти с длиной записи.
+        """
+        return self.sink.capacity if self.sink is not None else None
+
+    def task_traces(self) -> dict[int, TaskTrace]:
+        """
+        Живые TaskTrace всех потоков (только при ``live_tasks=True``).
+
+        Объекты те же, что обновляет запись: они продолжают меняться, пока
+        сессия активна.
+        """
+        tasks = dict(self._retired_tasks)
+        for live in list(self._live_stores):
+            tasks.update(dict(live.builder.tasks))
+        return tasks
+
+    def parked_tasks(self) -> list[ParkedTask]:
+        """Таски, которые сейчас ждут в await, — самые долгие ожидания первыми."""
+        parked = [p for live in list(self._live_stores) for p in live.builder.parked()]
+        parked.sort(key=lambda p: p.waited if p.waited is not None else -1.0, reverse=True)
+        return parked
+
+    def for_thread(self) -> ThreadTrackers:
+        """Трекеры текущего потока; создаются при первом обращении из потока."""
+        thread_id = threading.get_ident()
+        trackers = self.threads.get(thread_id)
+        if trackers is None:
+            state = SessionState(
+                active=self.state.active,
+                events=self._thread_store(self._new_store()),
+                ids=self.state.ids,
+            )
+            trackers = self._make_trackers(state)
+            self.threads[thread_id] = trackers
+            self._watch_thread(thread_id, trackers)
+        return trackers
+
+    def push_meta_for_func(
+        self,
+        func_name: str,
+        *,
+        args_repr: str | None,
+        collect_args: bool,
+        collect_result: bool,
+        collect_timing: bool,
+        exc_tb_depth: int,
+        sampled: bool | None = None,
+    ) -> None:
+        """Кладёт метаданные декоратора в очередь для следующего вызова ``func_name``."""
+        self.for_thread().state.pending_meta[func_name].append(
+            PendingCallMeta(
+                args_repr=args_repr,
+                show_args=collect_args,
+                show_result=collect_result,
+                show_timing=collect_timing,
+                exc_tb_depth=exc_tb_depth,
+                sampled=sampled,
+            )
+        )
+
+    def at_root(self) -> bool:
+        """Станет ли следующий вызов корнем дерева (первый вызов таски или потока)."""
+        trackers = self.for_thread()
+        trackers.execution_context_provider.get_current()
+        state = trackers.state
+        return not state.task_depth and not state.suppressed_depth
+
+    def sampling_stats(self) -> SamplingStats | None:
+        """Статистика сэмплирования корней или ``None``, если сэмплирование выключено."""
+        return self.sampler.stats() if self.sampler is not None else None
+
+    def extend_scope(self, code: CodeType) -> None:
+        """В scoped-режиме добавляет code object к трассируемым; иначе ничего не делает."""
+        self.raw_dispatcher.extend_scope(code)
+
+    def _async_hooks_on(self):
         """Включаем слежение за asyncio.Tasks, если есть running loop."""
         if asyncio is None:
             return
@@ -523,7 +947,7 @@ class TraceSession:
             return
 
         with suppress(Exception):
-            install_task_factory(loop)
+            install_task_factory(loop, self.task_registry)
 
     @staticmethod
     def _async_hooks_off():
@@ -539,16 +963,62 @@ class TraceSession:
         with suppress(Exception):
             uninstall_task_factory(loop)
 
+    def _set_active(self, active: bool) -> None:
+        self.state.active = active
+        for trackers in list(self.threads.values()):
+            trackers.state.active = active
+
     def start(self) -> None:
         if self.state.active:
             return
-        self.state.active = True
+        if self.sink is not None:
+            self.sink.start()
+        self._set_active(True)
         self._async_hooks_on()
 
-    def stop(self) -> list[TraceEvent]:
+    @staticmethod
+    def _thread_snapshot(state: SessionState) -> Sequence[TraceEvent]:
+        """
+        События одного потока в порядке ``id``.
+
+        Если хранилище уже вытеснило CallEvent вызовов, которые всё ещё
+        открыты, они добавляются в начало: без них дерево вызовов
+        потеряло бы корни.
+        """
+        events = state.events.snapshot()
+        first_id = events[0].id if events else None
+        pinned = [
+            ac.event
+            for ac in state.stack
+            if ac.event is not None and (first_id is None or ac.call_event_id < first_id)
+        ]
+        return [*pinned, *events] if pinned else events
+
+    def snapshot(self) -> Sequence[TraceEvent]:
+        """
+        Текущие события сессии, не останавливая её.
+
+        Буферы потоков сливаются по ``id``: идентификаторы выдаёт общий
+        монотонный счётчик, поэтому порядок совпадает с порядком записи.
+        Если события записал один поток, возвращается снимок его хранилища
+        как есть (для колоночного хранилища — ленивое представление).
+        """
+        parts = [self._thread_snapshot(t.state) for t in list(self.threads.values())]
+        parts = [p for p in [*self._retired, *parts] if p]
+        if len(parts) <= 1:
+            return parts[0] if parts else []
+        return list(heapq.merge(*parts, key=attrgetter("id")))
+
+    def stop(self) -> Sequence[TraceEvent]:
         if not self.state.active:
-            return self.state.events
+            return self.snapshot()
 
-        self.state.active = False
+        self._set_active(False)
         self._async_hooks_off()
-        return self.state.events
+        # id в событиях уже записаны, сами задачи сессии больше не нужны
+        self.task_registry.clear()
+        for trackers in list(self.threads.values()):
+            trackers.execution_context_provider.reset()
+        if self.sink is not None:
+            self.sink.close()
+        return self.snapshot()
@@ -0,0 +1,300 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import deque
+from contextlib import suppress
+from itertools import count
+from operator import attrgetter
+from typing import IO, TYPE_CHECKING, Literal
+
+from flowtrace.exporters.jsonl import JsonlEncoder, iter_jsonl
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from flowtrace.events import TraceEvent
+
+# Что делать, когда очередь к писателю заполнена:
+# "block"       — поток-источник ждёт, пока писатель освободит место (ничего не теряется);
+# "drop-newest" — новое событие отбрасывается;
+# "drop-oldest" — из очереди вытесняется самое старое ещё не записанное событие.
+BackpressurePolicy = Literal["block", "drop-newest", "drop-oldest"]
+
+
+def load_events(source: str | os.PathLike[str] | Iterable[str]) -> list[TraceEvent]:
+    """
+    Читает события, записанные :class:`EventSink`, в порядке ``id``.
+
+    Формат тот же, что у :func:`~flowtrace.exporters.dump_jsonl`, так что
+    читает и его файлы. Поправки ``caught`` применяются к своим
+    ExceptionEvent; поправки к событиям, которые были отброшены при
+    переполнении, игнорируются.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8") as f:
+            return load_events(f)
+
+    # потоки пишут в очередь вперемешку: восстанавливаем порядок id
+    events = list(iter_jsonl(source))
+    events.sort(key=attrgetter("id"))
+    return events
+
+
+class EventSink:
+    """
+    Потоковая запись событий в файл фоновым потоком.
+
+    Потоки-источники кладут события в ограниченную очередь (``capacity``),
+    поток-писатель забирает их пачками до ``batch_size``, сериализует в JSON
+    Lines (формат :func:`~flowtrace.exporters.dump_jsonl`) и сбрасывает файл
+    после каждой пачки — при падении процесса теряется не больше одной пачки.
+    Поведение при заполненной очереди задаёт ``policy``; отброшенные события
+    считаются в :attr:`dropped`. Поправки ``caught`` политикой не
+    вытесняются и не отбрасываются: потерянная поправка оставила бы
+    исключение непойманным в файле. Они могут занять очередь сверх
+    ``capacity``, но не больше чем вдвое; не поместившиеся считаются в
+    :attr:`dropped_corrections`.
+
+    Если запись упала (ошибка ввода-вывода, несериализуемое значение), поток-
+    писатель останавливается, ошибка сохраняется в :attr:`error`, а дальнейшие
+    и ещё не записанные события отбрасываются со счётом — источники при
+    политике ``"block"`` не ждут мёртвого писателя. :meth:`close` поднимает
+    ``RuntimeError`` с этой ошибкой в качестве причины.
+
+    ``target`` — путь (файл открывается и закрывается стоком) или любой
+    объект с ``write`` / ``flush``. Читать записанное — :func:`load_events`.
+    """
+
+    def __init__(
+        self,
+        target: str | os.PathLike[str] | IO[str],
+        *,
+        capacity: int = 65_536,
+        batch_size: int = 1024,
+        policy: BackpressurePolicy = "block",
+        flush_interval: float = 0.1,
+    ) -> None:
+        if capacity <= 0 or batch_size <= 0:
+            raise ValueError("[FlowTrace] sink capacity and batch_size must be positive")
+        if policy not in ("block", "drop-newest", "drop-oldest"):
+            raise ValueError(f"[FlowTrace] unknown backpressure policy {policy!r}")
+
+        self.target = target
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.policy = policy
+        self.flush_interval = flush_interval
+
+        # append/popleft у deque атомарны под GIL: отдельная блокировка на событие не нужна
+        self._queue: deque[TraceEvent | tuple[str, int, bool]] = deque()
+        self._wake = threading.Event()
+        self._space = threading.Condition()
+        self._closed = False
+        # писатель упал: очередь больше никто не разберёт
+        self._failed = False
+        self.error: BaseException | None = None
+        self._thread: threading.Thread | None = None
+        self._file: IO[str] | None = None
+        self._owns_file = False
+        self._encoder = JsonlEncoder(corrections=True)
+        self._header_pending = False
+
+        self._drops = count(1)
+        # отброшенные и записанные события (поправки caught не считаются)
+        self.dropped = 0
+        self.written = 0
+        # поправки caught, не поместившиеся даже в запас сверх capacity
+        self.dropped_corrections = 0
+
+    # --- сторона источника ---
+
+    def put(self, item: TraceEvent | tuple[str, int, bool]) -> None:
+        if self._failed:
+            if not isinstance(item, tuple):
+                self._count_drop()
+            return
+        queue = self._queue
+        if isinstance(item, tuple):
+            self._put_correction(item)
+            return
+        if len(queue) >= self.capacity:
+            if self.policy == "drop-newest":
+                self._count_drop()
+                return
+            if self.policy == "drop-oldest":
+                self._evict_oldest()
+            elif not self._wait_for_space():
+                self._count_drop()
+                return
+        queue.append(item)
+        if len(queue) >= self.batch_size:
+            self._wake.set()
+
+    def put_caught(self, event_id: int, caught: bool) -> None:
+        self.put(("caught", event_id, caught))
+
+    def _put_correction(self, item: tuple[str, int, bool]) -> None:
+        # поправка не вытесняет события и не ждёт писателя: очередь может
+        # превысить capacity на число поправок, но не больше чем вдвое
+        queue = self._queue
+        if len(queue) >= 2 * self.capacity:
+            self.dropped_corrections += 1
+            return
+        queue.append(item)
+        if len(queue) >= self.batch_size:
+            self._wake.set()
+
+    def _evict_oldest(self) -> None:
+        """Вытесняет самое старое событие; поправки caught перед ним остаются в очереди."""
+        queue = self._queue
+        kept: list[TraceEvent | tuple[str, int, bool]] = []
+        while True:
+            try:
+                item = queue.popleft()
+            except IndexError:
+                break
+            if not isinstance(item, tuple):
+                self._count_drop()
+                break
+            kept.append(item)
+        # обратно в голову в прежнем порядке: их события уже ушли писателю
+        queue.extendleft(reversed(kept))
+
+    def _count_drop(self) -> None:
+        self.dropped = max(self.dropped, next(self._drops))
+
+    def _wait_for_space(self) -> bool:
+        # писатель сам ждать себя не может: его собственные события отбрасываются
+        if self._thread is None or threading.current_thread() is self._thread:
+            return False
+        with self._space:
+            while len(self._queue) >= self.capacity and not self._closed and not self._failed:
+                self._wake.set()
+                self._space.wait(self.flush_interval)
+        return not self._closed and not self._failed
+
+    # --- поток-писатель ---
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        if isinstance(self.target, (str, os.PathLike)):
+            self._file = open(self.target, "w", encoding="utf-8")  # noqa: SIM115
+            self._owns_file = True
+        else:
+            self._file = self.target
+        self._closed = False
+        # у каждого файла своя таблица контекстов; заголовок уходит с первой пачкой
+        self._encoder = JsonlEncoder(corrections=True)
+        self._header_pending = True
+        self._thread = threading.Thread(target=self._run, name="flowtrace-sink-writer", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                self._drain()
+            self._drain()
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error: BaseException) -> None:
+        """Писатель упал: запоминаем ошибку, отбрасываем очередь и будим источники."""
+        self.error = error
+        self._failed = True
+        queue = self._queue
+        while queue:
+            try:
+                item = queue.popleft()
+            except IndexError:
+                break
+            if not isinstance(item, tuple):
+                self._count_drop()
+        with self._space:
+            self._space.notify_all()
+
+    def _drain(self) -> None:
+        queue = self._queue
+        file = self._file
+        encoder = self._encoder
+        assert file is not None
+        while queue:
+            lines: list[str] = [encoder.header()] if self._header_pending else []
+            self._header_pending = False
+            events = 0
+            for _ in range(min(self.batch_size, len(queue))):
+                try:
+                    item = queue.popleft()
+                except IndexError:
+                    break
+                if isinstance(item, tuple):
+                    lines.append(encoder.caught(item[1], item[2]))
+                else:
+                    encoder.lines(item, lines)
+                    events += 1
+            with self._space:
+                self._space.notify_all()
+            if lines:
+                file.write("\n".join(lines) + "\n")
+                file.flush()
+                self.written += events
+
+    def close(self) -> None:
+        """Дописывает очередь, останавливает поток-писатель и закрывает файл, если открывал его."""
+        if self._thread is None:
+            return
+        self._closed = True
+        self._wake.set()
+        with self._space:
+            self._space.notify_all()
+        self._thread.join()
+        self._thread = None
+        if self._header_pending and self.error is None and self._file is not None:
+            # событий не было: файл всё равно должен читаться
+            with suppress(OSError):
+                self._file.write(self._encoder.header() + "\n")
+                self._file.flush()
+            self._header_pending = False
+        if self._owns_file and self._file is not None:
+            with suppress(OSError):
+                self._file.close()
+        self._file = None
+        self._owns_file = False
+        if self.error is not None:
+            raise RuntimeError(
+                f"[FlowTrace] sink writer failed, {self.dropped} events dropped"
+            ) from self.error
+
+
+class SinkEventStore:
+    """
+    EventStore, который ничего не хранит: события уходят в :class:`EventSink`.
+
+    Память сессии при этом пропорциональна глубине стека (открытые вызовы
+    держат свои CallEvent), а не длине трассы.
+    """
+
+    def __init__(self, sink: EventSink) -> None:
+        self.sink = sink
+        self.appended = 0
+
+    def append(self, event: TraceEvent) -> None:
+        self.sink.put(event)
+        self.appended += 1
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        return None
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        # событие уже в очереди или в файле: отправляем поправку
+        self.sink.put_caught(event_id, caught)
+        return True
+
+    def snapshot(self) -> list[TraceEvent]:
+        return []
+
+    def __len__(self) -> int:
+        return self.appended
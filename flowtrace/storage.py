@@ -0,0 +1,463 @@
+from __future__ import annotations
+
+import math
+from array import array
+from bisect import bisect_left
+from collections.abc import Sequence
+from time import monotonic
+from typing import TYPE_CHECKING, Literal, Protocol, overload
+
+from flowtrace.events import (
+    AsyncTransitionEvent,
+    CallEvent,
+    ExceptionEvent,
+    ExecutionContext,
+    TraceEvent,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from types import CodeType
+
+# Движок хранения событий сессии (см. config(storage=...)):
+# "objects"  — список dataclass-событий (ListEventStore);
+# "columnar" — типизированные колонки (ColumnarEventStore).
+StorageKind = Literal["objects", "columnar"]
+
+
+class EventStore(Protocol):
+    """
+    Хранилище событий сессии.
+
+    Идентификаторы событий выдаёт сессия; хранилище получает события в
+    порядке возрастания ``id``, но не обязано хранить их все.
+    """
+
+    def append(self, event: TraceEvent) -> None:
+        """Добавляет событие в конец."""
+        ...
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        """Событие по ``id`` или ``None``, если его нет (или оно вытеснено)."""
+        ...
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        """
+        Обновляет ``caught`` у ExceptionEvent.
+
+        :return: ``False``, если такого ExceptionEvent в хранилище нет.
+        """
+        ...
+
+    def snapshot(self) -> Sequence[TraceEvent]:
+        """Хранимые на данный момент события в порядке ``id`` (только для чтения)."""
+        ...
+
+    def __len__(self) -> int: ...
+
+
+def _set_caught(event: TraceEvent | None, caught: bool) -> bool:
+    if not isinstance(event, ExceptionEvent):
+        return False
+    event.caught = caught
+    return True
+
+
+class ListEventStore:
+    """Неограниченное хранилище: все события сессии в одном списке."""
+
+    def __init__(self) -> None:
+        self._events: list[TraceEvent] = []
+
+    def append(self, event: TraceEvent) -> None:
+        self._events.append(event)
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        events = self._events
+        # обычно id совпадает с индексом; иначе — бинарный поиск по возрастающим id
+        if 0 <= event_id < len(events) and events[event_id].id == event_id:
+            return events[event_id]
+        lo, hi = 0, len(events)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if events[mid].id < event_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(events) and events[lo].id == event_id:
+            return events[lo]
+        return None
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        return _set_caught(self.get(event_id), caught)
+
+    def snapshot(self) -> list[TraceEvent]:
+        return list(self._events)
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class RingEventStore:
+    """
+    Кольцевой буфер последних ``capacity`` событий.
+
+    Слоты выделяются заранее, поэтому память не растёт, сколько бы ни
+    работал процесс. При ``max_age`` (секунды) в снимок попадают только
+    события моложе этого окна; время фиксируется ``clock`` при добавлении.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        *,
+        max_age: float | None = None,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        if capacity <= 0:
+            raise ValueError("[FlowTrace] ring buffer capacity must be positive")
+        self.capacity = capacity
+        self.max_age = max_age
+        self._clock = clock
+        self._slots: list[TraceEvent | None] = [None] * capacity
+        self._stamps = array("d", bytes(8 * capacity)) if max_age is not None else None
+        # сколько событий добавлено за всё время; следующий слот — appended % capacity
+        self.appended = 0
+
+    @property
+    def evicted(self) -> int:
+        """Сколько событий вытеснено из буфера."""
+        return max(0, self.appended - self.capacity)
+
+    def append(self, event: TraceEvent) -> None:
+        slot = self.appended % self.capacity
+        self._slots[slot] = event
+        if self._stamps is not None:
+            self._stamps[slot] = self._clock()
+        self.appended += 1
+
+    def _slot_of(self, position: int) -> int:
+        """Слот для позиции в логическом порядке (0 — самое старое событие)."""
+        return (self.appended - len(self) + position) % self.capacity
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            ev = self._slots[self._slot_of(mid)]
+            if ev is not None and ev.id < event_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self):
+            ev = self._slots[self._slot_of(lo)]
+            if ev is not None and ev.id == event_id:
+                return ev
+        return None
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        return _set_caught(self.get(event_id), caught)
+
+    def snapshot(self) -> list[TraceEvent]:
+        size = len(self)
+        start = self.appended - size
+        if self._stamps is not None and self.max_age is not None:
+            cutoff = self._clock() - self.max_age
+            while start < self.appended and self._stamps[start % self.capacity] < cutoff:
+                start += 1
+        out: list[TraceEvent] = []
+        for i in range(start, self.appended):
+            ev = self._slots[i % self.capacity]
+            if ev is not None:
+                out.append(ev)
+        return out
+
+    def __len__(self) -> int:
+        return min(self.appended, self.capacity)
+
+
+# --- колоночное хранилище ---
+
+_KINDS = ("call", "return", "exception", "await", "resume", "yield")
+_KIND_CODES = {kind: code for code, kind in enumerate(_KINDS)}
+_EXCEPTION = _KIND_CODES["exception"]
+
+# биты колонки flags
+_SHOW_ARGS = 1
+_SHOW_RESULT = 2
+_SHOW_TIMING = 4
+_VIA_EXC_SET = 8  # via_exception не None
+_VIA_EXC = 16
+_CAUGHT_SET = 32  # caught не None
+_CAUGHT = 64
+
+
+def _tristate(value: bool | None, is_set: int, bit: int) -> int:
+    if value is None:
+        return 0
+    return is_set | bit if value else is_set
+
+
+class ColumnarEventStore:
+    """
+    Хранилище событий в параллельных типизированных колонках.
+
+    Вместо объекта на каждое событие — по элементу в ``array``: id, родитель,
+    длительность, тип события, флаги, индексы интернированных имени функции и
+    ExecutionContext. Необязательный текст (аргументы, результат, detail)
+    лежит в одной объектной колонке, редкие поля исключений и async-id — в
+    разреженном словаре. :meth:`snapshot` возвращает ленивое представление:
+    привычные ``TraceEvent`` создаются только при обращении к элементу,
+    поэтому форматтеры работают без изменений.
+    """
+
+    def __init__(self) -> None:
+        self._ids = array("q")
+        self._ts = array("q")  # perf_counter_ns; -1 — метки нет
+        self._parents = array("q")  # -1 — нет родителя
+        self._durations = array("d")  # NaN — нет длительности
+        self._cpu_durations = array("d")  # NaN — CPU-время не мерялось
+        self._kinds = array("b")
+        self._flags = array("B")
+        self._names = array("l")
+        self._contexts = array("l")  # -1 — нет контекста
+        # args_repr для call, result_repr для return, detail для async-событий
+        self._texts: list[str | None] = []
+        # позиция -> (exc_type, exc_msg, exc_tb) или (async_id, parent_async_id)
+        self._extra: dict[int, tuple] = {}
+
+        # имя и code object функции интернируются парой: у одноимённых функций
+        # разных модулей разные записи
+        self._name_table: list[str] = []
+        self._code_table: list[CodeType | None] = []
+        # (имя, id(code)): хэш code object считается по всему содержимому, id — даром;
+        # code живёт в _code_table, так что id не переиспользуется
+        self._name_index: dict[tuple[str, int], int] = {}
+        self._context_table: list[ExecutionContext] = []
+        self._context_index: dict[tuple, int] = {}
+
+    def _intern_name(self, name: str, code: CodeType | None) -> int:
+        key = (name, id(code))
+        idx = self._name_index.get(key)
+        if idx is None:
+            idx = self._name_index[key] = len(self._name_table)
+            self._name_table.append(name)
+            self._code_table.append(code)
+        return idx
+
+    def _intern_context(self, ctx: ExecutionContext | None) -> int:
+        if ctx is None:
+            return -1
+        key = (ctx.thread_id, ctx.task_id, ctx.task_parent_id, ctx.task_name)
+        idx = self._context_index.get(key)
+        if idx is None:
+            idx = self._context_index[key] = len(self._context_table)
+            self._context_table.append(ctx)
+        return idx
+
+    def append(self, event: TraceEvent) -> None:
+        pos = len(self._ids)
+        parent = -1
+        duration = cpu_duration = math.nan
+        text: str | None = None
+
+        if isinstance(event, CallEvent):
+            flags = (
+                (_SHOW_ARGS if event.show_args else 0)
+                | (_SHOW_RESULT if event.show_result else 0)
+                | (_SHOW_TIMING if event.show_timing else 0)
+                | _tristate(event.via_exception, _VIA_EXC_SET, _VIA_EXC)
+            )
+            if event.parent_id is not None:
+                parent = event.parent_id
+            if event.duration is not None:
+                duration = event.duration
+            if event.cpu_duration is not None:
+                cpu_duration = event.cpu_duration
+            text = event.args_repr if event.kind == "call" else event.result_repr
+        elif isinstance(event, ExceptionEvent):
+            flags = _tristate(event.caught, _CAUGHT_SET, _CAUGHT) | _tristate(
+                event.via_exception, _VIA_EXC_SET, _VIA_EXC
+            )
+            if event.parent_id is not None:
+                parent = event.parent_id
+            self._extra[pos] = (event.exc_type, event.exc_msg, event.exc_tb)
+        else:
+            flags = 0
+            text = event.detail
+            if event.async_id is not None or event.parent_async_id is not None:
+                self._extra[pos] = (event.async_id, event.parent_async_id)
+
+        self._ids.append(event.id)
+        self._ts.append(-1 if event.ts is None else event.ts)
+        self._parents.append(parent)
+        self._durations.append(duration)
+        self._cpu_durations.append(cpu_duration)
+        self._kinds.append(_KIND_CODES[event.kind])
+        self._flags.append(flags)
+        code = event.code if isinstance(event, CallEvent) else None
+        self._names.append(self._intern_name(event.func_name, code))
+        self._contexts.append(self._intern_context(event.context))
+        self._texts.append(text)
+
+    def _position(self, event_id: int) -> int | None:
+        pos = bisect_left(self._ids, event_id)
+        if pos < len(self._ids) and self._ids[pos] == event_id:
+            return pos
+        return None
+
+    def event_at(self, pos: int) -> TraceEvent:
+        """Собирает TraceEvent из колонок по позиции."""
+        kind = _KINDS[self._kinds[pos]]
+        flags = self._flags[pos]
+        parent: int | None = self._parents[pos]
+        if parent == -1:
+            parent = None
+        ctx_idx = self._contexts[pos]
+        context = self._context_table[ctx_idx] if ctx_idx >= 0 else None
+        name_idx = self._names[pos]
+        func_name = self._name_table[name_idx]
+        ts: int | None = self._ts[pos]
+        if ts == -1:
+            ts = None
+        via_exception = bool(flags & _VIA_EXC) if flags & _VIA_EXC_SET else None
+
+        if kind in ("call", "return"):
+            duration = self._durations[pos]
+            cpu_duration = self._cpu_durations[pos]
+            text = self._texts[pos]
+            return CallEvent(
+                id=self._ids[pos],
+                kind=kind,
+                func_name=func_name,
+                parent_id=parent,
+                args_repr=text if kind == "call" else None,
+                result_repr=text if kind == "return" else None,
+                duration=None if math.isnan(duration) else duration,
+                cpu_duration=None if math.isnan(cpu_duration) else cpu_duration,
+                via_exception=via_exception,
+                show_args=bool(flags & _SHOW_ARGS),
+                show_result=bool(flags & _SHOW_RESULT),
+                show_timing=bool(flags & _SHOW_TIMING),
+                context=context,
+                ts=ts,
+                code=self._code_table[name_idx],
+            )
+        if kind == "exception":
+            exc_type, exc_msg, exc_tb = self._extra[pos]
+            return ExceptionEvent(
+                id=self._ids[pos],
+                func_name=func_name,
+                parent_id=parent,
+                exc_type=exc_type,
+                exc_msg=exc_msg,
+                caught=bool(flags & _CAUGHT) if flags & _CAUGHT_SET else None,
+                via_exception=bool(via_exception),
+                exc_tb=exc_tb,
+                context=context,
+                ts=ts,
+            )
+        async_id, parent_async_id = self._extra.get(pos, (None, None))
+        return AsyncTransitionEvent(
+            id=self._ids[pos],
+            kind=kind,  # type: ignore[arg-type]
+            func_name=func_name,
+            async_id=async_id,
+            parent_async_id=parent_async_id,
+            detail=self._texts[pos],
+            context=context,
+            ts=ts,
+        )
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        pos = self._position(event_id)
+        return self.event_at(pos) if pos is not None else None
+
+    def set_caught(self, event_id: int, caught: bool) -> bool:
+        pos = self._position(event_id)
+        if pos is None or self._kinds[pos] != _EXCEPTION:
+            return False
+        flags = self._flags[pos] & ~(_CAUGHT_SET | _CAUGHT)
+        self._flags[pos] = flags | _tristate(caught, _CAUGHT_SET, _CAUGHT)
+        return True
+
+    def snapshot(self) -> ColumnarEventView:
+        return ColumnarEventView(self, 0, len(self._ids))
+
+    def nbytes(self) -> int:
+        """Приблизительный объём колонок в байтах (без строк и интернированных таблиц)."""
+        columns = (
+            self._ids,
+            self._ts,
+            self._parents,
+            self._durations,
+            self._cpu_durations,
+            self._kinds,
+            self._flags,
+            self._names,
+            self._contexts,
+        )
+        return sum(c.itemsize * len(c) for c in columns) + 8 * len(self._texts)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class PositionalEvents(Protocol):
+    """Источник событий с доступом по позиции: ColumnarEventStore, TraceFile."""
+
+    def event_at(self, pos: int) -> TraceEvent: ...
+
+
+class ColumnarEventView(Sequence[TraceEvent]):
+    """
+    Ленивое представление диапазона событий (ColumnarEventStore, бинарного файла
+    трассы) как последовательности TraceEvent.
+
+    Каждое обращение создаёт новый объект события; изменения самих событий в
+    хранилище не записываются (кроме ``caught``, который хранилище обновляет само).
+    """
+
+    def __init__(self, store: PositionalEvents, start: int, stop: int) -> None:
+        self._store = store
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> TraceEvent: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[TraceEvent]: ...
+
+    def __getitem__(self, index: int | slice) -> TraceEvent | Sequence[TraceEvent]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return ColumnarEventView(self._store, self._start + start, self._start + stop)
+            return [self[i] for i in range(start, stop, step)]
+        n = len(self)
+        if index < 0:
+            index += n
+        if not 0 <= index < n:
+            raise IndexError("event index out of range")
+        return self._store.event_at(self._start + index)
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        event_at = self._store.event_at
+        for pos in range(self._start, self._stop):
+            yield event_at(pos)
+
+    def __repr__(self) -> str:
+        return f"<ColumnarEventView of {len(self)} events>"
+
+
+def make_store(kind: StorageKind = "objects") -> EventStore:
+    """Новое неограниченное хранилище заданного типа."""
+    if kind == "columnar":
+        return ColumnarEventStore()
+    if kind == "objects":
+        return ListEventStore()
+    raise ValueError(f"[FlowTrace] Unknown storage kind: {kind!r}")
@@ -0,0 +1,422 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from bisect import bisect_left
+from collections.abc import Sequence
+from typing import TYPE_CHECKING, overload
+
+from flowtrace.events import (
+    AsyncTransitionEvent,
+    CallEvent,
+    ExceptionEvent,
+    ExecutionContext,
+    TraceEvent,
+)
+from flowtrace.storage import (
+    _CAUGHT,
+    _CAUGHT_SET,
+    _KIND_CODES,
+    _KINDS,
+    _SHOW_ARGS,
+    _SHOW_RESULT,
+    _SHOW_TIMING,
+    _VIA_EXC,
+    _VIA_EXC_SET,
+    ColumnarEventView,
+    _tristate,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+    from types import TracebackType
+
+# Бинарный формат трассы (все числа little-endian):
+#
+#   заголовок  HEADER
+#   записи     RECORD × count — фиксированной ширины, в порядке возрастания id
+#   payload    строки переменной длины (u32 длина + UTF-8): args/result/detail,
+#              exc_msg, exc_tb; записи ссылаются на них смещением от начала секции
+#   строки     u32 количество, затем (u32 длина + UTF-8): имена функций, типы исключений
+#   контексты  u32 количество, затем CONTEXT × количество
+#
+# Отсутствующие значения: -1 для целых, NaN для длительностей, _NONE для индексов.
+MAGIC = b"FLOWTRC\x00"
+FORMAT_VERSION = 1
+
+# magic, version, record_size, reserved, count, payload_offset, strings_offset, contexts_offset
+HEADER = struct.Struct("<8sHHIQQQQ")
+# id, parent_id, ts, duration, cpu_duration, text, a, b, name, context, kind, flags
+#   exception: a — индекс exc_type в таблице строк, b — смещение exc_tb в payload
+#   async:     a — async_id, b — parent_async_id
+RECORD = struct.Struct("<qqqddqqqIIBBxx")
+# thread_id, task_id, task_parent_id, task_name (индекс в таблице строк)
+CONTEXT = struct.Struct("<QqqI")
+_U32 = struct.Struct("<I")
+_ID = struct.Struct("<q")
+_NONE = 0xFFFFFFFF
+
+
+def _opt(value: int | None) -> int:
+    return -1 if value is None else value
+
+
+def _nan(value: float | None) -> float:
+    return math.nan if value is None else value
+
+
+def write_trace(events: Iterable[TraceEvent], path: str | os.PathLike[str]) -> int:
+    """
+    Записывает события в бинарный файл трассы и возвращает их количество.
+
+    События читаются потоком: в памяти держатся только таблицы имён и
+    контекстов, строки payload копятся во временном файле. ``id`` событий
+    должны возрастать (так их отдают ``stop_tracing()`` и ``get_trace_data()``).
+    """
+    strings: dict[str, int] = {}
+    contexts: dict[ExecutionContext, int] = {}
+
+    def intern(s: str) -> int:
+        idx = strings.get(s)
+        if idx is None:
+            idx = strings[s] = len(strings)
+        return idx
+
+    with open(path, "wb") as f, tempfile.TemporaryFile() as payload:
+        payload_size = 0
+
+        def text(s: str | None) -> int:
+            nonlocal payload_size
+            if s is None:
+                return -1
+            data = s.encode("utf-8", "surrogatepass")
+            offset = payload_size
+            payload.write(_U32.pack(len(data)))
+            payload.write(data)
+            payload_size += _U32.size + len(data)
+            return offset
+
+        f.write(bytes(HEADER.size))
+        pack = RECORD.pack
+        count = 0
+        last_id: int | None = None
+        for ev in events:
+            if last_id is not None and ev.id <= last_id:
+                raise ValueError("[FlowTrace] events must be ordered by increasing id")
+            last_id = ev.id
+
+            ctx = ev.context
+            if ctx is None:
+                ctx_idx = _NONE
+            else:
+                ctx_idx = contexts.get(ctx, -1)
+                if ctx_idx == -1:
+                    ctx_idx = contexts[ctx] = len(contexts)
+
+            if isinstance(ev, CallEvent):
+                flags = (
+                    (_SHOW_ARGS if ev.show_args else 0)
+                    | (_SHOW_RESULT if ev.show_result else 0)
+                    | (_SHOW_TIMING if ev.show_timing else 0)
+                    | _tristate(ev.via_exception, _VIA_EXC_SET, _VIA_EXC)
+                )
+                body = ev.args_repr if ev.kind == "call" else ev.result_repr
+                rec = pack(
+                    ev.id,
+                    _opt(ev.parent_id),
+                    _opt(ev.ts),
+                    _nan(ev.duration),
+                    _nan(ev.cpu_duration),
+                    text(body),
+                    -1,
+                    -1,
+                    intern(ev.func_name),
+                    ctx_idx,
+                    _KIND_CODES[ev.kind],
+                    flags,
+                )
+            elif isinstance(ev, ExceptionEvent):
+                flags = _tristate(ev.caught, _CAUGHT_SET, _CAUGHT) | _tristate(
+                    ev.via_exception, _VIA_EXC_SET, _VIA_EXC
+                )
+                rec = pack(
+                    ev.id,
+                    _opt(ev.parent_id),
+                    _opt(ev.ts),
+                    math.nan,
+                    math.nan,
+                    text(ev.exc_msg),
+                    -1 if ev.exc_type is None else intern(ev.exc_type),
+                    text(ev.exc_tb),
+                    intern(ev.func_name),
+                    ctx_idx,
+                    _KIND_CODES["exception"],
+                    flags,
+                )
+            else:
+                rec = pack(
+                    ev.id,
+                    -1,
+                    _opt(ev.ts),
+                    math.nan,
+                    math.nan,
+                    text(ev.detail),
+                    _opt(ev.async_id),
+                    _opt(ev.parent_async_id),
+                    intern(ev.func_name),
+                    ctx_idx,
+                    _KIND_CODES[ev.kind],
+                    0,
+                )
+            f.write(rec)
+            count += 1
+
+        payload_offset = f.tell()
+        payload.seek(0)
+        shutil.copyfileobj(payload, f)
+
+        # имена задач попадают в таблицу строк до того, как она записана
+        context_recs = [
+            CONTEXT.pack(
+                ctx.thread_id,
+                _opt(ctx.task_id),
+                _opt(ctx.task_parent_id),
+                _NONE if ctx.task_name is None else intern(ctx.task_name),
+            )
+            for ctx in contexts
+        ]
+
+        strings_offset = f.tell()
+        f.write(_U32.pack(len(strings)))
+        for s in strings:
+            data = s.encode("utf-8", "surrogatepass")
+            f.write(_U32.pack(len(data)))
+            f.write(data)
+
+        contexts_offset = f.tell()
+        f.write(_U32.pack(len(context_recs)))
+        f.writelines(context_recs)
+
+        f.seek(0)
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                FORMAT_VERSION,
+                RECORD.size,
+                0,
+                count,
+                payload_offset,
+                strings_offset,
+                contexts_offset,
+            )
+        )
+    return count
+
+
+class TraceFile(Sequence[TraceEvent]):
+    """
+    Бинарный файл трассы, отображённый в память (``mmap``), как последовательность событий.
+
+    Таблицы имён и контекстов читаются при открытии, записи событий — только
+    при обращении: каждый элемент собирается в новый ``TraceEvent`` из своей
+    записи. Поэтому ``print_tree``, ``build_task_traces`` и экспортёры
+    работают прямо по файлу, не загружая его целиком. :meth:`get` находит
+    событие по ``id`` бинарным поиском.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            # mmap пустого файла падает с собственной ошибкой: размер проверяем заранее
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError(
+                    f"[FlowTrace] {path!s} is not a FlowTrace binary trace (empty or truncated)"
+                )
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._count: int
+        self._payload: int
+        (
+            magic,
+            version,
+            record_size,
+            _reserved,
+            self._count,
+            self._payload,
+            strings_offset,
+            contexts_offset,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"[FlowTrace] {path!s} is not a FlowTrace binary trace")
+        if version != FORMAT_VERSION or record_size != RECORD.size:
+            self._mm.close()
+            raise ValueError(f"[FlowTrace] unsupported trace format version {version}")
+
+        # секции идут подряд и целиком лежат в файле; иначе файл обрезан
+        size = len(self._mm)
+        try:
+            if not (
+                HEADER.size + self._count * RECORD.size
+                <= self._payload
+                <= strings_offset
+                <= contexts_offset
+                <= size - _U32.size
+            ):
+                raise ValueError
+            self._strings = self._read_strings(strings_offset)
+            self._contexts = self._read_contexts(contexts_offset)
+        except (ValueError, struct.error, IndexError) as e:
+            self._mm.close()
+            raise ValueError(f"[FlowTrace] {path!s} is a truncated or corrupted trace") from e
+
+    def _read_strings(self, offset: int) -> list[str]:
+        mm = self._mm
+        (n,) = _U32.unpack_from(mm, offset)
+        offset += _U32.size
+        out = []
+        for _ in range(n):
+            (size,) = _U32.unpack_from(mm, offset)
+            offset += _U32.size
+            out.append(mm[offset : offset + size].decode("utf-8", "surrogatepass"))
+            offset += size
+        return out
+
+    def _read_contexts(self, offset: int) -> list[ExecutionContext]:
+        (n,) = _U32.unpack_from(self._mm, offset)
+        out = []
+        for i in range(n):
+            thread_id, task_id, task_parent_id, task_name = CONTEXT.unpack_from(
+                self._mm, offset + _U32.size + i * CONTEXT.size
+            )
+            out.append(
+                ExecutionContext(
+                    thread_id=thread_id,
+                    task_id=None if task_id == -1 else task_id,
+                    task_parent_id=None if task_parent_id == -1 else task_parent_id,
+                    task_name=None if task_name == _NONE else self._strings[task_name],
+                )
+            )
+        return out
+
+    def _text(self, offset: int) -> str | None:
+        if offset == -1:
+            return None
+        start = self._payload + offset
+        (size,) = _U32.unpack_from(self._mm, start)
+        start += _U32.size
+        return self._mm[start : start + size].decode("utf-8", "surrogatepass")
+
+    def event_at(self, pos: int) -> TraceEvent:
+        """Собирает TraceEvent из записи с номером ``pos``."""
+        (
+            event_id,
+            parent,
+            ts,
+            duration,
+            cpu_duration,
+            text,
+            a,
+            b,
+            name,
+            ctx_idx,
+            kind_code,
+            flags,
+        ) = RECORD.unpack_from(self._mm, HEADER.size + pos * RECORD.size)
+        kind = _KINDS[kind_code]
+        context = self._contexts[ctx_idx] if ctx_idx != _NONE else None
+        via_exception = bool(flags & _VIA_EXC) if flags & _VIA_EXC_SET else None
+
+        if kind in ("call", "return"):
+            body = self._text(text)
+            return CallEvent(
+                id=event_id,
+                kind=kind,
+                func_name=self._strings[name],
+                parent_id=None if parent == -1 else parent,
+                args_repr=body if kind == "call" else None,
+                result_repr=body if kind == "return" else None,
+                duration=None if math.isnan(duration) else duration,
+                cpu_duration=None if math.isnan(cpu_duration) else cpu_duration,
+                via_exception=via_exception,
+                show_args=bool(flags & _SHOW_ARGS),
+                show_result=bool(flags & _SHOW_RESULT),
+                show_timing=bool(flags & _SHOW_TIMING),
+                context=context,
+                ts=None if ts == -1 else ts,
+            )
+        if kind == "exception":
+            return ExceptionEvent(
+                id=event_id,
+                func_name=self._strings[name],
+                parent_id=None if parent == -1 else parent,
+                exc_type=None if a == -1 else self._strings[a],
+                exc_msg=self._text(text),
+                caught=bool(flags & _CAUGHT) if flags & _CAUGHT_SET else None,
+                via_exception=bool(via_exception),
+                exc_tb=self._text(b),
+                context=context,
+                ts=None if ts == -1 else ts,
+            )
+        return AsyncTransitionEvent(
+            id=event_id,
+            kind=kind,  # type: ignore[arg-type]
+            func_name=self._strings[name],
+            async_id=None if a == -1 else a,
+            parent_async_id=None if b == -1 else b,
+            detail=self._text(text),
+            context=context,
+            ts=None if ts == -1 else ts,
+        )
+
+    def _id_at(self, pos: int) -> int:
+        return _ID.unpack_from(self._mm, HEADER.size + pos * RECORD.size)[0]
+
+    def get(self, event_id: int) -> TraceEvent | None:
+        """Событие по ``id`` или ``None``."""
+        pos = bisect_left(range(self._count), event_id, key=self._id_at)
+        if pos < self._count and self._id_at(pos) == event_id:
+            return self.event_at(pos)
+        return None
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> TraceEvent: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[TraceEvent]: ...
+
+    def __getitem__(self, index: int | slice) -> TraceEvent | Sequence[TraceEvent]:
+        if isinstance(index, slice):
+            return ColumnarEventView(self, 0, self._count)[index]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("event index out of range")
+        return self.event_at(index)
+
+    def __iter__(self) -> Iterator[TraceEvent]:
+        for pos in range(self._count):
+            yield self.event_at(pos)
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> TraceFile:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<TraceFile {self.path!s}: {self._count} events>"
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from types import CodeType
+
+
+def callable_codes(obj) -> list[CodeType]:
+    """
+    Code objects, которые реально исполнятся при вызове ``obj``.
+
+    Разворачивает bound-методы, ``functools.partial``, цепочку ``__wrapped__``
+    (декораторы, в том числе ``@trace``) и классы (их ``__init__``).
+    Для встроенных функций и прочих C-объектов возвращает пустой список.
+    """
+    if isinstance(obj, CodeType):
+        return [obj]
+
+    codes: list[CodeType] = []
+    seen: set[int] = set()
+    while obj is not None and id(obj) not in seen:
+        seen.add(id(obj))
+
+        if isinstance(obj, type):
+            obj = obj.__dict__.get("__init__")
+            continue
+
+        func = getattr(obj, "__func__", obj)
+        code = getattr(func, "__code__", None)
+        if isinstance(code, CodeType):
+            codes.append(code)
+
+        inner = getattr(func, "__wrapped__", None)
+        if inner is None:
+            inner = getattr(func, "func", None)  # functools.partial
+        obj = inner
+
+    return codes
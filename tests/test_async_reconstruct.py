@@ -0,0 +1,79 @@
+from flowtrace.async_reconstruct import TaskTraceBuilder, build_task_traces
+from flowtrace.events import AsyncTransitionEvent, CallEvent, ExecutionContext
+
+MAIN = ExecutionContext(thread_id=1, task_id=1, task_name="main")
+WORKER = ExecutionContext(thread_id=1, task_id=2, task_parent_id=1, task_name="worker")
+LATE = ExecutionContext(thread_id=1, task_id=3, task_parent_id=1, task_name="late")
+
+
+def call(id_, name, ctx, parent=None):
+    return CallEvent(id=id_, kind="call", func_name=name, parent_id=parent, context=ctx)
+
+
+def ret(id_, name, ctx, parent):
+    return CallEvent(id=id_, kind="return", func_name=name, parent_id=parent, context=ctx)
+
+
+def transition(id_, kind, name, ctx, ts, detail=None):
+    return AsyncTransitionEvent(
+        id=id_, kind=kind, func_name=name, context=ctx, detail=detail, ts=ts
+    )
+
+
+def trace():
+    """main ждёт worker; worker ждёт дважды; late появляется после resume main."""
+    return [
+        call(0, "main", MAIN),
+        transition(1, "await", "main", MAIN, 1_000_000, detail="<Task pending>"),
+        call(2, "handler", WORKER, parent=0),  # родитель из другой таски: корень worker
+        call(3, "fetch", WORKER, parent=2),
+        transition(4, "await", "fetch", WORKER, 2_000_000, detail="sock.recv"),
+        transition(5, "await", "handler", WORKER, 2_100_000),  # та же серия await
+        transition(6, "resume", "fetch", WORKER, 5_000_000),
+        ret(7, "fetch", WORKER, 3),
+        transition(8, "yield", "handler", WORKER, 5_500_000),
+        transition(9, "await", "handler", WORKER, 6_000_000),  # без resume
+        transition(10, "resume", "main", MAIN, 9_000_000),
+        call(11, "late", LATE),
+        ret(12, "main", MAIN, 0),
+    ]
+
+
+def test_calls_segments_and_child_windows():
+    tasks = build_task_traces(trace())
+    main, worker, late = tasks[1], tasks[2], tasks[3]
+
+    assert worker.roots == [2]
+    assert worker.call_children == {2: [3]}
+    assert worker.first_event_index == 2
+    assert worker.event_ids == [2, 3, 4, 5, 6, 7, 8, 9]
+
+    first, second = worker.await_segments
+    # серия await до resume — один сегмент; ждали в fetch — вершине стека worker
+    assert (first.call_id, first.await_event_id, first.resume_event_id) == (3, 4, 6)
+    assert first.detail == "sock.recv"
+    assert first.duration == 0.003
+    # после return fetch вершина стека — handler; сегмент не закрыт
+    assert (second.call_id, second.resume_event_id, second.duration) == (2, None, None)
+
+    (window,) = main.await_segments
+    assert window.detail is None  # "<Task pending>" ничего не говорит
+    # worker начался внутри окна ожидания main, late — уже после resume
+    assert window.children_task_ids == [2]
+    assert late.roots == [11]
+
+
+def test_builder_is_incremental():
+    events = trace()
+    builder = TaskTraceBuilder()
+    builder.extend(events[:5])
+
+    worker = builder.tasks[2]
+    assert builder.active_call(2) == 3
+    assert worker.await_segments[0].resume_event_id is None
+    assert builder.tasks[1].await_segments[0].children_task_ids == [2]
+
+    builder.extend(events[5:])
+    assert builder.active_call(2) == 2
+    assert builder.active_call(1) == -1
+    assert builder.tasks == build_task_traces(events)
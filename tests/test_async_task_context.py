@@ -31,3 +31,85 @@ async def test_task_context():
     # Родительская таска создаёт дочернюю
     ids = {ev.context.task_id for ev in events if ev.context.task_id is not None}
     assert len(ids) >= 2
+
+
+def plain(x):
+    return x
+
+
+async def worker(n):
+    for i in range(n):
+        plain(i)
+        await asyncio.sleep(0)
+
+
+def test_contexts_are_interned_per_task_and_thread():
+    async def main():
+        await asyncio.gather(worker(3), worker(3))
+
+    with active_tracing():
+        plain(0)
+        plain(1)
+        asyncio.run(main())
+
+    events = get_trace_data()
+    sync_ctx = {id(e.context) for e in events if e.context.task_id is None}
+    assert len(sync_ctx) == 1
+
+    by_task = {}
+    for e in events:
+        if e.context.task_id is not None:
+            by_task.setdefault(e.context.task_id, set()).add(id(e.context))
+    # по одному объекту на задачу: main и два воркера
+    assert len(by_task) == 3
+    assert all(len(objs) == 1 for objs in by_task.values())
+
+
+def test_task_switch_inside_library_code_is_detected():
+    # wait_for/gather — библиотечный код: смена задачи происходит без событий PY_RESUME
+    # в пользовательском коде, но контекст plain() всё равно должен быть свой у каждой задачи
+    async def via_library(n):
+        await asyncio.sleep(0)
+        return plain(n)
+
+    async def main():
+        return await asyncio.gather(*(asyncio.wait_for(via_library(i), 1) for i in range(3)))
+
+    with active_tracing():
+        asyncio.run(main())
+
+    plain_tasks = [
+        e.context.task_id for e in get_trace_data() if e.func_name == "plain" and e.kind == "call"
+    ]
+    assert len(plain_tasks) == 3
+    assert len(set(plain_tasks)) == 3
+
+
+async def step(i):
+    await asyncio.sleep(0)
+    return plain(i)
+
+
+async def interleaved(n):
+    # все step стоят в await одновременно и возвращаются в порядке FIFO,
+    # а не в обратном порядке входа
+    return await asyncio.gather(*(step(i) for i in range(n)))
+
+
+def test_returns_pair_with_calls_of_the_same_task():
+    with active_tracing(default_show_timing=False):
+        asyncio.run(interleaved(5))
+
+    events = get_trace_data()
+    calls = {e.id: e for e in events if e.kind == "call"}
+    returns = [e for e in events if e.kind == "return"]
+    assert len(returns) == len(calls)
+    for ret in returns:
+        call = calls[ret.parent_id]
+        assert call.func_name == ret.func_name
+        assert call.context is ret.context
+    # вызовы внутри таски вложены в вызовы той же таски
+    for call in calls.values():
+        if call.func_name == "plain":
+            assert calls[call.parent_id].func_name == "step"
+            assert calls[call.parent_id].context is call.context
@@ -0,0 +1,77 @@
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data, print_tree
+from flowtrace.formatters import print_summary
+
+
+def waits():
+    time.sleep(0.02)
+
+
+def computes():
+    total = 0
+    deadline = time.perf_counter() + 0.02
+    while time.perf_counter() < deadline:
+        total += 1
+    return total > 0
+
+
+def work():
+    waits()
+    computes()
+
+
+def returns(data):
+    return {e.func_name: e for e in data if e.kind == "return"}
+
+
+def test_dual_clock_separates_waiting_from_computing():
+    with active_tracing(clock="dual", default_show_timing=True):
+        work()
+
+    ret = returns(get_trace_data())
+    waited, computed = ret["waits"], ret["computes"]
+    assert waited.duration >= 0.015 and computed.duration >= 0.015
+    # sleep почти не тратит CPU, цикл тратит его всё время
+    assert waited.cpu_duration < waited.duration / 2
+    assert computed.cpu_duration > waited.cpu_duration
+
+
+@pytest.mark.parametrize("clock", ["thread", "process"])
+def test_cpu_clock_fills_only_cpu_duration(clock):
+    with active_tracing(clock=clock, default_show_timing=True):
+        work()
+
+    for ev in returns(get_trace_data()).values():
+        assert ev.duration is None
+        assert ev.cpu_duration is not None and ev.cpu_duration >= 0
+
+
+def test_wall_clock_is_default():
+    with active_tracing(default_show_timing=True):
+        work()
+
+    ev = returns(get_trace_data())["waits"]
+    assert ev.duration is not None and ev.cpu_duration is None
+
+
+def test_formatters_show_both_durations():
+    with active_tracing(clock="dual", default_show_timing=True):
+        work()
+
+    out = StringIO()
+    with redirect_stdout(out):
+        print_tree(inline_return=False)
+        print_summary()
+    text = out.getvalue()
+    assert "s, cpu " in text
+    assert "← computes()" in text
+
+
+def test_unknown_clock_is_rejected():
+    with pytest.raises(ValueError), active_tracing(clock="sundial"):
+        pass
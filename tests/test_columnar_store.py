@@ -0,0 +1,108 @@
+import asyncio
+from contextlib import redirect_stdout, suppress
+from io import StringIO
+
+from flowtrace import active_tracing, config, get_trace_data, print_tree
+from flowtrace.events import AsyncTransitionEvent, CallEvent, ExceptionEvent
+from flowtrace.storage import ColumnarEventStore, ColumnarEventView
+
+
+def leaf(x):
+    return x * 2
+
+
+def fail():
+    raise KeyError("missing")
+
+
+def branch(n):
+    with suppress(KeyError):
+        fail()
+    return [leaf(i) for i in range(n)]
+
+
+async def tick():
+    await asyncio.sleep(0)
+    return 1
+
+
+async def main():
+    return sum(await asyncio.gather(tick(), tick()))
+
+
+def workload():
+    branch(3)
+    asyncio.run(main())
+
+
+def capture(storage):
+    config(timestamps=True)
+    try:
+        with active_tracing(storage=storage, default_show_timing=False):
+            workload()
+    finally:
+        config(timestamps=False)
+    return get_trace_data()
+
+
+def test_columnar_events_match_object_events():
+    objects = capture("objects")
+    columnar = capture("columnar")
+
+    assert isinstance(columnar, ColumnarEventView)
+    assert len(columnar) == len(objects)
+    # id задач и метки времени зависят от прогона, остальное должно совпасть полностью
+    for a, b in zip(objects, columnar, strict=True):
+        assert type(a) is type(b)
+        assert a.ts is not None and b.ts is not None
+        a.ts = b.ts = None
+        assert a.context.thread_id == b.context.thread_id
+        assert (a.context.task_id is None) == (b.context.task_id is None)
+        a.context = b.context = None
+        if isinstance(a, AsyncTransitionEvent):
+            assert (a.async_id is None) == (b.async_id is None)
+            a.async_id = a.parent_async_id = b.async_id = b.parent_async_id = None
+        assert a == b
+
+
+def test_caught_state_is_updated_in_columns():
+    events = capture("columnar")
+    excs = [e for e in events if isinstance(e, ExceptionEvent) and e.func_name == "fail"]
+    assert excs and excs[0].caught is False
+    assert any(e.caught is True for e in events if isinstance(e, ExceptionEvent))
+
+
+def test_formatters_produce_identical_output():
+    outputs = []
+    for storage in ("objects", "columnar"):
+        with active_tracing(storage=storage, default_show_timing=False):
+            branch(4)
+        buf = StringIO()
+        with redirect_stdout(buf):
+            print_tree(get_trace_data())
+        outputs.append(buf.getvalue())
+    assert outputs[0] == outputs[1]
+
+
+def test_view_is_a_lazy_sequence():
+    store = ColumnarEventStore()
+    for i in range(5):
+        store.append(CallEvent(id=i * 2, kind="call", func_name=f"f{i % 2}", parent_id=None))
+    view = store.snapshot()
+
+    assert len(view) == 5
+    assert view[-1].id == 8
+    assert [e.id for e in view[1:3]] == [2, 4]
+    assert [e.id for e in reversed(view)] == [8, 6, 4, 2, 0]
+    assert store.get(4).func_name == "f0"
+    assert store.get(5) is None
+    assert store.set_caught(4, True) is False
+    # имена интернированы: две уникальные строки на пять событий
+    assert len(store._name_table) == 2
+
+
+def test_timestamps_round_trip_through_columns():
+    store = ColumnarEventStore()
+    store.append(CallEvent(id=0, kind="call", func_name="f", ts=123))
+    store.append(CallEvent(id=1, kind="return", func_name="f", parent_id=0))
+    assert [e.ts for e in store.snapshot()] == [123, None]
@@ -0,0 +1,67 @@
+import sys
+from contextlib import suppress
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.core import TOOL_ID
+from flowtrace.events import AsyncTransitionEvent, CallEvent, ExceptionEvent
+
+
+def rows(n):
+    yield from range(n)
+
+
+def etl():
+    return sum(r * 2 for r in rows(5))
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def guarded():
+    with suppress(ValueError):
+        fail()
+    return "ok"
+
+
+def test_calls_profile_subscribes_to_call_events_only():
+    events = sys.monitoring.events
+    with active_tracing(event_profile="calls"):
+        mask = sys.monitoring.get_events(TOOL_ID)
+        etl()
+
+    assert mask == events.PY_START | events.PY_RETURN | events.PY_UNWIND
+    assert not any(isinstance(e, AsyncTransitionEvent) for e in get_trace_data())
+
+
+def test_calls_profile_keeps_stack_consistent_on_exceptions():
+    with active_tracing(event_profile="calls"):
+        guarded()
+
+    data = get_trace_data()
+    assert not any(isinstance(e, ExceptionEvent) for e in data)
+
+    fail_ret = next(
+        e for e in data if isinstance(e, CallEvent) and e.func_name == "fail" and e.kind == "return"
+    )
+    guarded_ret = data[-1]
+    assert fail_ret.via_exception is True
+    assert guarded_ret.kind == "return" and guarded_ret.func_name == "guarded"
+    assert guarded_ret.result_repr == "'ok'"
+
+
+def test_exceptions_profile_records_exceptions_without_async_events():
+    with active_tracing(event_profile="exceptions"):
+        guarded()
+        etl()
+
+    data = get_trace_data()
+    assert any(isinstance(e, ExceptionEvent) and e.func_name == "fail" for e in data)
+    assert not any(isinstance(e, AsyncTransitionEvent) for e in data)
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="event profile"):
+        active_tracing(event_profile="everything").__enter__()
@@ -0,0 +1,123 @@
+import io
+from pathlib import Path
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.events import CallEvent
+from flowtrace.exporters import dump_callgrind
+
+TWIN_FILE = Path(__file__).with_name("twin_module.py")
+
+
+def leaf(n):
+    return sum(range(n))
+
+
+def root():
+    return leaf(100) + leaf(200)
+
+
+def synthetic(cpu=False):
+    """f(10) → f(6) → g(1); CPU — половина wall."""
+
+    def ret(id_, name, parent, d):
+        return CallEvent(
+            id=id_,
+            kind="return",
+            func_name=name,
+            parent_id=parent,
+            duration=d,
+            cpu_duration=d / 2 if cpu else None,
+        )
+
+    return [
+        CallEvent(id=0, kind="call", func_name="f"),
+        CallEvent(id=1, kind="call", func_name="f", parent_id=0),
+        CallEvent(id=2, kind="call", func_name="g", parent_id=1),
+        ret(3, "g", 2, 1e-6),
+        ret(4, "f", 1, 6e-6),
+        ret(5, "f", 0, 10e-6),
+    ]
+
+
+def dump(events, **kwargs):
+    out = io.StringIO()
+    n = dump_callgrind(events, out, **kwargs)
+    return n, out.getvalue()
+
+
+def test_self_and_inclusive_costs():
+    locations = {"f": ("app.py", 10), "g": ("lib.py", 3)}
+    n, text = dump(synthetic(), locations=locations)
+    assert n == 2
+    assert "events: WallNs Calls\n" in text
+    assert "CpuNs" not in text
+    assert "summary: 10000 3\n" in text
+    assert text.endswith("totals: 10000 3\n")
+
+    blocks = text.split("\n\n")[1:]
+    # f: собственное 4000 + 5000 нс, два вызова; рёбра f → f и f → g с полной стоимостью
+    assert blocks[0].splitlines() == [
+        "fl=(1) app.py",
+        "fn=(1) f",
+        "10 9000 2",
+        "cfi=(2) lib.py",
+        "cfn=(2) g",
+        "calls=1 3",
+        "10 1000 1",
+        "cfn=(1)",
+        "calls=1 10",
+        "10 6000 2",
+    ]
+    assert blocks[1].splitlines() == ["fl=(2)", "fn=(2)", "3 1000 1"]
+
+
+def test_cpu_cost_column_when_cpu_clock_recorded():
+    _, text = dump(synthetic(cpu=True), locations={})
+    assert "events: WallNs Calls CpuNs\n" in text
+    assert "summary: 10000 3 5000\n" in text
+    # без исходника — "???" и строка 0
+    assert "fl=(1) ???\nfn=(1) f\n0 9000 2 4500\n" in text
+    assert "cfn=(2) g\ncalls=1 0\n0 1000 1 500\n" in text
+
+
+def test_unfinished_caller_keeps_its_edges():
+    events = synthetic()[:4]  # f и внутренний f не вернулись
+    _, text = dump(iter(events), locations={})
+    assert "fn=(1) f\n0 0 0\ncfn=(2) g\ncalls=1 0\n0 1000 1\n" in text
+    assert "fn=(2)\n0 1000 1\n" in text
+
+
+def test_source_locations_from_session():
+    with active_tracing(default_show_timing=True):
+        root()
+    _, text = dump(get_trace_data(), command="pytest")
+
+    assert "cmd: pytest\n" in text
+    assert f"fl=(1) {__file__}\nfn=(1) root\n{root.__code__.co_firstlineno} " in text
+    assert f"calls=2 {leaf.__code__.co_firstlineno}\n" in text
+
+
+def helper():
+    return 1
+
+
+_twin_ns: dict = {}
+exec(compile("\n\n\ndef helper():\n    return 2\n", str(TWIN_FILE), "exec"), _twin_ns)
+twin_helper = _twin_ns["helper"]
+
+
+def both_helpers():
+    return helper() + twin_helper()
+
+
+def test_same_name_functions_from_different_modules_stay_apart():
+    with active_tracing(default_show_timing=True):
+        both_helpers()
+    _, text = dump(get_trace_data())
+
+    line = helper.__code__.co_firstlineno
+    # два блока с одним именем, у каждого свой файл и строка
+    assert f"\nfl=(1)\nfn=(2)\n{line} " in text
+    assert "\nfl=(2)\nfn=(2)\n4 " in text
+    assert f"cfn=(2) helper\ncalls=1 {line}\n" in text
+    assert f"cfi=(2) {TWIN_FILE}\ncfn=(2)\ncalls=1 4\n" in text
@@ -0,0 +1,142 @@
+import asyncio
+import io
+import json
+import threading
+from contextlib import suppress
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.events import CallEvent
+from flowtrace.exporters import dump_chrome_trace
+
+
+def leaf(x):
+    return x * 2
+
+
+def fail():
+    raise KeyError("missing")
+
+
+def branch(n):
+    with suppress(KeyError):
+        fail()
+    return [leaf(i) for i in range(n)]
+
+
+async def tick(n):
+    await asyncio.sleep(0.001)
+    return leaf(n)
+
+
+async def main():
+    return sum(await asyncio.gather(tick(1), tick(2)))
+
+
+def export(events):
+    buf = io.StringIO()
+    written = dump_chrome_trace(iter(events), buf)
+    doc = json.loads(buf.getvalue())
+    assert len(doc["traceEvents"]) == written
+    return doc["traceEvents"]
+
+
+def test_calls_become_complete_events_on_thread_tracks():
+    with active_tracing(clock="dual"):
+        branch(3)
+        worker = threading.Thread(target=branch, args=(2,))
+        worker.start()
+        worker.join()
+    events = list(get_trace_data())
+    trace = export(events)
+
+    calls = [e for e in events if isinstance(e, CallEvent) and e.kind == "call"]
+    slices = [e for e in trace if e["ph"] == "X" and e.get("cat") == "call"]
+    assert sorted(s["name"] for s in slices) == sorted(c.func_name for c in calls)
+    assert all(s["dur"] >= 0 and "tdur" in s for s in slices)
+
+    # два потока — два трека с именами
+    names = {e["tid"]: e["args"]["name"] for e in trace if e["ph"] == "M"}
+    assert len({s["tid"] for s in slices}) == 2
+    assert all(names[s["tid"]].startswith("Thread ") for s in slices)
+
+    # дочерний вызов лежит внутри родительского
+    branch_slice = next(s for s in slices if s["name"] == "branch")
+    leaf_slice = next(s for s in slices if s["name"] == "leaf" and s["tid"] == branch_slice["tid"])
+    assert branch_slice["ts"] <= leaf_slice["ts"]
+    assert leaf_slice["ts"] + leaf_slice["dur"] <= branch_slice["ts"] + branch_slice["dur"]
+
+
+def test_exceptions_become_instant_events():
+    with active_tracing():
+        branch(1)
+    trace = export(get_trace_data())
+    instants = [e for e in trace if e["ph"] == "i"]
+    assert instants and all(e["name"] == "KeyError" for e in instants)
+    assert {e["args"]["func"] for e in instants} >= {"fail"}
+
+
+def nesting(trace, task_id):
+    """Отрезки async-трека таски в порядке закрытия; проверяет вложенность b/e."""
+    stack, closed = [], []
+    mine = [e for e in trace if e["ph"] in "be" and e["id"] == task_id]
+    for e in sorted(mine, key=lambda e: e["ts"]):
+        if e["ph"] == "b":
+            stack.append(e)
+        else:
+            opened = stack.pop()
+            assert opened["name"] == e["name"] and opened["ts"] <= e["ts"]
+            closed.append((opened["name"], len(stack)))
+    assert not stack
+    return closed
+
+
+def test_tasks_are_async_tracks_on_their_thread():
+    with active_tracing():
+        asyncio.run(main())
+    trace = export(get_trace_data())
+
+    # таски не выдаются за потоки: один поток — один именованный трек
+    threads = {e["tid"] for e in trace if e["ph"] == "M"}
+    assert len(threads) == 1
+    assert {e["tid"] for e in trace if "tid" in e} == threads
+
+    task_events = [e for e in trace if e["ph"] in "be"]
+    assert task_events and all(e["cat"] == "task" for e in task_events)
+    task_ids = {e["id"] for e in task_events}
+    assert len(task_ids) >= 3  # main + два tick
+
+    ticks = [e for e in task_events if e["ph"] == "b" and e["name"] == "tick"]
+    assert len({e["id"] for e in ticks}) == 2
+    for task_id in {e["id"] for e in ticks}:
+        closed = nesting(trace, task_id)
+        # await внутри tick, tick внутри отрезка жизни таски, он — внешний
+        assert ("await", 2) in closed and ("tick", 1) in closed
+        assert closed[-1][1] == 0
+        assert closed[-1][0] not in ("tick", "await")
+
+
+def test_unfinished_task_calls_close_inside_the_task():
+    with active_tracing():
+        asyncio.run(main())
+    events = list(get_trace_data())
+    # обрезаем трассу посреди tick: внутренние вызовы закрываются раньше внешних
+    cut = next(i for i, e in enumerate(events) if e.func_name == "leaf")
+    trace = export(events[: cut + 1])
+    task_id = next(e["id"] for e in trace if e["ph"] == "b" and e["name"] == "leaf")
+    closed = nesting(trace, task_id)
+    assert closed[-3:-1] == [("leaf", 2), ("tick", 1)]
+    assert closed[-1][1] == 0
+    unfinished = [e for e in trace if e["ph"] == "e" and e.get("args") == {"unfinished": True}]
+    assert {e["name"] for e in unfinished} >= {"leaf", "tick"}
+
+
+def test_unfinished_calls_and_missing_timestamps():
+    events = [
+        CallEvent(id=0, kind="call", func_name="outer"),
+        CallEvent(id=1, kind="call", func_name="inner", parent_id=0),
+        CallEvent(id=2, kind="return", func_name="inner", parent_id=1),
+    ]
+    trace = export(events)
+    by_name = {e["name"]: e for e in trace if e["ph"] == "X"}
+    assert by_name["inner"]["ts"] == 1.0 and by_name["inner"]["dur"] == 1.0
+    assert by_name["outer"]["args"] == {"unfinished": True}
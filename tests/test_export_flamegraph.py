@@ -0,0 +1,111 @@
+import io
+import json
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.events import CallEvent
+from flowtrace.exporters import build_call_tree, dump_folded, dump_speedscope
+
+
+def synthetic():
+    """a(10) → [b(4) → c(1)], a → b(3); затем корень f(5) → f(2) (рекурсия)."""
+    spec = [
+        ("call", "a"),
+        ("call", "b"),
+        ("call", "c"),
+        ("return", 1),
+        ("return", 4),
+        ("call", "b"),
+        ("return", 3),
+        ("return", 10),
+        ("call", "f"),
+        ("call", "f"),
+        ("return", 2),
+        ("return", 5),
+    ]
+    events, stack = [], []
+    for i, (kind, value) in enumerate(spec):
+        if kind == "call":
+            parent = stack[-1].id if stack else None
+            ev = CallEvent(id=i, kind="call", func_name=value, parent_id=parent)
+            stack.append(ev)
+        else:
+            call = stack.pop()
+            ev = CallEvent(
+                id=i,
+                kind="return",
+                func_name=call.func_name,
+                parent_id=call.id,
+                duration=value * 1e-6,
+            )
+        events.append(ev)
+    return events
+
+
+def folded(events, weight):
+    buf = io.StringIO()
+    dump_folded(events, buf, weight=weight)
+    return dict(line.rsplit(" ", 1) for line in buf.getvalue().splitlines())
+
+
+def test_call_tree_merges_identical_paths():
+    root = build_call_tree(synthetic())
+    a = root.children["a"]
+    assert (a.calls, a.total_ns, a.self_ns) == (1, 10_000, 3_000)
+    b = a.children["b"]
+    assert (b.calls, b.total_ns, b.self_ns) == (2, 7_000, 6_000)
+    f = root.children["f"]
+    assert (f.total_ns, f.self_ns, f.children["f"].total_ns) == (5_000, 3_000, 2_000)
+
+
+def test_folded_self_and_inclusive_weights():
+    assert folded(synthetic(), "self") == {
+        "a": "3000",
+        "a;b": "6000",
+        "a;b;c": "1000",
+        "f": "3000",
+        "f;f": "2000",
+    }
+    inclusive = folded(synthetic(), "inclusive")
+    assert inclusive["a"] == "10000" and inclusive["a;b"] == "7000" and inclusive["f;f"] == "2000"
+
+
+def test_speedscope_evented_profile():
+    buf = io.StringIO()
+    dump_speedscope(synthetic(), buf, name="demo")
+    doc = json.loads(buf.getvalue())
+
+    frames = [f["name"] for f in doc["shared"]["frames"]]
+    assert sorted(frames) == ["a", "b", "c", "f"]
+    profile = doc["profiles"][0]
+    assert profile["type"] == "evented" and profile["unit"] == "nanoseconds"
+    assert profile["endValue"] == 15_000
+
+    # открытия и закрытия сбалансированы и не идут назад во времени
+    depth, last_at = [], 0
+    for ev in profile["events"]:
+        assert ev["at"] >= last_at
+        last_at = ev["at"]
+        if ev["type"] == "O":
+            depth.append(ev["frame"])
+        else:
+            assert depth.pop() == ev["frame"]
+    assert depth == []
+
+
+def leaf(x):
+    return x + 1
+
+
+def work():
+    return [leaf(i) for i in range(5)]
+
+
+def test_folded_from_real_trace_accounts_for_all_time():
+    with active_tracing(default_show_timing=True):
+        work()
+    events = get_trace_data()
+    self_total = sum(int(v) for v in folded(events, "self").values())
+    root = build_call_tree(events)
+    roots_total = sum(c.total_ns for c in root.children.values())
+    assert self_total == roots_total > 0
+    assert "work;leaf" in folded(events, "inclusive")
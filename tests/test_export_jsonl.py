@@ -0,0 +1,108 @@
+import asyncio
+import io
+import json
+import tracemalloc
+from contextlib import suppress
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.events import ExceptionEvent
+from flowtrace.exporters import dump_jsonl, iter_jsonl
+from flowtrace.tracefile import TraceFile, write_trace
+
+
+def leaf(x):
+    return x * 2
+
+
+def fail():
+    raise KeyError("ключ\n«x»")
+
+
+def branch(n):
+    with suppress(KeyError):
+        fail()
+    return [leaf(i) for i in range(n)]
+
+
+async def tick(n):
+    await asyncio.sleep(0)
+    return leaf(n)
+
+
+async def main():
+    return sum(await asyncio.gather(tick(1), tick(2)))
+
+
+def capture():
+    with active_tracing(default_show_args=True, default_show_timing=True, clock="dual"):
+        branch(3)
+        asyncio.run(main())
+    return list(get_trace_data())
+
+
+def test_round_trip_is_lossless():
+    events = capture()
+    buf = io.StringIO()
+    assert dump_jsonl(events, buf) == len(events)
+
+    restored = list(iter_jsonl(io.StringIO(buf.getvalue())))
+    assert restored == events
+    assert any(isinstance(e, ExceptionEvent) and "«x»" in e.exc_msg for e in restored)
+    # одинаковые контексты после чтения — один объект
+    assert len({id(e.context) for e in restored}) == len({e.context for e in events})
+
+
+def test_contexts_are_written_once():
+    events = capture()
+    buf = io.StringIO()
+    dump_jsonl(iter(events), buf)
+
+    records = [json.loads(line) for line in buf.getvalue().splitlines()[1:]]
+    ctx_defs = [r for r in records if r["type"] == "context"]
+    assert len(ctx_defs) == len({e.context for e in events})
+    assert all(isinstance(r["context"], int) for r in records if r["type"] != "context")
+
+
+def test_reader_is_lazy():
+    events = capture()
+    buf = io.StringIO()
+    dump_jsonl(events, buf)
+    lines = iter(buf.getvalue().splitlines())
+
+    it = iter_jsonl(lines)
+    assert next(it) == events[0]
+    # прочитано ровно столько строк, сколько нужно для первого события
+    assert sum(1 for _ in lines) == len(buf.getvalue().splitlines()) - 3
+
+
+def test_exports_binary_trace_file(tmp_path):
+    events = capture()
+    write_trace(events, tmp_path / "t.ftb")
+    buf = io.StringIO()
+    with TraceFile(tmp_path / "t.ftb") as tf:
+        dump_jsonl(tf, buf)
+    assert list(iter_jsonl(io.StringIO(buf.getvalue()))) == events
+
+
+def test_rejects_foreign_input():
+    with pytest.raises(ValueError):
+        list(iter_jsonl(io.StringIO('{"type": "CallEvent"}\n')))
+
+
+def test_reader_does_not_keep_exception_events():
+    n = 20_000
+    buf = io.StringIO()
+    dump_jsonl((ExceptionEvent(id=i, exc_type="KeyError", exc_msg="x") for i in range(n)), buf)
+    lines = buf.getvalue().splitlines()
+
+    tracemalloc.start()
+    try:
+        read = sum(1 for _ in iter_jsonl(lines))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert read == n
+    # без поправок caught ExceptionEvent не запоминаются: 20000 событий заняли бы мегабайты
+    assert peak < 200_000
@@ -0,0 +1,119 @@
+import cProfile
+import io
+import pstats
+from pathlib import Path
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.events import CallEvent
+from flowtrace.exporters import build_pstats, dump_pstats, to_pstats
+
+TWIN_FILE = Path(__file__).with_name("twin_module.py")
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+def is_even(n):
+    return True if n == 0 else is_odd(n - 1)
+
+
+def is_odd(n):
+    return False if n == 0 else is_even(n - 1)
+
+
+def workload():
+    fib(6)
+    is_even(5)
+
+
+def counts(stats):
+    names = {"fib", "is_even", "is_odd", "workload"}
+    return {
+        key[2]: (cc, nc, {c[2]: e[:2] for c, e in callers.items() if c[2] in names})
+        for key, (cc, nc, _tt, _ct, callers) in stats.items()
+        if key[2] in names
+    }
+
+
+def test_call_counts_and_callers_match_cprofile():
+    profiler = cProfile.Profile()
+    profiler.runcall(workload)
+    profiler.create_stats()
+
+    with active_tracing(default_show_timing=True):
+        workload()
+    ours = build_pstats(get_trace_data())
+
+    assert counts(ours) == counts(profiler.stats)
+    # ключи (файл, строка, имя) совпадают с cProfile — можно сравнивать бок о бок
+    fib_key = next(k for k in ours if k[2] == "fib")
+    assert fib_key in profiler.stats
+
+
+def synthetic():
+    """f(10) → f(6) → g(1)."""
+    return [
+        CallEvent(id=0, kind="call", func_name="f"),
+        CallEvent(id=1, kind="call", func_name="f", parent_id=0),
+        CallEvent(id=2, kind="call", func_name="g", parent_id=1),
+        CallEvent(id=3, kind="return", func_name="g", parent_id=2, duration=1.0),
+        CallEvent(id=4, kind="return", func_name="f", parent_id=1, duration=6.0),
+        CallEvent(id=5, kind="return", func_name="f", parent_id=0, duration=10.0),
+    ]
+
+
+def test_self_and_cumulative_time_with_recursion():
+    stats = build_pstats(synthetic(), locations={})
+    f, g = ("~", 0, "f"), ("~", 0, "g")
+
+    cc, nc, tt, ct, callers = stats[f]
+    assert (cc, nc) == (1, 2)
+    assert tt == pytest.approx(4.0 + 5.0)
+    assert ct == pytest.approx(10.0)  # рекурсивный кадр не удваивает время
+    assert callers == {f: (1, 1, 5.0, 6.0)}
+
+    assert stats[g] == (1, 1, 1.0, 1.0, {f: (1, 1, 1.0, 1.0)})
+
+
+def test_pstats_file_and_stats_object(tmp_path):
+    path = tmp_path / "trace.prof"
+    dump_pstats(synthetic(), path, locations={})
+    loaded = pstats.Stats(str(path))
+    assert loaded.total_calls == 3
+    assert loaded.prim_calls == 2
+
+    out = io.StringIO()
+    stats = to_pstats(synthetic(), locations={})
+    stats.stream = out
+    stats.sort_stats("cumulative").print_stats()
+    assert "3 function calls (2 primitive calls)" in out.getvalue()
+
+
+def helper():
+    return 1
+
+
+# одноимённая функция «другого модуля»: тот же qualname, свой файл и строка
+_twin_ns: dict = {}
+exec(compile("\n\n\ndef helper():\n    return 2\n", str(TWIN_FILE), "exec"), _twin_ns)
+twin_helper = _twin_ns["helper"]
+
+
+def both_helpers():
+    return helper() + twin_helper() + twin_helper()
+
+
+@pytest.mark.parametrize("storage", ["objects", "columnar"])
+def test_same_name_functions_from_different_modules_stay_apart(storage):
+    with active_tracing(storage=storage, default_show_timing=True):
+        both_helpers()
+    stats = build_pstats(get_trace_data())
+
+    helpers = {key: stat[:2] for key, stat in stats.items() if key[2] == "helper"}
+    assert helpers == {
+        (__file__, helper.__code__.co_firstlineno, "helper"): (1, 1),
+        (str(TWIN_FILE), 4, "helper"): (2, 2),
+    }
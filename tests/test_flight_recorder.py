@@ -0,0 +1,123 @@
+import io
+import sys
+import threading
+
+import flowtrace
+from flowtrace.events import ExceptionEvent
+from flowtrace.storage import RingEventStore
+
+
+def tick(i):
+    return i
+
+
+def long_running(n, out):
+    for i in range(n):
+        tick(i)
+    # вызов ещё открыт, а его CallEvent давно вытеснен из буфера
+    return flowtrace.dump_trace(out)
+
+
+def test_ring_buffer_keeps_memory_constant():
+    flowtrace.start_flight_recorder(max_events=50, dump_on_exit=False)
+    for i in range(5_000):
+        tick(i)
+    sess = sys.monitoring.flowtrace_session
+    assert len(sess.ring) == 50
+    assert sess.ring.evicted > 0
+    events = flowtrace.stop_tracing()
+
+    assert len(events) == 50
+    assert len(sess.state.exc_depth_by_call) == 0
+
+
+def test_open_calls_survive_eviction_in_print_tree():
+    out = io.StringIO()
+    flowtrace.start_flight_recorder(max_events=20, dump_on_exit=False, default_show_args=False)
+    events = long_running(100, out)
+    flowtrace.stop_tracing()
+
+    assert events[0].func_name == "long_running"
+    text = out.getvalue()
+    lines = text.splitlines()
+    assert lines[0].startswith("[flowtrace] flight recorder (on demand)")
+    assert lines[1] == "→ long_running()"
+    assert "  → tick()\n  ← tick() [" in text
+
+
+def test_dump_on_unhandled_exception(monkeypatch):
+    out = io.StringIO()
+    seen = []
+    monkeypatch.setattr(sys, "excepthook", lambda *a: seen.append(a[0]))
+
+    flowtrace.start_flight_recorder(max_events=10, file=out, dump_on_exit=False)
+    tick(1)
+    sys.excepthook(ValueError, ValueError("boom"), None)
+    flowtrace.stop_tracing()
+
+    assert "unhandled ValueError" in out.getvalue()
+    # прежний хук вызван и восстановлен после остановки
+    assert seen == [ValueError]
+    assert sys.excepthook.__name__ == "<lambda>"
+
+
+class _StdoutGuard(io.StringIO):
+    """Файл дампа, который проверяет, что sys.stdout процесса не подменён."""
+
+    def write(self, s):
+        assert sys.stdout is not self
+        return super().write(s)
+
+
+def test_dump_does_not_swap_process_stdout():
+    out = _StdoutGuard()
+    flowtrace.start_flight_recorder(max_events=10, dump_on_exit=False, dump_on_crash=False)
+    try:
+        tick(1)
+        sys.monitoring.flowtrace_session.dump(file=out)
+    finally:
+        flowtrace.stop_tracing()
+    assert "→ tick()" in out.getvalue()
+
+
+def test_ring_store_time_window_and_lookup():
+    now = [0.0]
+    store = RingEventStore(4, max_age=1.0, clock=lambda: now[0])
+
+    for i in range(6):
+        now[0] = float(i)
+        store.append(ExceptionEvent(id=i))
+
+    assert [e.id for e in store.snapshot()] == [4, 5]
+    assert store.get(1) is None
+    assert store.set_caught(3, True) is True
+    assert store.get(3).caught is True
+
+
+def test_each_thread_gets_its_own_bounded_ring():
+    # барьер держит потоки живыми одновременно, иначе ОС может переиспользовать их ident
+    barrier = threading.Barrier(3)
+
+    def spin():
+        barrier.wait()
+        for i in range(1_000):
+            tick(i)
+        barrier.wait()
+
+    flowtrace.start_flight_recorder(max_events=30, dump_on_exit=False)
+    workers = [threading.Thread(target=spin) for _ in range(3)]
+    for th in workers:
+        th.start()
+    for th in workers:
+        th.join()
+    sess = sys.monitoring.flowtrace_session
+    rings = [t.state.events for t in sess.threads.values()]
+    events = flowtrace.stop_tracing()
+
+    assert all(isinstance(r, RingEventStore) and len(r) <= 30 for r in rings)
+    # завершившиеся потоки сняты с учёта, их события — в общем архиве на 30 событий
+    assert len(rings) == 1
+    assert len(events) <= 2 * 30
+    # return из spin каждого потока — после барьера, это самые новые события
+    assert {e.context.thread_id for e in events} >= {th.ident for th in workers}
+    assert sess.evicted == 3 * (2 * 1_000 + 2) - 30
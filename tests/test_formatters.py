@@ -1,8 +1,18 @@
 import io
+import sys
 from contextlib import redirect_stdout
 
 import flowtrace
-from flowtrace.formatters import print_events_debug, print_summary, print_tree
+from flowtrace.async_model import AwaitSegment, TaskTrace
+from flowtrace.events import CallEvent
+from flowtrace.formatters import (
+    AsyncIndex,
+    print_async_tree,
+    print_events_debug,
+    print_summary,
+    print_tree,
+)
+from flowtrace.formatters.async_tree import print_await_segment, print_call_subtree
 
 
 @flowtrace.trace
@@ -24,3 +34,83 @@ def test_all_formatters_print_something():
     out = buf.getvalue()
     assert "calc" in out
     assert "return" in out or "событий" in out
+
+
+def chain(depth):
+    """Цепочка вложенных вызовов f0 → f1 → … глубже лимита рекурсии."""
+    events = [
+        CallEvent(id=i, kind="call", func_name=f"f{i}", parent_id=i - 1 if i else None)
+        for i in range(depth)
+    ]
+    events += [
+        CallEvent(id=2 * depth - 1 - i, kind="return", func_name=f"f{i}", parent_id=i)
+        for i in reversed(range(depth))
+    ]
+    return events
+
+
+def test_print_tree_handles_traces_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() + 500
+    out = io.StringIO()
+    print_tree(chain(depth), inline_return=True, file=out)
+
+    lines = out.getvalue().splitlines()
+    assert len(lines) == 2 * depth - 1  # самый глубокий вызов — однострочный лист
+    assert lines[0] == "→ f0()"
+    assert lines[depth - 1] == "  " * (depth - 1) + f"→ f{depth - 1}()"
+    assert lines[-1] == "← f0()"
+
+
+def test_print_tree_subtree_by_parent_id():
+    out = io.StringIO()
+    print_tree(chain(3), indent=1, parent_id=0, inline_return=True, file=out)
+    assert out.getvalue() == "  → f1()\n    → f2()\n  ← f1()\n"
+
+
+def test_async_tree_is_indexed_and_iterative():
+    depth = sys.getrecursionlimit() + 500
+    events = chain(depth)
+    task = TaskTrace(
+        task_id=1,
+        parent_task_id=None,
+        task_name="deep",
+        thread_id=1,
+        roots=[0],
+        call_children={i: [i + 1] for i in range(depth - 1)},
+        await_segments=[AwaitSegment(call_id=depth - 1, await_event_id=0, duration=0.002)],
+    )
+    out = io.StringIO()
+    print_async_tree({1: task}, events, file=out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0] == "Task#1 deep"
+    assert lines[depth] == "  " * depth + f"→ f{depth - 1}()"
+    assert lines[depth + 1] == "  " * (depth + 1) + "↯ await [2.00 ms]"
+    assert lines[-2:] == ["  ← f0()", ""]
+
+
+def test_node_by_node_rendering_reuses_one_index(monkeypatch):
+    events = chain(50)
+    seg = AwaitSegment(call_id=49, await_event_id=0, duration=0.001)
+    task = TaskTrace(
+        task_id=1,
+        parent_task_id=None,
+        task_name="t",
+        thread_id=1,
+        roots=[0],
+        call_children={i: [i + 1] for i in range(49)},
+        await_segments=[seg],
+    )
+    index = AsyncIndex(events)
+
+    def no_rebuild(self, events):
+        raise AssertionError("индекс строится заново")
+
+    monkeypatch.setattr(AsyncIndex, "__init__", no_rebuild)
+    out = io.StringIO()
+    for call_id in range(50):
+        print_call_subtree(call_id, task, {1: task}, events, "", file=out, index=index)
+    print_await_segment(seg, task, {1: task}, events, "", file=out, index=index)
+    print_async_tree({1: task}, events, file=out, index=index)
+
+    assert out.getvalue().count("↯ await [1.00 ms]") == 50 + 1 + 1
@@ -1,7 +1,9 @@
 import sys
+from fractions import Fraction
 
 import flowtrace
 from flowtrace.monitoring import _is_user_code, _is_user_path
+from flowtrace.session import TraceSession
 
 
 def test_is_user_code_and_path_filters_work():
@@ -14,3 +16,77 @@ def test_is_user_code_and_path_filters_work():
 
     # 3. сам файл теста должен считаться "user"
     assert _is_user_path(__file__) is True
+
+
+def _user_func():
+    return 1
+
+
+def test_dispatcher_disables_filtered_local_events():
+    sess = TraceSession()
+    sess.start()
+    dispatcher = sess.raw_dispatcher
+    lib_code = flowtrace.start_tracing.__code__
+
+    # библиотечный код: локальное событие отключается, нелокальное — просто отбрасывается
+    assert dispatcher.on_py_start(lib_code, 0) is sys.monitoring.DISABLE
+    assert dispatcher.on_raise(lib_code, 0, ValueError()) is None
+    assert len(sess.state.events) == 0
+
+    # пользовательский код доходит до трекеров
+    assert dispatcher.on_py_start(_user_func.__code__, 0) is None
+    assert [e.func_name for e in sess.stop()] == ["_user_func"]
+
+
+def test_filtered_code_is_rearmed_for_next_session():
+    def lib_heavy():
+        return _user_func() + sum(Fraction(i, 3) for i in range(3)).numerator
+
+    with flowtrace.active_tracing():
+        lib_heavy()
+    first = [e.func_name for e in flowtrace.get_trace_data() if e.kind == "call"]
+
+    with flowtrace.active_tracing():
+        lib_heavy()
+    second = [e.func_name for e in flowtrace.get_trace_data() if e.kind == "call"]
+
+    assert "_user_func" in first
+    assert first == second
+
+
+class _Widget:
+    def render(self):
+        return "w"
+
+
+def test_code_name_resolver_uses_registry_and_qualname(monkeypatch):
+    import gc
+
+    from flowtrace.raw_dispatcher import CodeNameResolver, register_code_name
+
+    def forbidden(*objs):
+        raise AssertionError("gc.get_referrers must not be used")
+
+    monkeypatch.setattr(gc, "get_referrers", forbidden)
+    resolver = CodeNameResolver()
+
+    assert resolver.resolve(_Widget.render.__code__) == "_Widget.render"
+
+    def local():
+        return None
+
+    register_code_name(local.__code__, "custom_name")
+    assert resolver.resolve(local.__code__) == "custom_name"
+
+
+def test_trace_registers_wrapped_function_name():
+    @flowtrace.trace
+    def decorated():
+        return 1
+
+    with flowtrace.active_tracing():
+        decorated()
+
+    calls = [e for e in flowtrace.get_trace_data() if e.kind == "call"]
+    assert [e.func_name for e in calls] == [decorated.__flowtrace_real_name__]
+    assert calls[0].func_name.endswith("<locals>.decorated")
@@ -0,0 +1,119 @@
+import asyncio
+import gc
+import tracemalloc
+
+from flowtrace import (
+    active_tracing,
+    config,
+    get_live_tasks,
+    get_parked_tasks,
+    get_trace_data,
+    start_flight_recorder,
+    start_tracing,
+    stop_tracing,
+)
+from flowtrace.async_reconstruct import build_task_traces
+
+
+async def waiter(event):
+    await event.wait()
+    return 1
+
+
+async def probe(event):
+    await asyncio.sleep(0.01)
+    # waiter всё ещё стоит на event.wait(): спрашиваем, не останавливая сессию
+    parked = get_parked_tasks()
+    tasks = get_live_tasks()
+    event.set()
+    return parked, tasks
+
+
+async def main():
+    event = asyncio.Event()
+    w = asyncio.create_task(waiter(event), name="waiter")
+    parked, tasks = await probe(event)
+    await w
+    return parked, tasks
+
+
+def test_parked_tasks_are_visible_while_tracing():
+    # время ожидания считается по меткам событий
+    config(timestamps=True)
+    try:
+        with active_tracing(default_show_timing=False, live_tasks=True):
+            parked, tasks = asyncio.run(main())
+    finally:
+        config(timestamps=False)
+
+    by_name = {p.task.task_name: p for p in parked}
+    assert "waiter" in by_name
+    waiting = by_name["waiter"]
+    assert waiting.waited is not None and waiting.waited >= 0.005
+    # сегмент живой: после event.set() тот же объект получил resume
+    assert waiting.segment.resume_event_id is not None
+    # самые долгие ожидания первыми
+    waited = [p.waited for p in parked if p.waited is not None]
+    assert waited == sorted(waited, reverse=True)
+
+    assert any(t.task_name == "waiter" for t in tasks.values())
+
+
+def test_live_traces_match_reconstruction():
+    start_tracing(default_show_timing=False, live_tasks=True)
+    try:
+        asyncio.run(main())
+        live = get_live_tasks()
+    finally:
+        stop_tracing()
+
+    assert live
+    assert live == build_task_traces(get_trace_data())
+
+
+def test_live_tasks_are_off_by_default():
+    with active_tracing(default_show_timing=False):
+        parked, tasks = asyncio.run(main())
+    assert parked == []
+    assert tasks == {}
+
+
+def leaf(i):
+    return i
+
+
+async def short_task(i):
+    await asyncio.sleep(0)
+    return leaf(i)
+
+
+async def churn(n):
+    for i in range(n):
+        leaf(i)
+    return sum(await asyncio.gather(*(short_task(i) for i in range(n))))
+
+
+def test_soak_live_tasks_memory_stays_flat():
+    rounds = 30
+    start_flight_recorder(max_events=500, dump_on_crash=False, dump_on_exit=False, live_tasks=True)
+    tracemalloc.start()
+    try:
+        samples = []
+        for i in range(rounds):
+            for j in range(1000):
+                leaf(j)
+            asyncio.run(churn(200))
+            if i in (rounds // 3, rounds - 1):
+                gc.collect()
+                samples.append(tracemalloc.get_traced_memory()[0])
+        live = get_live_tasks()
+        parked = get_parked_tasks()
+    finally:
+        tracemalloc.stop()
+        stop_tracing()
+
+    # ~4000 тасок и ~44000 вызовов между замерами: рост без ограничения — мегабайты
+    assert samples[1] - samples[0] < 300_000
+    assert len(live) <= 500 + 1
+    assert all(not t.event_ids for t in live.values())
+    assert parked == []
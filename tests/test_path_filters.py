@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from flowtrace import active_tracing, config, get_config, get_trace_data
+from flowtrace.events import CallEvent
+from flowtrace.monitoring import _IS_USER_PATH_CACHE, _is_user_path
+
+
+def noisy_helper(x):
+    return x * 2
+
+
+def work():
+    return noisy_helper(json.dumps({"a": 1}))
+
+
+@pytest.fixture(autouse=True)
+def reset_filters():
+    yield
+    config(include=(), exclude=())
+
+
+def called(data):
+    return {e.func_name for e in data if isinstance(e, CallEvent) and e.kind == "call"}
+
+
+def test_default_rules_skip_stdlib():
+    with active_tracing():
+        work()
+    assert called(get_trace_data()) == {"work", "noisy_helper"}
+
+
+def test_include_glob_traces_library_code():
+    config(include=["*/json/*"])
+    with active_tracing():
+        work()
+    assert "dumps" in called(get_trace_data())
+
+
+def test_exclude_regex_wins_over_user_code_and_include():
+    config(include=["*/tests/*"], exclude=["re:test_path_filters\\.py$"])
+    with active_tracing():
+        work()
+    assert get_trace_data() == []
+
+
+def test_filter_change_rearms_disabled_code():
+    config(exclude=["*/test_path_filters.py"])
+    with active_tracing():
+        work()
+    assert get_trace_data() == []
+
+    # код, отключённый через DISABLE при прошлом правиле, снова даёт события
+    config(exclude=())
+    with active_tracing():
+        work()
+    assert called(get_trace_data()) == {"work", "noisy_helper"}
+
+
+def test_path_decisions_are_cached_and_reset_on_change():
+    assert _is_user_path(__file__) is True
+    assert _IS_USER_PATH_CACHE[__file__] is True
+
+    config(exclude=["*/test_path_filters.py"])
+    assert __file__ not in _IS_USER_PATH_CACHE
+    assert _is_user_path(__file__) is False
+
+
+def test_invalid_regex_is_reported():
+    with pytest.raises(ValueError):
+        config(exclude=["re:("])
+    assert get_config().exclude == ()
@@ -0,0 +1,150 @@
+import asyncio
+from contextlib import suppress
+
+import pytest
+
+from flowtrace import active_tracing, get_sampling_stats, get_trace_data, trace
+from flowtrace.events import CallEvent, ExceptionEvent
+from flowtrace.formatters import print_summary
+from flowtrace.sampling import Sampler
+
+
+def leaf(x):
+    return x + 1
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def handle(i):
+    with suppress(ValueError):
+        fail()
+    return leaf(i)
+
+
+def roots(data):
+    return [
+        e for e in data if isinstance(e, CallEvent) and e.kind == "call" and e.parent_id is None
+    ]
+
+
+def test_sample_every_records_one_tree_in_n():
+    with active_tracing():
+        handle(0)
+    per_tree = len(get_trace_data())
+
+    with active_tracing(sample_every=3):
+        for i in range(7):
+            handle(i)
+
+    data = get_trace_data()
+    assert [r.func_name for r in roots(data)] == ["handle"] * 3
+    leaf_results = [e.result_repr for e in data if e.kind == "return" and e.func_name == "leaf"]
+    assert leaf_results == ["1", "4", "7"]
+    # ни одного события из деревьев вне выборки
+    assert len(data) == 3 * per_tree
+    assert any(isinstance(e, ExceptionEvent) for e in data)
+
+    stats = get_sampling_stats()
+    assert stats is not None
+    assert (stats.roots_seen, stats.roots_sampled) == (7, 3)
+    assert stats.scale == pytest.approx(7 / 3)
+
+
+def test_sample_rate_zero_records_nothing_and_keeps_stack_balanced():
+    with active_tracing(sample_rate=0.0):
+        for i in range(5):
+            handle(i)
+        assert leaf(1) == 2
+
+    assert get_trace_data() == []
+    stats = get_sampling_stats()
+    assert stats is not None and (stats.roots_seen, stats.roots_sampled) == (6, 0)
+
+
+def test_no_sampling_by_default():
+    with active_tracing():
+        handle(1)
+    assert get_sampling_stats() is None
+    assert len(roots(get_trace_data())) == 1
+
+
+def test_summary_reports_sampling(capsys):
+    with active_tracing(sample_every=2):
+        for i in range(4):
+            leaf(i)
+
+    print_summary()
+    out = capsys.readouterr().out
+    assert "записано 2 из 4 корневых вызовов (50.00%)" in out
+
+
+def test_trace_decorator_skips_unsampled_calls(capsys):
+    @trace(sample_every=2, show_args=True)
+    def job(n):
+        return leaf(n)
+
+    assert [job(n) for n in range(4)] == [1, 2, 3, 4]
+
+    out = capsys.readouterr().out
+    assert "job(n=0)" in out and "job(n=2)" in out
+    assert "job(n=1)" not in out and "job(n=3)" not in out
+    # сводка печатается после каждого записанного вызова
+    assert "записано 2 из 3" in out
+
+
+def test_trace_decorator_sampling_inside_active_session():
+    @trace(sample_every=2, show_args=True)
+    def job(n):
+        return leaf(n)
+
+    with active_tracing():
+        for n in range(4):
+            job(n)
+
+    assert [r.args_repr for r in roots(get_trace_data())] == ["n=0", "n=2"]
+
+
+def test_sampler_validates_arguments():
+    with pytest.raises(ValueError):
+        Sampler()
+    with pytest.raises(ValueError):
+        Sampler(rate=0.5, every=2)
+    with pytest.raises(ValueError):
+        Sampler(rate=1.5)
+    with pytest.raises(ValueError):
+        Sampler(every=0)
+
+
+def test_sampler_rate_is_reproducible_with_seed():
+    a = Sampler(rate=0.3, seed=7)
+    b = Sampler(rate=0.3, seed=7)
+    assert [a.decide() for _ in range(50)] == [b.decide() for _ in range(50)]
+
+
+async def task_tree(i):
+    await asyncio.sleep(0)
+    return leaf(i)
+
+
+async def gathered(n):
+    return await asyncio.gather(*(task_tree(i) for i in range(n)))
+
+
+def test_sampling_decides_per_asyncio_task():
+    with active_tracing(sample_every=2, default_show_timing=False):
+        results = asyncio.run(gathered(10))
+    assert results == [i + 1 for i in range(10)]
+
+    stats = get_sampling_stats()
+    # корень — первый вызов каждой таски: gathered и 10 task_tree
+    assert stats is not None and (stats.roots_seen, stats.roots_sampled) == (11, 6)
+
+    data = get_trace_data()
+    recorded = {e.context.task_id for e in data if e.func_name == "task_tree"}
+    assert len(recorded) == 5
+    # пока таска вне выборки стоит в await, остальные пишутся целиком
+    for tid in recorded:
+        kinds = [e.kind for e in data if e.context.task_id == tid and e.func_name == "leaf"]
+        assert kinds == ["call", "return"]
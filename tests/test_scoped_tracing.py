@@ -0,0 +1,74 @@
+import sys
+
+import flowtrace
+from flowtrace import active_tracing, get_trace_data
+from flowtrace.core import TOOL_ID
+
+
+def helper(x):
+    return x * 2
+
+
+def endpoint(x):
+    return helper(x) + 1
+
+
+def unrelated():
+    return helper(0)
+
+
+class Service:
+    def handle(self, x):
+        return helper(x)
+
+
+def test_scope_traces_target_and_reached_user_code():
+    with active_tracing(scope=[endpoint]):
+        unrelated()
+        endpoint(1)
+
+    names = [e.func_name for e in get_trace_data() if e.kind == "call"]
+    assert names == ["endpoint", "helper"]
+
+
+def test_scope_reaches_methods_and_is_cleared_after_stop():
+    def run():
+        return Service().handle(3)
+
+    with active_tracing(scope=[run]):
+        run()
+
+    names = [e.func_name for e in get_trace_data() if e.kind == "call"]
+    assert names == [run.__qualname__, "Service.handle", "helper"]
+
+    events = sys.monitoring.events
+    assert sys.monitoring.get_local_events(TOOL_ID, run.__code__) == events.NO_EVENTS
+    assert sys.monitoring.get_local_events(TOOL_ID, helper.__code__) == events.NO_EVENTS
+
+
+@flowtrace.trace(scoped=True, show_args=True)
+def scoped_entry(x):
+    return helper(x)
+
+
+def test_scoped_trace_decorator(capsys):
+    unrelated()
+    assert scoped_entry(5) == 10
+
+    out = capsys.readouterr().out
+    assert "scoped_entry(x=5)" in out
+    assert "helper" in out
+    assert "unrelated" not in out
+
+
+def polymorphic(x):
+    # одно место вызова: сначала builtin, затем пользовательская функция
+    return [f(x) for f in (len, helper)]
+
+
+def test_builtin_at_call_site_does_not_hide_user_callee():
+    with active_tracing(scope=[polymorphic]):
+        polymorphic("ab")
+
+    names = [e.func_name for e in get_trace_data() if e.kind == "call"]
+    assert "helper" in names
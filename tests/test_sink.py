@@ -0,0 +1,208 @@
+import io
+import json
+import sys
+import threading
+from contextlib import suppress
+
+import pytest
+
+from flowtrace import EventSink, active_tracing, get_trace_data, load_events
+from flowtrace.core import _current_session
+from flowtrace.events import CallEvent, ExceptionEvent
+from flowtrace.exporters import dump_jsonl, iter_jsonl
+from flowtrace.sink import SinkEventStore
+
+
+def leaf(x):
+    return x + 1
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def work(n):
+    with suppress(ValueError):
+        fail()
+    return sum(leaf(i) for i in range(n))
+
+
+def shape(events):
+    return [
+        (
+            type(e).__name__,
+            e.id,
+            e.func_name,
+            getattr(e, "parent_id", None),
+            getattr(e, "caught", None),
+        )
+        for e in events
+    ]
+
+
+def test_streamed_trace_matches_in_memory_trace(tmp_path):
+    with active_tracing(default_show_args=True):
+        work(5)
+    expected = list(get_trace_data())
+
+    path = tmp_path / "trace.jsonl"
+    with active_tracing(default_show_args=True, sink=path):
+        work(5)
+    assert list(get_trace_data()) == []
+
+    streamed = load_events(path)
+    assert shape(streamed) == shape(expected)
+    assert [e.context.thread_id for e in streamed] == [e.context.thread_id for e in expected]
+    fails = [e for e in streamed if isinstance(e, ExceptionEvent) and e.func_name == "fail"]
+    assert [e.caught for e in fails] == [False]
+
+
+def test_session_does_not_accumulate_events(tmp_path):
+    sink = EventSink(tmp_path / "trace.jsonl", batch_size=64)
+    with active_tracing(sink=sink):
+        for _ in range(20):
+            work(50)
+        state = _current_session().state
+        assert isinstance(state.events, SinkEventStore)
+        assert state.events.snapshot() == []
+        assert len(state.stack) <= 1
+
+    assert sink.dropped == 0
+    assert sink.written == len(load_events(tmp_path / "trace.jsonl"))
+
+
+class StalledWriter(io.StringIO):
+    """Первая запись зависает, пока тест не отпустит писателя."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, s):
+        self.entered.set()
+        self.release.wait(5)
+        return super().write(s)
+
+
+def ev(i):
+    return CallEvent(id=i, kind="call", func_name=f"f{i}")
+
+
+def stalled_sink(policy):
+    out = StalledWriter()
+    sink = EventSink(out, capacity=4, batch_size=1, policy=policy, flush_interval=0.01)
+    sink.start()
+    sink.put(ev(0))
+    assert out.entered.wait(5)
+    return sink, out
+
+
+@pytest.mark.parametrize(
+    ("policy", "kept"),
+    [("drop-newest", [0, 1, 2, 3, 4]), ("drop-oldest", [0, 7, 8, 9, 10])],
+)
+def test_drop_policies(policy, kept):
+    sink, out = stalled_sink(policy)
+    for i in range(1, 11):
+        sink.put(ev(i))
+    assert sink.dropped == 6
+
+    out.release.set()
+    sink.close()
+    assert [e.id for e in load_events(out.getvalue().splitlines())] == kept
+
+
+@pytest.mark.parametrize("policy", ["drop-oldest", "drop-newest"])
+def test_overflow_keeps_caught_corrections(policy):
+    out = StalledWriter()
+    sink = EventSink(out, capacity=4, batch_size=1, policy=policy, flush_interval=0.01)
+    sink.start()
+    sink.put(ExceptionEvent(id=0, func_name="fail", exc_type="ValueError"))
+    assert out.entered.wait(5)
+    # поправка стоит в голове очереди, когда та переполняется
+    sink.put_caught(0, True)
+    for i in range(1, 11):
+        sink.put(ev(i))
+    sink.put_caught(0, True)
+    # считаются только отброшенные события
+    assert sink.dropped == 7
+    assert sink.dropped_corrections == 0
+
+    out.release.set()
+    sink.close()
+    events = load_events(out.getvalue().splitlines())
+    assert len(events) == 4
+    assert events[0].caught is True
+
+
+def test_block_policy_waits_for_writer():
+    sink, out = stalled_sink("block")
+    producer = threading.Thread(target=lambda: [sink.put(ev(i)) for i in range(1, 11)])
+    producer.start()
+    producer.join(0.2)
+    assert producer.is_alive()  # очередь полна, писатель стоит
+
+    out.release.set()
+    producer.join(5)
+    sink.close()
+    assert sink.dropped == 0
+    assert [e.id for e in load_events(out.getvalue().splitlines())] == list(range(11))
+
+
+def test_sink_validates_arguments():
+    with pytest.raises(ValueError):
+        EventSink(io.StringIO(), capacity=0)
+    with pytest.raises(ValueError):
+        EventSink(io.StringIO(), policy="drop-random")
+
+
+class BrokenWriter(io.StringIO):
+    def write(self, s):
+        raise OSError("disk full")
+
+
+def test_dead_writer_does_not_block_producers():
+    sink = EventSink(BrokenWriter(), capacity=4, batch_size=1, flush_interval=0.01)
+    sink.start()
+    producer = threading.Thread(target=lambda: [sink.put(ev(i)) for i in range(100)])
+    producer.start()
+    producer.join(5)
+    assert not producer.is_alive()  # политика "block", но писатель мёртв
+
+    assert isinstance(sink.error, OSError)
+    assert sink.dropped > 0
+    with pytest.raises(RuntimeError, match="sink writer failed") as info:
+        sink.close()
+    assert info.value.__cause__ is sink.error
+
+
+def test_session_surfaces_sink_failure():
+    sink = EventSink(BrokenWriter(), capacity=4, batch_size=1)
+    with pytest.raises(RuntimeError, match="sink writer failed"), active_tracing(sink=sink):
+        work(50)
+    # сессия снята, следующая запускается как обычно
+    assert sys.monitoring.flowtrace_session is None
+    with active_tracing():
+        work(1)
+    assert get_trace_data()
+
+
+def test_sink_writes_the_exporter_format(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    with active_tracing(default_show_args=True, sink=path):
+        work(3)
+
+    # один формат: заголовок и таблица контекстов, как у dump_jsonl
+    lines = path.read_text(encoding="utf-8").splitlines()
+    header = json.loads(lines[0])
+    streamed = list(iter_jsonl(lines))
+    assert header == {"format": "flowtrace-jsonl", "version": 1, "corrections": True}
+    assert shape(streamed) == shape(load_events(path))
+    # поправки caught применены и при ленивом чтении
+    caught = {e.func_name: e.caught for e in streamed if isinstance(e, ExceptionEvent)}
+    assert caught == {"fail": False, "work": True}
+
+    buf = io.StringIO()
+    dump_jsonl(streamed, buf)
+    assert shape(load_events(buf.getvalue().splitlines())) == shape(streamed)
@@ -0,0 +1,101 @@
+import asyncio
+import gc
+import sys
+import tracemalloc
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data, start_flight_recorder, stop_tracing
+from flowtrace.asyncio_support import TaskRegistry
+
+
+async def noop():
+    return None
+
+
+def test_registry_holds_tasks_weakly():
+    registry = TaskRegistry()
+
+    async def main():
+        for _ in range(50):
+            task = asyncio.create_task(noop())
+            registry.get_async_id(task)
+            await task
+
+    asyncio.run(main())
+    gc.collect()
+    assert len(registry) == 0
+
+
+def test_ids_are_unique_and_parents_come_from_the_factory():
+    registry = TaskRegistry()
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        loop.set_task_factory(registry.task_factory)
+        try:
+            me = registry.get_async_id()
+            children = [asyncio.create_task(noop()) for _ in range(3)]
+            ids = [registry.get_async_id(t) for t in children]
+            parents = [registry.parent_id(t) for t in children]
+            await asyncio.gather(*children)
+            return me, ids, parents
+        finally:
+            loop.set_task_factory(None)
+
+    me, ids, parents = asyncio.run(main())
+    assert len({me, *ids}) == 4
+    assert parents == [me, me, me]
+
+
+async def child():
+    return 11
+
+
+@pytest.mark.asyncio
+async def test_registry_is_scoped_to_the_session():
+    with active_tracing(default_show_timing=False):
+        registry = sys.monitoring.flowtrace_session.task_registry
+        await asyncio.create_task(child())
+        assert len(registry) >= 1
+    assert len(registry) == 0
+
+    events = get_trace_data()
+    child_ctx = next(e.context for e in events if e.func_name == "child")
+    parent_ctx = next(
+        e.context for e in events if e.func_name.endswith("test_registry_is_scoped_to_the_session")
+    )
+    assert child_ctx.task_parent_id == parent_ctx.task_id
+
+
+async def holder(payload_size):
+    # большой результат: утёкшая задача держала бы его в себе
+    payload = bytearray(payload_size)
+    await asyncio.sleep(0)
+    return payload
+
+
+async def wave(n, payload_size):
+    return sum(map(len, await asyncio.gather(*(holder(payload_size) for _ in range(n)))))
+
+
+def test_soak_memory_stays_flat():
+    rounds, per_round, payload = 40, 100, 20_000
+    start_flight_recorder(max_events=2_000, dump_on_crash=False, dump_on_exit=False)
+    registry = sys.monitoring.flowtrace_session.task_registry
+    tracemalloc.start()
+    try:
+        samples = []
+        for i in range(rounds):
+            asyncio.run(wave(per_round, payload))
+            if i in (rounds // 4, rounds - 1):
+                gc.collect()
+                samples.append(tracemalloc.get_traced_memory()[0])
+        live = len(registry)
+    finally:
+        tracemalloc.stop()
+        stop_tracing()
+
+    # 3000 задач между замерами по 20 КБ — утечка дала бы ~60 МБ
+    assert samples[1] - samples[0] < 1_000_000
+    assert live < per_round
@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flowtrace import active_tracing, get_trace_data, trace
+from flowtrace.core import _current_session, is_tracing_active
+from flowtrace.events import CallEvent
+
+
+def leaf(x):
+    return x + 1
+
+
+def work(i):
+    total = 0
+    for _ in range(20):
+        total += leaf(i)
+    return total
+
+
+def test_worker_threads_get_own_stacks_and_consistent_parents():
+    with active_tracing(), ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(work, range(8))) == [20 * (i + 1) for i in range(8)]
+
+    data = get_trace_data()
+    ids = [e.id for e in data]
+    assert ids == sorted(ids) and len(set(ids)) == len(ids)
+
+    calls = {e.id: e for e in data if isinstance(e, CallEvent) and e.kind == "call"}
+    works = [e for e in calls.values() if e.func_name == "work"]
+    leaves = [e for e in calls.values() if e.func_name == "leaf"]
+    assert len(works) == 8
+    assert len(leaves) == 8 * 20
+
+    for ev in leaves:
+        parent = calls[ev.parent_id]
+        # ребёнок и родитель всегда из одного потока
+        assert parent.func_name == "work"
+        assert parent.context.thread_id == ev.context.thread_id
+
+    returns = [e for e in data if isinstance(e, CallEvent) and e.kind == "return"]
+    assert len(returns) == len(calls)
+    assert all(calls[r.parent_id].func_name == r.func_name for r in returns)
+
+
+def test_threads_started_after_start_see_the_session():
+    seen = []
+
+    def probe():
+        seen.append(is_tracing_active())
+        work(1)
+
+    with active_tracing():
+        th = threading.Thread(target=probe)
+        th.start()
+        th.join()
+
+    assert seen == [True]
+    assert any(e.func_name == "work" and e.context.thread_id == th.ident for e in get_trace_data())
+
+
+def test_decorator_meta_is_per_thread():
+    @trace(show_args=True)
+    def job(n):
+        return leaf(n)
+
+    with active_tracing(default_show_args=False), ThreadPoolExecutor(max_workers=3) as pool:
+        list(pool.map(job, range(6)))
+
+    jobs = [e for e in get_trace_data() if e.kind == "call" and e.func_name.endswith("job")]
+    assert sorted(e.args_repr for e in jobs) == [f"n={n}" for n in range(6)]
+
+
+def test_finished_threads_are_retired():
+    def burst(i):
+        th = threading.Thread(target=work, args=(i,))
+        th.start()
+        th.join()
+        return th.ident
+
+    with active_tracing():
+        idents = [burst(i) for i in range(20)]
+        sess = _current_session()
+        assert sess is not None
+        # в учёте только поток сессии: состояние завершившихся снято
+        assert list(sess.threads) == [threading.get_ident()]
+
+    data = get_trace_data()
+    works = [e for e in data if isinstance(e, CallEvent) and e.func_name == "work"]
+    assert len(works) == 2 * 20  # события завершившихся потоков не потеряны
+    assert {e.context.thread_id for e in works} == set(idents)
+    # ident переиспользуется ОС, но стек и контекст у каждого потока свои
+    for call in (e for e in works if e.kind == "call"):
+        assert call.parent_id is None
+
+
+def test_reused_ident_gets_fresh_state():
+    seen = []
+
+    def grab():
+        seen.append((threading.get_ident(), _current_session().for_thread()))
+        leaf(1)
+
+    with active_tracing(default_show_timing=False):
+        for _ in range(5):
+            th = threading.Thread(target=grab)
+            th.start()
+            th.join()
+
+    # ОС часто отдаёт новому потоку ident завершившегося; состояние — всегда новое
+    trackers = [t for _, t in seen]
+    assert len({id(t) for t in trackers}) == len(trackers)
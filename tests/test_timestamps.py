@@ -0,0 +1,77 @@
+import asyncio
+from contextlib import redirect_stdout, suppress
+from io import StringIO
+
+import pytest
+
+from flowtrace import active_tracing, config, get_trace_data
+from flowtrace.async_reconstruct import build_task_traces
+from flowtrace.formatters import print_async_tree
+
+
+def leaf(x):
+    return x + 1
+
+
+def fail():
+    raise ValueError("boom")
+
+
+def work():
+    with suppress(ValueError):
+        fail()
+    return leaf(1)
+
+
+async def napper():
+    await asyncio.sleep(0.01)
+    return 1
+
+
+async def main():
+    return await asyncio.gather(napper(), napper())
+
+
+@pytest.fixture(autouse=True)
+def stamped():
+    # метки выключены по умолчанию: включаем их на время каждого теста
+    config(timestamps=True)
+    yield
+    config(timestamps=False)
+
+
+def test_every_event_has_monotonic_ns_timestamp():
+    with active_tracing():
+        work()
+
+    data = get_trace_data()
+    stamps = [e.ts for e in data]
+    assert all(isinstance(ts, int) for ts in stamps)
+    assert stamps == sorted(stamps)
+
+
+def test_timestamps_are_off_by_default():
+    config(timestamps=False)
+    with active_tracing():
+        work()
+
+    assert all(e.ts is None for e in get_trace_data())
+
+
+def test_await_segments_get_real_durations():
+    with active_tracing(default_show_timing=False):
+        asyncio.run(main())
+
+    events = get_trace_data()
+    tasks = build_task_traces(events)
+    segments = [seg for t in tasks.values() for seg in t.await_segments]
+    assert segments
+    assert all(seg.duration is not None and seg.duration >= 0 for seg in segments)
+    # оба napper'а ждали sleep(0.01)
+    assert sum(seg.duration >= 0.005 for seg in segments) >= 2
+    assert all(seg.end_ts > seg.start_ts for seg in segments if seg.duration)
+
+    out = StringIO()
+    with redirect_stdout(out):
+        print_async_tree(tasks, events)
+    assert " ms]" in out.getvalue()
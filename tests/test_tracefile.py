@@ -0,0 +1,120 @@
+import asyncio
+from contextlib import redirect_stdout, suppress
+from io import StringIO
+
+import pytest
+
+from flowtrace import active_tracing, get_trace_data, print_tree
+from flowtrace.async_reconstruct import build_task_traces
+from flowtrace.events import CallEvent, ExceptionEvent
+from flowtrace.storage import ColumnarEventView
+from flowtrace.tracefile import TraceFile, write_trace
+
+
+def leaf(x):
+    return x * 2
+
+
+def fail():
+    raise KeyError("нет ключа")
+
+
+def branch(n):
+    with suppress(KeyError):
+        fail()
+    return [leaf(i) for i in range(n)]
+
+
+async def tick(n):
+    await asyncio.sleep(0)
+    return leaf(n)
+
+
+async def main():
+    return sum(await asyncio.gather(tick(1), tick(2)))
+
+
+def capture():
+    with active_tracing(default_show_args=True, default_show_timing=True, clock="dual"):
+        branch(3)
+        asyncio.run(main())
+    return list(get_trace_data())
+
+
+@pytest.fixture
+def traced(tmp_path):
+    events = capture()
+    # исключение без сообщения: None должен пережить круговой путь, как и ""
+    last = events[-1].id
+    events.append(ExceptionEvent(id=last + 1, func_name="fail", exc_type="KeyError"))
+    events.append(ExceptionEvent(id=last + 2, func_name="fail", exc_type="KeyError", exc_msg=""))
+    path = tmp_path / "trace.ftb"
+    assert write_trace(events, path) == len(events)
+    with TraceFile(path) as tf:
+        yield events, tf
+
+
+def test_round_trip_is_lossless(traced):
+    events, tf = traced
+    assert len(tf) == len(events)
+    assert list(tf) == events
+    assert any(e.kind == "await" for e in tf)
+    assert any(isinstance(e, CallEvent) and e.cpu_duration is not None for e in tf)
+    assert [tf[-2].exc_msg, tf[-1].exc_msg] == [None, ""]
+
+
+def test_random_access_by_index_and_id(traced):
+    events, tf = traced
+    assert tf[-1] == events[-1]
+    assert isinstance(tf[2:6], ColumnarEventView)
+    assert list(tf[2:6]) == events[2:6]
+    for ev in events[::3]:
+        assert tf.get(ev.id) == ev
+    assert tf.get(events[-1].id + 1) is None
+    with pytest.raises(IndexError):
+        tf[len(events)]
+
+
+def test_formatters_run_over_mapped_file(traced):
+    events, tf = traced
+    outputs = []
+    for source in (events, tf):
+        out = StringIO()
+        with redirect_stdout(out):
+            print_tree(source, inline_return=False)
+        outputs.append(out.getvalue())
+    assert outputs[0] == outputs[1]
+    assert "нет ключа" in outputs[1] and "cpu " in outputs[1]
+
+    assert build_task_traces(tf).keys() == build_task_traces(events).keys()
+
+
+def test_rejects_foreign_and_unordered_input(tmp_path):
+    bogus = tmp_path / "bogus.ftb"
+    bogus.write_bytes(b"not a trace file at all, definitely not" * 2)
+    with pytest.raises(ValueError):
+        TraceFile(bogus)
+
+    events = [
+        CallEvent(id=2, kind="call", func_name="f"),
+        CallEvent(id=1, kind="call", func_name="g"),
+    ]
+    with pytest.raises(ValueError):
+        write_trace(events, tmp_path / "unordered.ftb")
+
+
+def test_rejects_empty_and_truncated_files(tmp_path):
+    empty = tmp_path / "empty.ftb"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError, match="empty or truncated"):
+        TraceFile(empty)
+
+    path = tmp_path / "trace.ftb"
+    write_trace(capture(), path)
+    data = path.read_bytes()
+    # обрезаем посреди заголовка, записей и таблиц в хвосте
+    for size in (10, len(data) // 2, len(data) - 3):
+        cut = tmp_path / f"cut{size}.ftb"
+        cut.write_bytes(data[:size])
+        with pytest.raises(ValueError, match=r"\[FlowTrace\]"):
+            TraceFile(cut)